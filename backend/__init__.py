@@ -13,10 +13,12 @@ def create_app():
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
     
+    from core.utils.identity import init_identity_cache, get_user
+    init_identity_cache(app)
+    
     @login_manager.user_loader
     def load_user(user_id):
-        from core.models import Users
-        return Users.query.get(int(user_id))
+        return get_user(user_id)
     
     # When registering blueprints, make sure each has a unique name
     from core.blueprints.bp_auth import bp_auth
@@ -0,0 +1,16 @@
+"""
+ASGI entry point for the Todo List application.
+
+Serve with any ASGI server, for example:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 3001
+
+The event stream runs on the event loop; all other endpoints run on a
+thread pool of ``ASGI_THREADS`` threads. Use a single worker process:
+the change feed is in-process.
+"""
+
+from run import create_app
+from core.asgi import create_asgi_app
+
+app = create_asgi_app(create_app())
@@ -0,0 +1,364 @@
+"""
+Latency and throughput of the HTTP endpoints on a seeded database.
+
+Seeds ``--users`` users, each with ``--lists`` lists of three-level task
+trees (``--fanout`` children per task), ``--tasks`` tasks in total, into
+a temporary SQLite file. Then drives each scenario through the real
+Flask app and records p50/p95/p99 latency and throughput:
+
+    list_fetch  GET  /api/lists/<id>         full nested tree of one list
+    toggle      POST /api/tasks/<id>/toggle  a root, cascading to its subtree
+    move        POST /api/tasks/<id>/move    a leaf under another task
+    batch       POST /api/tasks/batch        priority of --batch-size tasks
+    login       POST /api/auth/login         password check and token
+
+``--server client`` calls the app in-process through the test client.
+``--server wsgi`` forks ``--workers`` processes, each with its own app,
+serving one shared socket with werkzeug's threaded server, and sends
+requests over keep-alive HTTP connections. In both, ``--concurrency``
+threads issue requests.
+
+Results can be written as a JSON baseline and compared later; a scenario
+regresses when its p95 grows or its throughput drops by more than
+``--tolerance``. The exit status is 1 when any scenario regressed.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.bench_api --tasks 100000 --save baseline.json
+    python -m benchmarks.bench_api --tasks 100000 --compare baseline.json
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from flask_jwt_extended import create_access_token
+from werkzeug.security import generate_password_hash
+from werkzeug.serving import make_server
+
+from run import create_app
+from core.models import db, Users, Lists, Tasks, rebuild_task_hierarchy
+
+PASSWORD = "BenchPass123!"
+SEED_BATCH = 10000
+SCENARIOS = ("list_fetch", "toggle", "move", "batch", "login")
+REPORTED = ("count", "errors", "p50_ms", "p95_ms", "p99_ms", "rps")
+
+
+def bench_config(path):
+    return {
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{path}",
+        "RATELIMIT_ENABLED": False,
+    }
+
+
+def seed(app, users, lists, tasks, fanout):
+    """Insert the synthetic accounts; returns the ids each scenario picks from.
+
+    Rows are written with batched executemany inserts and the hierarchy
+    is built once at the end, so a million tasks seed in about a minute.
+    """
+    per_root = 1 + fanout + fanout * fanout
+    roots_per_list = max(1, tasks // (users * lists * per_root))
+    password_hash = generate_password_hash(PASSWORD, method=app.config["PASSWORD_HASH_METHOD"])
+
+    users_table, lists_table, tasks_table = Users.__table__, Lists.__table__, Tasks.__table__
+    accounts = []
+    task_id = 0
+    with app.app_context():
+        connection = db.session.connection()
+        connection.execute(users_table.insert(), [
+            {"id": u, "username": f"bench{u}", "email": f"bench{u}@example.com",
+             "password_hash": password_hash}
+            for u in range(1, users + 1)
+        ])
+        rows = []
+
+        def flush():
+            if rows:
+                connection.execute(tasks_table.insert(), rows)
+                rows.clear()
+
+        for u in range(1, users + 1):
+            list_ids = [(u - 1) * lists + l for l in range(1, lists + 1)]
+            connection.execute(lists_table.insert(), [
+                {"id": list_id, "name": f"List {list_id}", "user_id": u, "rank": f"{l:06d}V"}
+                for l, list_id in enumerate(list_ids, start=1)
+            ])
+            account = {"user_id": u, "lists": list_ids, "roots": [], "parents": [], "leaves": []}
+            for list_id in list_ids:
+                for r in range(1, roots_per_list + 1):
+                    task_id += 1
+                    root_id = task_id
+                    rows.append({"id": root_id, "name": f"Task {root_id}", "list_id": list_id,
+                                 "parent_id": None, "rank": f"{r:06d}V"})
+                    account["roots"].append(root_id)
+                    for c in range(1, fanout + 1):
+                        task_id += 1
+                        child_id = task_id
+                        rows.append({"id": child_id, "name": f"Task {child_id}", "list_id": list_id,
+                                     "parent_id": root_id, "rank": f"{c:06d}V"})
+                        account["parents"].append(child_id)
+                        for g in range(1, fanout + 1):
+                            task_id += 1
+                            rows.append({"id": task_id, "name": f"Task {task_id}", "list_id": list_id,
+                                         "parent_id": child_id, "rank": f"{g:06d}V"})
+                            account["leaves"].append(task_id)
+                    if len(rows) >= SEED_BATCH:
+                        flush()
+            accounts.append(account)
+        flush()
+        rebuild_task_hierarchy(connection)
+        db.session.commit()
+        for account in accounts:
+            account["token"] = create_access_token(identity=account["user_id"])
+    return accounts, task_id
+
+
+def make_request(scenario, account, rng, batch_size):
+    """``(method, path, body)`` for one request of ``scenario``."""
+    if scenario == "list_fetch":
+        return "GET", f"/api/lists/{rng.choice(account['lists'])}", None
+    if scenario == "toggle":
+        return "POST", f"/api/tasks/{rng.choice(account['roots'])}/toggle", None
+    if scenario == "move":
+        # Leaves stay leaves, so any depth-1 task is a valid new parent
+        return "POST", f"/api/tasks/{rng.choice(account['leaves'])}/move", {
+            "new_parent_id": rng.choice(account["parents"])}
+    if scenario == "batch":
+        ids = rng.sample(account["leaves"], min(batch_size, len(account["leaves"])))
+        return "POST", "/api/tasks/batch", {
+            "tasks": [{"id": i, "priority": rng.randint(0, 3)} for i in ids]}
+    if scenario == "login":
+        return "POST", "/api/auth/login", {
+            "login": f"bench{account['user_id']}", "password": PASSWORD}
+    raise ValueError(scenario)
+
+
+class TestClientDriver:
+    """Requests through Flask's test client, in this process."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, method, path, body, token):
+        response = self.app.test_client().open(
+            path, method=method, json=body,
+            headers={"Authorization": f"Bearer {token}"})
+        response.get_data()
+        return response.status_code
+
+    def close(self):
+        pass
+
+
+def _serve(sock, path):
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    app = create_app(bench_config(path))
+    make_server("127.0.0.1", sock.getsockname()[1], app, threaded=True, fd=sock.fileno()).serve_forever()
+
+
+class WSGIDriver:
+    """Requests over HTTP to forked werkzeug workers sharing one socket."""
+
+    def __init__(self, path, workers):
+        self.sock = socket.socket()
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(128)
+        self.port = self.sock.getsockname()[1]
+        context = multiprocessing.get_context("fork")
+        self.processes = [
+            context.Process(target=_serve, args=(self.sock, path), daemon=True)
+            for _ in range(workers)
+        ]
+        for process in self.processes:
+            process.start()
+        self._local = threading.local()
+        self._wait_ready()
+
+    def _wait_ready(self, timeout=30):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self("GET", "/api/auth/verify", None, "")
+                return
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+
+    def __call__(self, method, path, body, token):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = http.client.HTTPConnection("127.0.0.1", self.port)
+        headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+        try:
+            connection.request(method, path, json.dumps(body) if body is not None else None, headers)
+            response = connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self._local.connection = None
+            connection.close()
+            raise
+        return response.status
+
+    def close(self):
+        for process in self.processes:
+            process.terminate()
+            process.join()
+        self.sock.close()
+
+
+def percentile(samples, fraction):
+    return samples[round(fraction * (len(samples) - 1))]
+
+
+def run_scenario(driver, scenario, accounts, requests, concurrency, batch_size, seed_value):
+    rng = random.Random(seed_value)
+    plan = []
+    for _ in range(requests):
+        account = rng.choice(accounts)
+        plan.append((*make_request(scenario, account, rng, batch_size), account["token"]))
+
+    def timed(job):
+        start = time.perf_counter()
+        try:
+            ok = driver(*job) < 400
+        except OSError:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(timed, plan))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _ in results)
+    return {
+        "count": len(results),
+        "errors": sum(1 for _, ok in results if not ok),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "rps": round(len(results) / elapsed, 1),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Scenarios slower than ``baseline`` beyond ``tolerance``: ``{name: [reasons]}``."""
+    regressions = {}
+    for scenario, current in results.items():
+        previous = baseline["results"].get(scenario)
+        if previous is None:
+            continue
+        reasons = []
+        if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            reasons.append(f"p95 {previous['p95_ms']} -> {current['p95_ms']} ms")
+        if current["rps"] < previous["rps"] * (1 - tolerance):
+            reasons.append(f"throughput {previous['rps']} -> {current['rps']} req/s")
+        if current["errors"] > previous["errors"]:
+            reasons.append(f"errors {previous['errors']} -> {current['errors']}")
+        if reasons:
+            regressions[scenario] = reasons
+    return regressions
+
+
+def run(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        app = create_app(bench_config(path))
+        start = time.perf_counter()
+        accounts, task_count = seed(app, args.users, args.lists, args.tasks, args.fanout)
+        print(f"seeded {args.users} users, {args.users * args.lists} lists, "
+              f"{task_count} tasks in {time.perf_counter() - start:.1f}s")
+
+        if args.server == "client":
+            driver = TestClientDriver(app)
+        else:
+            # Workers open their own connections; none may be shared over fork
+            with app.app_context():
+                db.engine.dispose()
+            driver = WSGIDriver(path, args.workers)
+        try:
+            results = {}
+            for scenario in args.scenarios:
+                requests = args.login_requests if scenario == "login" else args.requests
+                results[scenario] = run_scenario(
+                    driver, scenario, accounts, requests, args.concurrency,
+                    args.batch_size, args.seed)
+        finally:
+            driver.close()
+            with app.app_context():
+                db.engine.dispose()
+
+    return {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "cpus": os.cpu_count(),
+            "tasks": task_count,
+            **{name: getattr(args, name) for name in (
+                "users", "lists", "fanout", "server", "workers", "concurrency",
+                "requests", "batch_size", "seed")},
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tasks", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--lists", type=int, default=5, help="lists per user")
+    parser.add_argument("--fanout", type=int, default=3)
+    parser.add_argument("--server", choices=("client", "wsgi"), default="client")
+    parser.add_argument("--workers", type=int, default=4, help="WSGI worker processes")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--login-requests", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=SCENARIOS)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", metavar="FILE", help="write the results as a JSON baseline")
+    parser.add_argument("--compare", metavar="FILE", help="flag regressions against a baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    report = run(args)
+    print(f"{'scenario':<11}" + "".join(f"{name:>10}" for name in REPORTED))
+    for scenario, result in report["results"].items():
+        print(f"{scenario:<11}" + "".join(f"{result[name]:>10}" for name in REPORTED))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        for name, value in baseline["meta"].items():
+            if name not in ("date", "seed") and report["meta"].get(name) != value:
+                print(f"warning: {name} was {value} in the baseline, now {report['meta'].get(name)}")
+        regressions = compare(report["results"], baseline, args.tolerance)
+        for scenario, reasons in regressions.items():
+            print(f"REGRESSION {scenario}: {'; '.join(reasons)}")
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Compare task-tree serialization strategies on a synthetic list.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.bench_serialization --tasks 10000
+"""
+
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from run import create_app
+from core.models import db, Users, Lists, Tasks, load_task_forests, task_tree_query, rebuild_task_hierarchy
+from core.schemas import TaskSchema
+from core.serializers import stream_task_tree
+
+
+def seed_list(task_count, fanout=10):
+    """Create one list holding ``task_count`` tasks over three levels."""
+    user = Users(username='bench', email='bench@example.com')
+    db.session.add(user)
+    db.session.flush()
+    list_ = Lists(name='Bench', user_id=user.id)
+    db.session.add(list_)
+    db.session.flush()
+
+    tasks = Tasks.__table__
+    roots = max(1, task_count // (1 + fanout + fanout * fanout))
+    next_id = 1
+    rows = []
+    for _ in range(roots):
+        root_id = next_id
+        rows.append({"id": root_id, "name": f"Task {root_id}", "list_id": list_.id, "parent_id": None})
+        next_id += 1
+        for _ in range(fanout):
+            child_id = next_id
+            rows.append({"id": child_id, "name": f"Task {child_id}", "list_id": list_.id, "parent_id": root_id})
+            next_id += 1
+            for _ in range(fanout):
+                rows.append({"id": next_id, "name": f"Task {next_id}", "list_id": list_.id, "parent_id": child_id})
+                next_id += 1
+    db.session.execute(tasks.insert(), rows)
+    rebuild_task_hierarchy(db.session.connection())
+    db.session.commit()
+    return list_.id, len(rows)
+
+
+def per_object_schema_dump(list_id):
+    """Previous path: ORM roots, recursive TaskSchema().dump via subtasks."""
+    roots = Tasks.query.filter_by(list_id=list_id, parent_id=None).order_by(Tasks.created_at).all()
+    return json.dumps([TaskSchema().dump(task) for task in roots], default=str)
+
+
+def dict_tree(list_id):
+    """One recursive query, nested dicts, one json.dumps."""
+    return json.dumps(load_task_forests([list_id])[list_id])
+
+
+def streamed_rows(list_id):
+    """One recursive query, rows encoded straight to JSON chunks."""
+    query = task_tree_query(Tasks.list_id == list_id, Tasks.parent_id.is_(None))
+    rows = db.session.execute(query.execution_options(yield_per=1000))
+    return "".join(stream_task_tree(rows))
+
+
+def measure(fn, list_id, repeat):
+    timings = []
+    for _ in range(repeat):
+        db.session.expire_all()
+        start = time.perf_counter()
+        fn(list_id)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--tasks', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'bench.db')}"})
+        with app.app_context():
+            list_id, count = seed_list(args.tasks)
+            print(f"{count} tasks")
+            for fn in (per_object_schema_dump, dict_tree, streamed_rows):
+                print(f"{fn.__name__:<24} {measure(fn, list_id, args.repeat) * 1000:9.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Read/write throughput of the SQLite engine profile under concurrency.
+
+Each worker loops for ``--seconds``, loading a task tree (read) or adding
+a task and committing (write). Threads share one app and its connection
+pool, like a threaded server; ``--processes`` gives every worker its own
+app, like separate gunicorn workers writing to one database file.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.bench_sqlite --workers 1 4 16
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from sqlalchemy.exc import OperationalError
+
+from run import create_app
+from core.models import db, Tasks, load_task_forests
+from benchmarks.bench_serialization import seed_list
+
+PROFILES = {
+    # SQLite defaults: rollback journal, synchronous=FULL, no FK checks
+    "default": {"SQLITE_PRAGMAS": {}, "SQLITE_POOL": {}},
+    # config.Config as shipped
+    "tuned": {},
+}
+
+
+def run_worker(app, list_id, seconds, write_ratio, seed):
+    rng = random.Random(seed)
+    reads = writes = errors = 0
+    with app.app_context():
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            try:
+                if rng.random() < write_ratio:
+                    db.session.add(Tasks(name="bench", list_id=list_id))
+                    db.session.commit()
+                    writes += 1
+                else:
+                    load_task_forests([list_id])
+                    reads += 1
+            except OperationalError:
+                # "database is locked" once the busy timeout runs out
+                db.session.rollback()
+                errors += 1
+        db.session.remove()
+    return reads, writes, errors
+
+
+def _process_worker(config, list_id, seconds, write_ratio, seed):
+    return run_worker(create_app(config), list_id, seconds, write_ratio, seed)
+
+
+def run(profile, workers, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        config = {"SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                  **PROFILES[profile]}
+        app = create_app(config)
+        with app.app_context():
+            list_id, _ = seed_list(args.tasks)
+
+        jobs = [(list_id, args.seconds, args.write_ratio, seed) for seed in range(workers)]
+        if args.processes:
+            with ProcessPoolExecutor(workers) as pool:
+                results = list(pool.map(_process_worker, [config] * workers, *zip(*jobs)))
+        else:
+            with ThreadPoolExecutor(workers) as pool:
+                results = list(pool.map(lambda job: run_worker(app, *job), jobs))
+
+        with app.app_context():
+            db.engine.dispose()
+
+    reads, writes, errors = (sum(column) for column in zip(*results))
+    return reads / args.seconds, writes / args.seconds, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--tasks", type=int, default=500)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--processes", action="store_true")
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=list(PROFILES))
+    args = parser.parse_args()
+
+    print(f"{'profile':<8} {'workers':>7} {'reads/s':>9} {'writes/s':>9} {'locked':>7}")
+    for profile in args.profiles:
+        for workers in args.workers:
+            reads, writes, errors = run(profile, workers, args)
+            print(f"{profile:<8} {workers:>7} {reads:>9.1f} {writes:>9.1f} {errors:>7}")
+
+
+if __name__ == "__main__":
+    main()
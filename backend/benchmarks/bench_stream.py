@@ -0,0 +1,201 @@
+"""
+Cost of idle ``/api/stream`` connections under threaded WSGI and ASGI.
+
+Seeds a small database, forks one server process and opens
+``--streams`` Server-Sent Events connections for one user. Then records:
+
+    threads     server threads with every stream open
+    rss_mb      server resident memory with every stream open
+    fanout      time from a task write until each stream has the event
+                (p50, p95 and max over all streams, median of --writes)
+    get         p50/p95 of GET /api/lists/<id> while the streams idle
+
+``--server wsgi`` is werkzeug's threaded server, one thread per
+connection. ``--server asgi`` is ``asgi:app`` under uvicorn, where
+streams are coroutines and other requests run on ``ASGI_THREADS``
+threads. uvicorn must be installed for the latter.
+
+Usage (from the backend directory):
+
+    python -m benchmarks.bench_stream --server wsgi --streams 1000
+    python -m benchmarks.bench_stream --server asgi --streams 1000
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import statistics
+import tempfile
+import time
+
+from werkzeug.serving import make_server
+
+from run import create_app
+from core.asgi import create_asgi_app
+from core.models import db
+from benchmarks.bench_api import bench_config, seed, percentile
+
+
+def _serve(sock, path, server):
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    app = create_app({**bench_config(path), "STREAM_QUEUE_SIZE": 1024})
+    if server == "wsgi":
+        make_server("127.0.0.1", sock.getsockname()[1], app, threaded=True,
+                    fd=sock.fileno()).serve_forever()
+    else:
+        import uvicorn
+        uvicorn.Server(uvicorn.Config(create_asgi_app(app), fd=sock.fileno(),
+                                      log_level="warning", backlog=4096)).run()
+
+
+def process_stats(pid):
+    """``(threads, rss_mb)`` of a running process, from /proc."""
+    with open(f"/proc/{pid}/status") as f:
+        fields = dict(line.split(":", 1) for line in f)
+    return int(fields["Threads"]), round(int(fields["VmRSS"].split()[0]) / 1024, 1)
+
+
+async def request(port, method, path, token, body=None):
+    """One request on a fresh connection; returns the status code."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    payload = json.dumps(body).encode() if body is not None else b""
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n"
+        f"Authorization: Bearer {token}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(payload)}\r\n\r\n".encode() + payload
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    await reader.read()
+    writer.close()
+    return status
+
+
+class Stream:
+    """One SSE client, recording when each marker task arrives."""
+
+    def __init__(self):
+        self.received = {}  # marker -> arrival time
+        self.ready = asyncio.Event()
+
+    async def run(self, port, token):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"GET /api/stream?jwt={token} HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+                     f"Accept: text/event-stream\r\n\r\n".encode())
+        await writer.drain()
+        try:
+            while line := await reader.readline():
+                if line.startswith(b"retry:"):
+                    self.ready.set()
+                elif line.startswith(b"data:") and b"marker " in line:
+                    marker = json.loads(line[5:])["task"]["name"]
+                    self.received[marker] = time.perf_counter()
+        finally:
+            writer.close()
+
+
+async def measure(port, account, streams, writes, gets, on_open):
+    """Open the streams, call ``on_open`` and time writes and reads."""
+    clients = [Stream() for _ in range(streams)]
+    tasks = []
+    for start in range(0, streams, 100):
+        # Open in batches so the listen backlog is not overrun
+        batch = clients[start:start + 100]
+        tasks += [asyncio.ensure_future(client.run(port, account["token"])) for client in batch]
+        await asyncio.wait_for(asyncio.gather(*(client.ready.wait() for client in batch)), 60)
+    await asyncio.sleep(0.5)
+    opened = on_open()
+
+    fanout = []
+    list_id = account["lists"][0]
+    for n in range(writes):
+        marker = f"marker {n}"
+        sent = time.perf_counter()
+        await request(port, "POST", "/api/tasks/", account["token"],
+                      {"name": marker, "list_id": list_id})
+        while sum(marker in client.received for client in clients) < streams:
+            await asyncio.sleep(0.005)
+        delays = sorted(client.received[marker] - sent for client in clients)
+        fanout.append((percentile(delays, 0.5), percentile(delays, 0.95), delays[-1]))
+
+    latencies = []
+    for _ in range(gets):
+        start = time.perf_counter()
+        await request(port, "GET", f"/api/lists/{list_id}", account["token"])
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return opened, fanout, latencies
+
+
+def run(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        app = create_app(bench_config(path))
+        accounts, _ = seed(app, 1, 1, 120, 3)
+        with app.app_context():
+            db.engine.dispose()
+
+        sock = socket.socket()
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(("127.0.0.1", 0))
+        sock.listen(4096)
+        port = sock.getsockname()[1]
+        process = multiprocessing.get_context("fork").Process(
+            target=_serve, args=(sock, path, args.server), daemon=True)
+        process.start()
+        try:
+            idle = None
+            deadline = time.monotonic() + 30
+            while idle is None:
+                try:
+                    asyncio.run(request(port, "GET", "/api/auth/verify", ""))
+                    idle = process_stats(process.pid)
+                except OSError:
+                    if time.monotonic() > deadline:
+                        raise
+                    time.sleep(0.1)
+
+            opened, fanout, latencies = asyncio.run(measure(
+                port, accounts[0], args.streams, args.writes, args.gets,
+                lambda: process_stats(process.pid)))
+        finally:
+            process.terminate()
+            process.join()
+            sock.close()
+
+    return {
+        "server": args.server,
+        "streams": args.streams,
+        "idle_threads": idle[0],
+        "idle_rss_mb": idle[1],
+        "threads": opened[0],
+        "rss_mb": opened[1],
+        "fanout_p50_ms": round(statistics.median(f[0] for f in fanout) * 1000, 1),
+        "fanout_p95_ms": round(statistics.median(f[1] for f in fanout) * 1000, 1),
+        "fanout_max_ms": round(statistics.median(f[2] for f in fanout) * 1000, 1),
+        "get_p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+        "get_p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--server", choices=("wsgi", "asgi"), default="asgi")
+    parser.add_argument("--streams", type=int, default=1000)
+    parser.add_argument("--writes", type=int, default=5)
+    parser.add_argument("--gets", type=int, default=200)
+    args = parser.parse_args()
+    for name, value in run(args).items():
+        print(f"{name:<15}{value}")
+
+
+if __name__ == "__main__":
+    main()
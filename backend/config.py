@@ -9,6 +9,95 @@ class Config:
     JWT_TOKEN_LOCATION = ['headers']
     JWT_HEADER_NAME = 'Authorization'
     JWT_HEADER_TYPE = 'Bearer'
+    # Keep bound values (password hashes, emails) out of SQL error messages
+    SQLALCHEMY_ENGINE_OPTIONS = {"hide_parameters": True}
+    
+    # SQLite profile, applied to every new connection. journal_mode=WAL is
+    # persistent in the database file; the rest are per connection
+    SQLITE_PRAGMAS = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64000,  # KiB, i.e. 64 MB per connection
+        "busy_timeout": 5000,  # ms
+        "foreign_keys": "ON",
+    }
+    # Connection pool for file databases (ignored for :memory:)
+    SQLITE_POOL = {
+        "pool_size": 8,
+        "max_overflow": 8,
+        "pool_timeout": 10,
+        "pool_recycle": 3600,
+    }
+    
+    # Password hashing pool: pbkdf2 runs on these workers, and requests
+    # beyond workers + queue are rejected with 429
+    PASSWORD_HASH_METHOD = "pbkdf2:sha256:600000"
+    PASSWORD_HASH_WORKERS = 2
+    PASSWORD_HASH_QUEUE = 16
+    PASSWORD_HASH_EXECUTOR = "thread"  # or "process"
+    
+    # Rate limiting: "memory" is per process, "sqlite:///<path>" is shared
+    # by every worker on the host
+    RATELIMIT_ENABLED = True
+    RATELIMIT_STORAGE = "memory"
+    RATELIMIT_MAX_KEYS = 10000
+    
+    # Identity cache: JWT subject -> user snapshot, dropped on any change
+    # to the user row
+    IDENTITY_CACHE_SIZE = 10000
+    IDENTITY_CACHE_TTL = 60
+    
+    # Reminder scheduler: loads the tasks due in the next window and fires
+    # them through a sink ("log" or "webhook"). Enable in one process only
+    REMINDERS_ENABLED = False
+    REMINDER_WINDOW = 3600  # seconds
+    REMINDER_SINK = "log"
+    REMINDER_WEBHOOK_URL = None
+    
+    # Ordering keys: a sibling group is rewritten with short ranks once a
+    # reorder produces a rank longer than this, on a background thread
+    RANK_REBALANCE_LENGTH = 12
+    RANK_REBALANCE_BACKGROUND = True
+    
+    # Request metrics at /metrics (Prometheus text format), and cProfile
+    # dumps of sampled requests slower than PROFILE_SLOW_REQUEST seconds.
+    # /metrics is only served with a token, sent by the scraper as
+    # "Authorization: Bearer <token>"
+    METRICS_ENABLED = False
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    PROFILE_SAMPLE_RATE = 0.0  # fraction of requests profiled
+    PROFILE_SLOW_REQUEST = 1.0
+    PROFILE_DIR = None  # defaults to <instance>/profiles
+    
+    # Change feed at /api/stream: per-connection queue bound, events kept
+    # for Last-Event-ID resume, and seconds between keepalive comments
+    STREAM_QUEUE_SIZE = 256
+    STREAM_BUFFER_SIZE = 1000
+    STREAM_HEARTBEAT = 15
+    
+    # Threads running the Flask views under asgi.py; event streams do not
+    # take one
+    ASGI_THREADS = 32
+    
+    # Rendered GET /api/lists/<id> bodies kept in memory (0 disables the
+    # cache), and an optional SQLite file sharing them between workers
+    RENDER_CACHE_BYTES = 64 * 1024 * 1024
+    RENDER_CACHE_PATH = None
+    RENDER_CACHE_SHARED_BYTES = 256 * 1024 * 1024
+    
+    # JSON log lines, written by a background thread to LOG_FILE (rotated)
+    # or stderr when unset; repeated tracebacks are shortened for
+    # LOG_DEDUPE_WINDOW seconds
+    LOG_LEVEL = "INFO"
+    LOG_FILE = None
+    LOG_MAX_BYTES = 10 * 1024 * 1024
+    LOG_BACKUP_COUNT = 10
+    LOG_DEDUPE_WINDOW = 60
+    
+    # Deletion records for ``since`` sync are kept this long by
+    # ``flask data prune-tombstones``; older ``since`` values get a 410
+    TOMBSTONE_RETENTION_DAYS = 30
     
     # CORS configuration
     CORS_HEADERS = 'Content-Type'
@@ -0,0 +1,252 @@
+"""
+ASGI serving for the Flask application.
+
+``/api/stream`` is served natively on the event loop: each connection is
+a coroutine waiting on its ``EventBus`` subscription, so idle streams
+cost a few kilobytes instead of a thread each. Every other request is
+handed to the unchanged Flask app through a WSGI bridge running on a
+bounded thread pool (``ASGI_THREADS``); response bodies are sent chunk
+by chunk as the app yields them, so streamed exports stay streamed.
+
+Request bodies are spooled to a temporary file above 1 MB before the
+WSGI app sees them.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import json
+import sys
+import tempfile
+from urllib.parse import parse_qs
+
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+
+from core.blueprints.bp_stream import format_event, TOKEN_LOCATIONS
+
+STREAM_PATHS = ("/api/stream", "/api/stream/")
+SPOOL_SIZE = 1024 * 1024
+
+
+def build_environ(scope, body):
+    """WSGI environ for an ASGI HTTP ``scope`` with the seekable request ``body``."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope["headers"]:
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = f"HTTP_{name}"
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    if "CONTENT_LENGTH" not in environ:
+        # Chunked uploads: the body is already spooled, so its size is known
+        environ["CONTENT_LENGTH"] = str(body.seek(0, 2))
+        body.seek(0)
+    return environ
+
+
+class WSGIBridge:
+    """Run a WSGI app for ASGI HTTP requests on a thread pool."""
+
+    def __init__(self, wsgi_app, threads=32):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix="wsgi")
+
+    async def __call__(self, scope, receive, send):
+        body = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                body.close()
+                return
+            body.write(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        body.seek(0)
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self.executor, self._run, build_environ(scope, body), send, loop)
+        finally:
+            body.close()
+
+    def _run(self, environ, send, loop):
+        def send_sync(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response["start"] = {
+                "type": "http.response.start",
+                "status": int(status.split(" ", 1)[0]),
+                "headers": [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                            for name, value in headers],
+            }
+
+        iterable = self.wsgi_app(environ, start_response)
+        started = False
+        try:
+            for chunk in iterable:
+                if not chunk:
+                    continue
+                if not started:
+                    send_sync(response["start"])
+                    started = True
+                send_sync({"type": "http.response.body", "body": chunk, "more_body": True})
+        finally:
+            if hasattr(iterable, "close"):
+                iterable.close()
+        if not started:
+            send_sync(response["start"])
+        send_sync({"type": "http.response.body", "body": b""})
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+class EventStream:
+    """``/api/stream`` as a native ASGI endpoint; see ``bp_stream.stream``."""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+
+    def _cors_headers(self, scope):
+        origin = dict(scope["headers"]).get(b"origin", b"").decode("latin-1")
+        if origin and origin in self.flask_app.config.get("CORS_ORIGINS", ()):
+            return [(b"access-control-allow-origin", origin.encode("latin-1")),
+                    (b"access-control-allow-credentials", b"true"),
+                    (b"vary", b"Origin")]
+        return []
+
+    def _authenticate(self, scope):
+        """The request's user id, or None when the token is missing or invalid.
+
+        The token goes through ``verify_jwt_in_request`` like the WSGI
+        route's, so the token type, blocklist and user loader checks are
+        the same on both transports.
+        """
+        query_string = scope["query_string"].decode("latin-1")
+        query = parse_qs(query_string)
+        headers = [(name.decode("latin-1"), value.decode("latin-1"))
+                   for name, value in scope["headers"]]
+        with self.flask_app.test_request_context(
+                scope["path"], query_string=query_string, headers=headers):
+            try:
+                verify_jwt_in_request(locations=TOKEN_LOCATIONS)
+            except Exception:
+                return None, query
+            return get_jwt_identity(), query
+
+    async def __call__(self, scope, receive, send):
+        cors = self._cors_headers(scope)
+        user_id, query = self._authenticate(scope)
+        if user_id is None:
+            await send({"type": "http.response.start", "status": 401,
+                        "headers": [(b"content-type", b"application/json"), *cors]})
+            await send({"type": "http.response.body",
+                        "body": json.dumps({"msg": "Missing or invalid token"}).encode()})
+            return
+
+        last_event_id = (dict(scope["headers"]).get(b"last-event-id", b"").decode("latin-1")
+                         or query.get("last_event_id", [""])[0])
+        try:
+            last_event_id = int(last_event_id) if last_event_id else None
+        except ValueError:
+            last_event_id = None
+
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+
+        def notify():
+            # Called by publishers on other threads
+            try:
+                loop.call_soon_threadsafe(ready.set)
+            except RuntimeError:
+                pass  # loop closed during shutdown
+
+        bus = self.flask_app.extensions["events"]
+        subscription = bus.subscribe(user_id, last_event_id, notify=notify)
+        heartbeat = self.flask_app.config.get("STREAM_HEARTBEAT", 15)
+        disconnected = asyncio.ensure_future(self._wait_disconnect(receive))
+        try:
+            await send({"type": "http.response.start", "status": 200, "headers": [
+                (b"content-type", b"text/event-stream; charset=utf-8"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+                *cors,
+            ]})
+            await self._send(send, f"retry: 3000\nid: {last_event_id or bus.last_id}\n\n")
+            while not disconnected.done():
+                item = subscription.get(timeout=0)
+                if item is None:
+                    # Clear before re-checking so a publish in between is not missed
+                    ready.clear()
+                    item = subscription.get(timeout=0)
+                if item is None:
+                    waiter = asyncio.ensure_future(ready.wait())
+                    await asyncio.wait({waiter, disconnected}, timeout=heartbeat,
+                                       return_when=asyncio.FIRST_COMPLETED)
+                    waiter.cancel()
+                    if disconnected.done():
+                        break
+                    if not ready.is_set():
+                        await self._send(send, ": keepalive\n\n")
+                    continue
+                await self._send(send, format_event(*item))
+        except OSError:
+            pass  # client went away mid-send
+        finally:
+            subscription.close()
+            disconnected.cancel()
+
+    @staticmethod
+    async def _send(send, text):
+        await send({"type": "http.response.body", "body": text.encode(), "more_body": True})
+
+    @staticmethod
+    async def _wait_disconnect(receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+
+def create_asgi_app(flask_app):
+    """ASGI application serving ``flask_app``, with a native event stream."""
+    bridge = WSGIBridge(flask_app, flask_app.config.get("ASGI_THREADS", 32))
+    stream = EventStream(flask_app)
+
+    async def app(scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    bridge.close()
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        elif scope["type"] == "http":
+            if scope["path"] in STREAM_PATHS and scope["method"] == "GET":
+                await stream(scope, receive, send)
+            else:
+                await bridge(scope, receive, send)
+        else:
+            raise ValueError(f"Unsupported ASGI scope type {scope['type']!r}")
+
+    return app
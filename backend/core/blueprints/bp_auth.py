@@ -7,6 +7,9 @@ from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identi
 from datetime import datetime
 from core.models import Users, db
 from core.utils.decorators import handle_exceptions
+from core.utils.passwords import get_password_hasher, HasherBusy
+from core.utils.rate_limiter import rate_limit
+from core.utils.identity import get_user
 from flask_login import login_user, logout_user
 from flask_cors import CORS, cross_origin
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -32,16 +35,26 @@ CORS(bp_auth, resources={
 def hash_password(password):
     return generate_password_hash(password)
 
+def hashing_busy_response():
+    response = jsonify({
+        'ok': False,
+        'message': 'Too many authentication requests, please retry shortly'
+    })
+    response.headers['Retry-After'] = '1'
+    return response, 429
+
 def is_valid_email(email):
     """Validate email format using email-validator package."""
     try:
-        validate_email(email)
+        # Syntax only: a DNS lookup per registration would block the request thread
+        validate_email(email, check_deliverability=False)
         return True
     except EmailNotValidError:
         return False
 
 @bp_auth.route("/register", methods=["POST"])
 @cross_origin(supports_credentials=True)
+@rate_limit(limit=10, window=60)
 @handle_exceptions(endpoint='register')
 def register():
     data = request.get_json()
@@ -78,7 +91,7 @@ def register():
             username=data['username'],
             email=data['email']
         )
-        new_user.set_password(data['password'])
+        new_user.password_hash = get_password_hasher().hash(data['password'])
         
         db.session.add(new_user)
         db.session.commit()
@@ -96,11 +109,14 @@ def register():
             }
         }), 201
         
+    except HasherBusy:
+        return hashing_busy_response()
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': str(e)}), 500
 
 @bp_auth.route("/login", methods=["POST"])
+@rate_limit(limit=20, window=60)
 @handle_exceptions
 def login():
     """Authenticate user and create session."""
@@ -118,7 +134,10 @@ def login():
             (Users.email == data['login'])
         ).first()
         
-        if not user or not user.check_password(data['password']):
+        ok, new_hash = get_password_hasher().verify(
+            user.password_hash if user else None, data['password']
+        )
+        if not ok:
             return jsonify({
                 "ok": False,
                 "message": "Invalid login credentials."
@@ -127,13 +146,17 @@ def login():
         # Create access token
         access_token = create_access_token(identity=user.id)
         
+        # Transparently upgrade hashes made with outdated parameters
+        if new_hash:
+            user.password_hash = new_hash
+        
         # Update last login
         user.last_login = datetime.utcnow()
         db.session.commit()
         
         return jsonify({
             "ok": True,
-            "message": "Login successful",
+            "message": "Logged in successfully",
             "token": access_token,
             "user": {
                 "id": user.id,
@@ -142,8 +165,10 @@ def login():
             }
         }), 200
         
+    except HasherBusy:
+        return hashing_busy_response()
     except Exception as e:
-        current_app.logger.error(f"Login error: {str(e)}")
+        current_app.logger.exception("Login error")
         return jsonify({
             "ok": False,
             "message": "An error occurred during login."
@@ -154,8 +179,7 @@ def login():
 @handle_exceptions(endpoint='logout')
 def logout():
     # Get current user
-    current_user_id = get_jwt_identity()
-    user = Users.query.get(current_user_id)
+    user = get_user(get_jwt_identity())
     
     if user:
         logout_user()
@@ -175,14 +199,18 @@ def logout():
 @cross_origin(supports_credentials=True)
 def ping():
     """Test endpoint to verify API connectivity"""
-    print("Ping endpoint hit!")  # Server-side logging
     return jsonify({"status": "success", "message": "API is working"}), 200
 
+@bp_auth.route("/hasher-stats", methods=["GET"])
+@jwt_required()
+def hasher_stats():
+    """Latency and saturation stats of the password hashing pool."""
+    return jsonify({'ok': True, 'stats': get_password_hasher().stats()}), 200
+
 @bp_auth.route("/verify", methods=["GET"])
 @jwt_required()
 def verify_token():
-    current_user_id = get_jwt_identity()
-    user = Users.query.get(current_user_id)
+    user = get_user(get_jwt_identity())
     
     if not user:
         return jsonify({
@@ -2,13 +2,27 @@
 Lists blueprint handling todo list management with improved error handling and validation.
 """
 
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from flask_cors import CORS, cross_origin
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from core.models import db, Lists
+from core.models import (
+    db, Lists, Tasks, load_task_forests, load_list_summaries, load_changes,
+    current_revision, task_tree_query, StaleRevision
+)
+from core.serializers import stream_task_tree
+from core.transfer import export_user_data, import_user_data, TransferError
+from core.events import emit
+from core.ordering import reorder, ReorderError
+from core.render_cache import render_cache
+from core.utils.decorators import etag_by_revision
 from marshmallow import Schema, fields, ValidationError, validates_schema
+from sqlalchemy import select, tuple_
 from sqlalchemy.exc import SQLAlchemyError
-from functools import wraps
+from core.schemas import ListResponseSchema
+from functools import wraps, lru_cache
+import base64
+import binascii
+import json
 import logging
 
 # Set up logging
@@ -20,6 +34,10 @@ class ListSchema(Schema):
     name = fields.Str(validate=lambda x: len(x.strip()) > 0)
     subject = fields.Str(validate=lambda x: len(x.strip()) > 0)
     description = fields.Str(allow_none=True)
+    order_index = fields.Int(dump_only=True)
+    rank = fields.Str(dump_only=True)
+    is_archived = fields.Bool(dump_only=True)
+    collapsed_tasks = fields.Raw(dump_only=True)
     user_id = fields.Int(dump_only=True)
     created_at = fields.DateTime(dump_only=True)
     updated_at = fields.DateTime(dump_only=True)
@@ -40,6 +58,27 @@ CORS(bp_list, resources={
 })
 
 list_schema = ListSchema()
+list_summary_schema = ListResponseSchema(many=True, exclude=("tasks",))
+
+# Columns a client may select through ``fields=``
+LIST_FIELDS = (
+    'id', 'name', 'description', 'order_index', 'rank', 'is_archived',
+    'collapsed_tasks', 'user_id', 'created_at', 'updated_at'
+)
+MAX_PAGE_SIZE = 200
+
+@lru_cache(maxsize=64)
+def projection_schema(selected):
+    """Schema dumping only ``selected``, built once per field set."""
+    return ListSchema(only=selected, many=True)
+
+def encode_cursor(order_key, list_id):
+    raw = json.dumps([order_key, list_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_cursor(cursor):
+    order_key, list_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return str(order_key), int(list_id)
 
 def handle_db_error(f):
     @wraps(f)
@@ -48,29 +87,284 @@ def handle_db_error(f):
             return f(*args, **kwargs)
         except SQLAlchemyError as e:
             db.session.rollback()
-            logger.error(f"Database error: {str(e)}")
+            logger.exception("Database error")
             return jsonify({
                 "ok": False,
                 "message": "Database error occurred"
             }), 500
         except Exception as e:
-            logger.error(f"Unexpected error: {str(e)}")
+            logger.exception("Unexpected error")
             return jsonify({
                 "ok": False,
                 "message": "An unexpected error occurred"
             }), 500
     return decorated_function
 
+def stale_revision_response(error):
+    """410 telling the client to drop ``since`` and fetch everything again."""
+    return jsonify({"ok": False, "message": str(error), "refetch": True}), 410
+
+def changes_since():
+    """Parse the ``since`` query parameter; None when absent."""
+    since = request.args.get('since')
+    return int(since) if since is not None else None
+
 @bp_list.route("", methods=["GET"])
 @jwt_required()
+@etag_by_revision
 @handle_db_error
 def get_lists():
-    """Get all lists for the current user."""
+    """Get the current user's lists ordered by ``(rank, id)``.
+
+    Query parameters:
+
+    - ``limit`` / ``cursor``: keyset pagination; the response carries a
+      ``next_cursor`` while more lists remain. Without ``limit`` every list
+      is returned.
+    - ``is_archived``: ``true`` or ``false`` to filter on archive state.
+    - ``fields``: comma-separated columns to return; only those columns
+      are selected from the database.
+    - ``include_tasks=true``: embed each list's nested task tree; the trees
+      for all lists are loaded with a single recursive query.
+    - ``since``: return only the lists and tasks changed, and the ids
+      deleted, after that revision instead of the full collection. A
+      ``since`` older than the pruned deletions (see ``prune_tombstones``)
+      gets a 410 and the client must refetch without it.
+
+    Responses carry an ETag derived from the user's revision.
+    """
     current_user_id = get_jwt_identity()
-    lists = Lists.query.filter_by(user_id=current_user_id).all()
+    args = request.args
+
+    try:
+        since = changes_since()
+    except ValueError:
+        return jsonify({"ok": False, "message": "Invalid since revision"}), 400
+    if since is not None:
+        try:
+            changes = load_changes(current_user_id, since)
+        except StaleRevision as e:
+            return stale_revision_response(e)
+        return jsonify({
+            "ok": True,
+            "revision": current_revision(current_user_id),
+            **changes
+        }), 200
+
+    selected = tuple(f for f in args.get('fields', '').split(',') if f) or LIST_FIELDS
+    unknown = sorted(set(selected) - set(LIST_FIELDS))
+    if unknown:
+        return jsonify({
+            "ok": False,
+            "message": f"Unknown fields: {', '.join(unknown)}"
+        }), 400
+
+    try:
+        limit = args.get('limit', type=int)
+        after = decode_cursor(args['cursor']) if args.get('cursor') else None
+    except (ValueError, TypeError, binascii.Error):
+        return jsonify({
+            "ok": False,
+            "message": "Invalid limit or cursor"
+        }), 400
+
+    order_key = Lists.rank
+    columns = [getattr(Lists, f) for f in selected if f != 'id']
+    query = select(Lists.id, order_key.label('order_key'), *columns).where(
+        Lists.user_id == current_user_id
+    ).order_by(order_key, Lists.id)
+
+    archived = args.get('is_archived', '').lower()
+    if archived in ('1', 'true', 'yes'):
+        query = query.where(Lists.is_archived.is_(True))
+    elif archived in ('0', 'false', 'no'):
+        query = query.where(Lists.is_archived.isnot(True))
+
+    if after is not None:
+        query = query.where(tuple_(order_key, Lists.id) > tuple_(*after))
+    if limit is not None or after is not None:
+        limit = max(1, min(limit or MAX_PAGE_SIZE, MAX_PAGE_SIZE))
+        query = query.limit(limit + 1)
+
+    rows = db.session.execute(query).all()
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].order_key, rows[-1].id)
+
+    payload = projection_schema(selected).dump(row._mapping for row in rows)
+
+    if args.get('include_tasks', '').lower() in ('1', 'true', 'yes'):
+        forests = load_task_forests(row.id for row in rows)
+        for row, data in zip(rows, payload):
+            data['tasks'] = forests.get(row.id, [])
+
+    return jsonify({
+        "ok": True,
+        "lists": payload,
+        "next_cursor": next_cursor,
+        "revision": current_revision(current_user_id)
+    }), 200
+
+@bp_list.route("/summary", methods=["GET"])
+@jwt_required()
+@handle_db_error
+def get_list_summaries():
+    """Get every list with its task counts and completion rate.
+
+    Counts come from one grouped query, so dashboards can draw progress
+    without downloading any task bodies.
+    """
+    return jsonify({
+        "ok": True,
+        "lists": list_summary_schema.dump(load_list_summaries(get_jwt_identity()))
+    }), 200
+
+@bp_list.route("/<int:list_id>", methods=["GET"])
+@jwt_required()
+@etag_by_revision
+@handle_db_error
+def get_list(list_id):
+    """Get a single list with its full nested task tree.
+
+    With ``since``, return only that list's rows changed or deleted after
+    the given revision. Full trees are served from the render cache.
+    """
+    current_user_id = get_jwt_identity()
+    try:
+        since = changes_since()
+    except ValueError:
+        return jsonify({"ok": False, "message": "Invalid since revision"}), 400
+
+    if since is not None:
+        try:
+            changes = load_changes(current_user_id, since, list_id=list_id)
+        except StaleRevision as e:
+            return stale_revision_response(e)
+        return jsonify({
+            "ok": True,
+            "revision": current_revision(current_user_id),
+            **changes
+        }), 200
+
+    # Read the revision first: a body rendered after a concurrent write is
+    # newer than its key, never older
+    revision = current_revision(current_user_id)
+    cache = render_cache()
+    body = cache.get(current_user_id, list_id, revision) if cache is not None else None
+    if body is not None:
+        return current_app.response_class(body, mimetype=current_app.json.mimetype), 200
+
+    list_item = Lists.query.filter_by(id=list_id, user_id=current_user_id).first()
+
+    if not list_item:
+        return jsonify({
+            "ok": False,
+            "message": "List not found"
+        }), 404
+
+    response = jsonify({
+        "ok": True,
+        "list": list_item.to_dict(include_tasks=True),
+        "revision": revision
+    })
+    if cache is not None:
+        cache.set(current_user_id, list_id, revision, response.get_data())
+    return response, 200
+
+@bp_list.route("/<int:list_id>/tasks", methods=["GET"])
+@jwt_required()
+@etag_by_revision
+@handle_db_error
+def stream_list_tasks(list_id):
+    """Stream a list's nested task forest as a JSON array.
+
+    Rows are read in depth-first order from one recursive query and encoded
+    as they arrive, so large lists never materialize as a dict graph.
+    """
+    if not db.session.query(Lists.id).filter_by(
+        id=list_id, user_id=get_jwt_identity()
+    ).first():
+        return jsonify({
+            "ok": False,
+            "message": "List not found"
+        }), 404
+
+    query = task_tree_query(Tasks.list_id == list_id, Tasks.parent_id.is_(None))
+    rows = db.session.execute(query.execution_options(yield_per=1000))
+    return Response(
+        stream_with_context(stream_task_tree(rows)),
+        mimetype="application/json"
+    )
+
+@bp_list.route("/export", methods=["GET"])
+@jwt_required()
+@handle_db_error
+def export_lists():
+    """Stream every list and task of the user as NDJSON, parents first."""
+    return Response(
+        stream_with_context(export_user_data(get_jwt_identity())),
+        mimetype="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=lists.ndjson"}
+    )
+
+@bp_list.route("/import", methods=["POST"])
+@jwt_required()
+@handle_db_error
+def import_lists():
+    """Import lists and tasks from an NDJSON body in the export format.
+
+    The body is read line by line; either everything is imported or, on
+    any invalid record, nothing is.
+    """
+    try:
+        list_count, task_count = import_user_data(get_jwt_identity(), request.stream)
+    except TransferError as e:
+        db.session.rollback()
+        return jsonify({
+            "ok": False,
+            "message": str(e)
+        }), 400
+    emit(get_jwt_identity(), "lists.imported", lists=list_count, tasks=task_count)
+    db.session.commit()
+
+    return jsonify({
+        "ok": True,
+        "message": f"Imported {list_count} lists and {task_count} tasks",
+        "lists": list_count,
+        "tasks": task_count,
+        "revision": current_revision(get_jwt_identity())
+    }), 201
+
+@bp_list.route("/<int:list_id>/reorder", methods=["POST"])
+@jwt_required()
+@handle_db_error
+def reorder_list(list_id):
+    """Move a list next to another one; only the moved list is written.
+
+    The body names one neighbour: ``after_id`` (``null`` for first) or
+    ``before_id`` (``null`` for last).
+    """
+    list_item = Lists.query.filter_by(id=list_id, user_id=get_jwt_identity()).first()
+    if not list_item:
+        return jsonify({
+            "ok": False,
+            "message": "List not found"
+        }), 404
+
+    try:
+        rank = reorder(list_item, request.get_json() or {})
+    except ReorderError as e:
+        return jsonify({
+            "ok": False,
+            "message": str(e)
+        }), 400
+    emit(list_item.user_id, "list.moved", id=list_item.id, rank=rank)
+    db.session.commit()
+
     return jsonify({
         "ok": True,
-        "lists": [list_schema.dump(list_) for list_ in lists]
+        "list": list_schema.dump(list_item)
     }), 200
 
 @bp_list.route("", methods=["POST"])
@@ -102,6 +396,8 @@ def create_list():
         )
         
         db.session.add(new_list)
+        db.session.flush()
+        emit(current_user_id, "list.created", list=list_schema.dump(new_list))
         db.session.commit()
         
         return jsonify({
@@ -131,6 +427,7 @@ def delete_list(list_id):
             "message": "List not found"
         }), 404
         
+    emit(current_user_id, "list.deleted", id=list_item.id)
     db.session.delete(list_item)
     db.session.commit()
     
@@ -0,0 +1,54 @@
+"""
+Server-Sent Events stream of the current user's changes.
+"""
+
+import json
+
+from flask import Blueprint, Response, current_app, request, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+bp_stream = Blueprint("stream", __name__)
+
+# ``EventSource`` cannot send headers; shared with the native ASGI stream
+TOKEN_LOCATIONS = ["headers", "query_string"]
+
+
+def format_event(event_id, type, data):
+    return f"id: {event_id}\nevent: {type}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+@bp_stream.route("", methods=["GET"])
+@jwt_required(locations=TOKEN_LOCATIONS)
+def stream():
+    """Stream change events as ``text/event-stream``.
+
+    ``EventSource`` cannot send headers, so the token may also be passed
+    as ``?jwt=``. Reconnecting clients send ``Last-Event-ID`` (or
+    ``?last_event_id=``) and receive the events they missed, or a
+    ``reset`` event when they must refetch. A comment line is sent every
+    ``STREAM_HEARTBEAT`` seconds to keep proxies from closing the
+    connection.
+    """
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    bus = current_app.extensions["events"]
+    subscription = bus.subscribe(get_jwt_identity(), last_event_id)
+    heartbeat = current_app.config.get("STREAM_HEARTBEAT", 15)
+
+    def generate():
+        try:
+            yield f"retry: 3000\nid: {last_event_id or bus.last_id}\n\n"
+            while True:
+                item = subscription.get(timeout=heartbeat)
+                yield format_event(*item) if item else ": keepalive\n\n"
+        finally:
+            subscription.close()
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
@@ -3,88 +3,168 @@ Tasks blueprint handling todo task management with enhanced features and error h
 """
 
 from flask import Blueprint, request, jsonify, current_app
-from flask_login import login_required, current_user
 from marshmallow import ValidationError
-from sqlalchemy import and_
-from core.models import Tasks, Lists, db
-from core.schemas import TaskSchema, TaskResponseSchema
-from core.utils.decorators import handle_exceptions
-from flask_jwt_extended import jwt_required
+from sqlalchemy import select, update, bindparam
+from collections import defaultdict
+from datetime import datetime, timedelta
+from core.models import (
+    Tasks, Lists, db, load_task_subtree, complete_subtrees,
+    refresh_ancestor_completion, next_revision, search_tasks, load_agenda,
+    MAX_TASK_DEPTH
+)
+from core.events import emit
+from core.ordering import reorder, ReorderError
+from core.schemas import TaskSchema
+from core.serializers import task_schema, task_results_schema
+from core.utils.decorators import handle_exceptions, etag_by_revision
+from flask_jwt_extended import jwt_required, get_jwt_identity
 
 bp_task = Blueprint("task", __name__)
 
+# Fields the batch endpoint may change; hierarchy changes go through /move
+# Ranks only change through /reorder and /move, which keep them distinct
+BATCH_FIELDS = ('name', 'description', 'is_completed', 'due_date', 'priority')
+
+batch_task_schema = TaskSchema(partial=True, many=True)
+
+MAX_SEARCH_RESULTS = 100
+
+AGENDA_VIEWS = ('overdue', 'today', 'upcoming')
+MAX_AGENDA_RESULTS = 500
+MAX_UTC_OFFSET = 14 * 60
+
 @bp_task.route("/batch", methods=["POST"])
-@login_required
+@jwt_required()
 @handle_exceptions
 def batch_update_tasks():
-    """Batch update multiple tasks efficiently."""
+    """Batch update multiple tasks with a constant number of statements.
+
+    Items are validated through ``TaskSchema``, grouped by the set of fields
+    they change and written with one executemany UPDATE per group.
+    Completion changes cascade through the affected subtrees and ancestors
+    set-based. Returns one result per submitted item.
+    """
     try:
-        data = request.get_json()
-        tasks = data.get('tasks', [])
-        
-        # Collect all task IDs
-        task_ids = [task['id'] for task in tasks if 'id' in task]
+        data = request.get_json() or {}
+        if not isinstance(data, dict):
+            return jsonify({"error": "Request body must be a JSON object"}), 400
+        items = data.get('tasks', [])
+        if not isinstance(items, list):
+            return jsonify({"error": "tasks must be a list"}), 400
         
-        # Verify ownership in single query
-        authorized_tasks = Tasks.query.join(Lists).filter(
-            and_(
+        def item_id(item):
+            task_id = item.get('id') if isinstance(item, dict) else None
+            return task_id if isinstance(task_id, int) and not isinstance(task_id, bool) else None
+
+        # Verify ownership of every submitted id in a single query
+        task_ids = {item_id(item) for item in items} - {None}
+        authorized_ids = set(db.session.scalars(
+            select(Tasks.id).join(Lists).where(
                 Tasks.id.in_(task_ids),
-                Lists.user_id == current_user.id
+                Lists.user_id == get_jwt_identity()
             )
-        ).all()
+        )) if task_ids else set()
+        
+        # ``id`` is dump-only, so loaded items line up with the input by index
+        try:
+            loaded = batch_task_schema.load(items)
+            errors = {}
+        except ValidationError as e:
+            loaded = e.valid_data if isinstance(e.valid_data, list) else [{}] * len(items)
+            errors = e.messages if isinstance(e.messages, dict) else {}
         
-        authorized_ids = {task.id for task in authorized_tasks}
+        results = []
+        changes = {}
+        for index, item in enumerate(items):
+            task_id = item.get('id') if isinstance(item, dict) else None
+            disallowed = sorted(set(item) - set(BATCH_FIELDS) - {'id'}) if isinstance(item, dict) else []
+            if item_id(item) is None:
+                results.append({"id": task_id, "status": "error",
+                                "errors": {"id": ["Must be an integer."]}})
+            elif task_id not in authorized_ids:
+                results.append({"id": task_id, "status": "not_found"})
+            elif index in errors or disallowed:
+                item_errors = dict(errors.get(index, {}))
+                for field in disallowed:
+                    item_errors[field] = ["Field cannot be updated in a batch."]
+                results.append({"id": task_id, "status": "error", "errors": item_errors})
+            else:
+                # Later items for the same task win field by field
+                changes.setdefault(task_id, {}).update(loaded[index])
+                results.append({"id": task_id, "status": "updated"})
         
-        # Batch update
-        updates = []
-        for task_data in tasks:
-            if task_data.get('id') in authorized_ids:
-                task = next(t for t in authorized_tasks if t.id == task_data['id'])
-                for key, value in task_data.items():
-                    if key != 'id' and hasattr(task, key):
-                        setattr(task, key, value)
-                updates.append(task)
+        # Group by changed field set so each group is a single executemany
+        groups = defaultdict(list)
+        completion = defaultdict(list)
+        for task_id, values in changes.items():
+            if 'is_completed' in values:
+                completion[bool(values.pop('is_completed'))].append(task_id)
+            if values:
+                groups[tuple(sorted(values))].append(dict(values, _id=task_id))
+        
+        tasks_table = Tasks.__table__
+        now = datetime.utcnow()
+        revision = next_revision(db.session.connection(), get_jwt_identity()) if changes else None
+        for fields, params in groups.items():
+            statement = update(tasks_table).where(
+                tasks_table.c.id == bindparam('_id')
+            ).values(
+                updated_at=now, revision=revision,
+                **{field: bindparam(field) for field in fields}
+            )
+            db.session.execute(statement, params)
         
-        if updates:
-            db.session.bulk_save_objects(updates)
-            db.session.commit()
+        for is_completed, ids in completion.items():
+            complete_subtrees(ids, is_completed)
+        if completion:
+            refresh_ancestor_completion([i for ids in completion.values() for i in ids])
         
+        if changes:
+            emit(get_jwt_identity(), "task.updated", ids=sorted(changes), revision=revision)
+        db.session.commit()
+        
+        updated_count = sum(1 for result in results if result['status'] == 'updated')
         return jsonify({
-            "message": f"Successfully updated {len(updates)} tasks",
-            "updated_count": len(updates)
+            "message": f"Successfully updated {updated_count} tasks",
+            "updated_count": updated_count,
+            "results": results
         }), 200
 
     except Exception as e:
         db.session.rollback()
-        current_app.logger.error(f"Batch update failed: {str(e)}")
+        current_app.logger.exception("Batch update failed")
         raise
 
 
 @bp_task.route("/<int:task_id>/move", methods=["POST"])
-@login_required
+@jwt_required()
 @handle_exceptions
 def move_task(task_id):
-    """Move task to different parent or list with proper depth recalculation."""
+    """Move task to different parent or list; depths follow via the hierarchy index."""
     try:
         data = request.get_json()
         new_parent_id = data.get('new_parent_id')
         new_list_id = data.get('new_list_id')
+        current_user_id = get_jwt_identity()
         
         task = Tasks.query.join(Lists).filter(
             Tasks.id == task_id,
-            Lists.user_id == current_user.id
+            Lists.user_id == current_user_id
         ).first_or_404()
         
         if new_parent_id:
             new_parent = Tasks.query.join(Lists).filter(
                 Tasks.id == new_parent_id,
-                Lists.user_id == current_user.id
+                Lists.user_id == current_user_id
             ).first_or_404()
             
-            # Check for circular reference
-            if task.id == new_parent_id or any(t.id == task.id for t in new_parent.get_ancestors()):
+            # Check for circular reference (closure lookup, no parent walk)
+            if task.is_ancestor_of(new_parent_id):
                 return jsonify({"error": "Cannot move task under itself"}), 400
             
+            if new_parent.task_depth + 1 + task.subtree_height() > MAX_TASK_DEPTH:
+                return jsonify({"error": "Tasks cannot be nested deeper than 3 levels"}), 400
+            
             task.parent_id = new_parent_id
             task.list_id = new_parent.list_id
             
@@ -92,67 +172,238 @@ def move_task(task_id):
             # Verify list ownership
             if not Lists.query.filter_by(
                 id=new_list_id,
-                user_id=current_user.id
+                user_id=current_user_id
             ).first():
                 return jsonify({"error": "List not found"}), 404
             
             task.list_id = new_list_id
             task.parent_id = None
         
-        # Recalculate depths
-        task.recalculate_depths()
+        # Depths, descendant list ids and the closure table are updated on flush
+        db.session.flush()
+        emit(current_user_id, "task.moved", id=task.id, list_id=task.list_id,
+             parent_id=task.parent_id, rank=task.rank)
         db.session.commit()
         
         return jsonify({
             "message": "Task moved successfully",
-            "task": TaskResponseSchema().dump(task)
+            "task": task.to_dict()
         }), 200
 
     except Exception as e:
         db.session.rollback()
-        current_app.logger.error(f"Task move failed: {str(e)}")
+        current_app.logger.exception("Task move failed")
         raise
 
 
+@bp_task.route("/<int:task_id>/reorder", methods=["POST"])
+@jwt_required()
+@handle_exceptions
+def reorder_task(task_id):
+    """Move a task next to a sibling; only the moved task is written.
+
+    The body names one neighbour under the same parent: ``after_id``
+    (``null`` for first) or ``before_id`` (``null`` for last). Use /move
+    to change the parent or list.
+    """
+    task = Tasks.query.join(Lists).filter(
+        Tasks.id == task_id,
+        Lists.user_id == get_jwt_identity()
+    ).first_or_404()
+
+    try:
+        rank = reorder(task, request.get_json() or {})
+    except ReorderError as e:
+        return jsonify({"error": str(e)}), 400
+    emit(get_jwt_identity(), "task.moved", id=task.id, list_id=task.list_id,
+         parent_id=task.parent_id, rank=rank)
+    db.session.commit()
+
+    return jsonify({
+        "message": "Task reordered",
+        "task": task.to_dict()
+    }), 200
+
+
 @bp_task.route("/<int:task_id>/toggle", methods=["POST"])
-@login_required
+@jwt_required()
 @handle_exceptions
 def toggle_task_completion(task_id):
-    """Toggle task completion status and handle subtasks."""
+    """Toggle task completion status, cascading to the whole subtree.
+
+    Returns the ids of every task whose status changed, including
+    ancestors completed or reopened by the roll-up, so clients can patch
+    their state without refetching the list.
+    """
     try:
         task = Tasks.query.join(Lists).filter(
-            Tasks.id == task_id
+            Tasks.id == task_id,
+            Lists.user_id == get_jwt_identity()
         ).first_or_404()
         
-        # Verify user owns the task
-        if task.list.user_id != current_user.id:
-            return jsonify({"error": "Unauthorized"}), 403
-        
-        # Toggle completion status
-        task.is_completed = not task.is_completed
-        
-        # If completing task, complete all subtasks
-        if task.is_completed:
-            for subtask in task.subtasks:
-                subtask.is_completed = True
+        # Toggle completion status for the task and all of its descendants
+        is_completed = not task.is_completed
+        list_id = task.list_id
+        changed_ids = task.set_completed(is_completed)
         
+        emit(get_jwt_identity(), "task.toggled", id=task_id, list_id=list_id,
+             is_completed=is_completed, changed_ids=changed_ids)
         db.session.commit()
         
         return jsonify({
             "message": "Task status updated",
-            "task": TaskSchema().dump(task)
+            "task": task.to_dict(),
+            "is_completed": is_completed,
+            "changed_ids": changed_ids
         }), 200
 
     except Exception as e:
         db.session.rollback()
-        current_app.logger.error(f"Task toggle failed: {str(e)}")
+        current_app.logger.exception("Task toggle failed")
         raise
 
+@bp_task.route("/<int:task_id>", methods=["GET"])
+@jwt_required()
+@etag_by_revision
+@handle_exceptions
+def get_task(task_id):
+    """Get a task with its full subtree, loaded in a single query."""
+    owned = db.session.query(Tasks.id).join(Lists).filter(
+        Tasks.id == task_id,
+        Lists.user_id == get_jwt_identity()
+    ).first()
+    if not owned:
+        return jsonify({"error": "Task not found"}), 404
+
+    return jsonify({"task": load_task_subtree(task_id)}), 200
+
+@bp_task.route("/search", methods=["GET"])
+@jwt_required()
+@etag_by_revision
+@handle_exceptions
+def search():
+    """Full-text search over the names and descriptions of the user's tasks.
+
+    Query parameters: ``q`` (required), ``list_id`` to search a single
+    list, and ``limit`` / ``offset`` for paging. Results are ordered by
+    relevance.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Query parameter q is required"}), 400
+
+    limit = max(1, min(request.args.get('limit', 20, type=int), MAX_SEARCH_RESULTS))
+    offset = max(0, request.args.get('offset', 0, type=int))
+    results = search_tasks(
+        get_jwt_identity(), query,
+        list_id=request.args.get('list_id', type=int),
+        limit=limit, offset=offset
+    )
+
+    return jsonify({
+        "query": query,
+        "results": task_results_schema.dump(results)
+    }), 200
+
+@bp_task.route("/agenda", methods=["GET"])
+@jwt_required()
+@handle_exceptions
+def agenda():
+    """Open tasks across all of the user's lists, grouped by due date.
+
+    Query parameters:
+
+    - ``view``: ``overdue`` (due before now), ``today`` (due from now to
+      the end of the day) or ``upcoming`` (the ``days`` after today);
+      all three groups are returned when absent.
+    - ``days``: length of the upcoming window, 7 by default.
+    - ``utc_offset``: the client's offset from UTC in minutes, used to
+      find the end of its day; at most 840 either way. Due dates are
+      stored in UTC.
+
+    Each group holds at most ``MAX_AGENDA_RESULTS`` tasks; ``truncated``
+    tells, per group, whether more were due.
+    """
+    view = request.args.get('view')
+    if view is not None and view not in AGENDA_VIEWS:
+        return jsonify({"error": f"view must be one of {', '.join(AGENDA_VIEWS)}"}), 400
+    days = max(0, min(request.args.get('days', 7, type=int), 366))
+    utc_offset = request.args.get('utc_offset', 0, type=int)
+    if abs(utc_offset) > MAX_UTC_OFFSET:
+        return jsonify({"error": f"utc_offset must be between -{MAX_UTC_OFFSET} and {MAX_UTC_OFFSET}"}), 400
+    offset = timedelta(minutes=utc_offset)
+
+    now = datetime.utcnow()
+    today_end = (now + offset).replace(hour=0, minute=0, second=0, microsecond=0) \
+        + timedelta(days=1) - offset
+    bounds = {
+        'overdue': (None, now),
+        'today': (now, today_end),
+        'upcoming': (today_end, today_end + timedelta(days=days)),
+    }
+
+    # One query per group, so a long overdue backlog cannot crowd out today
+    groups = {}
+    for name in ([view] if view else AGENDA_VIEWS):
+        start, end = bounds[name]
+        groups[name] = load_agenda(get_jwt_identity(), end, start, limit=MAX_AGENDA_RESULTS + 1)
+
+    return jsonify({
+        "now": now.isoformat(),
+        **{name: task_results_schema.dump(items[:MAX_AGENDA_RESULTS]) for name, items in groups.items()},
+        "truncated": {name: len(items) > MAX_AGENDA_RESULTS for name, items in groups.items()},
+    }), 200
+
 @bp_task.route("/", methods=["POST"])
 @jwt_required()
+@handle_exceptions
 def create_task():
-    # Your create task logic here
-    pass
+    """Create a task; its depth and hierarchy index are filled in on insert."""
+    try:
+        data = task_schema.load(request.get_json() or {})
+    except ValidationError as e:
+        return jsonify({"error": "Validation error", "messages": e.messages}), 400
+
+    current_user_id = get_jwt_identity()
+    if not Lists.query.filter_by(id=data['list_id'], user_id=current_user_id).first():
+        return jsonify({"error": "List not found"}), 404
+
+    parent_id = data.get('parent_id')
+    if parent_id:
+        parent = Tasks.query.filter_by(id=parent_id, list_id=data['list_id']).first()
+        if not parent:
+            return jsonify({"error": "Parent task not found"}), 404
+        if parent.task_depth >= MAX_TASK_DEPTH:
+            return jsonify({"error": "Tasks cannot be nested deeper than 3 levels"}), 400
+
+    task = Tasks(**data)
+    db.session.add(task)
+    db.session.flush()
+    emit(current_user_id, "task.created", task=task.to_dict())
+    db.session.commit()
+
+    return jsonify({
+        "message": "Task created",
+        "task": task.to_dict()
+    }), 201
+
+@bp_task.route("/<int:task_id>", methods=["DELETE"])
+@jwt_required()
+@handle_exceptions
+def delete_task(task_id):
+    """Delete a task together with its whole subtree."""
+    task = Tasks.query.join(Lists).filter(
+        Tasks.id == task_id,
+        Lists.user_id == get_jwt_identity()
+    ).first()
+    if not task:
+        return jsonify({"error": "Task not found"}), 404
+
+    emit(get_jwt_identity(), "task.deleted", id=task.id, list_id=task.list_id)
+    db.session.delete(task)
+    db.session.commit()
+
+    return jsonify({"message": "Task deleted"}), 200
 
 @bp_task.route("/<int:task_id>", methods=["PUT"])
 @jwt_required()
@@ -0,0 +1,158 @@
+"""
+In-process change feed for Server-Sent Events.
+
+Write endpoints call ``emit`` while handling a request. Events wait in
+the session until the transaction commits and are then published on the
+``EventBus``; a rollback drops them. Each event has a process-wide
+increasing id and goes to every subscriber of the event's user.
+
+Subscribers read from a bounded queue. A subscriber that falls more than
+``STREAM_QUEUE_SIZE`` events behind loses its queue and is sent a
+``reset`` event, after which the client should refetch (``?since=`` with
+its last revision is enough). The last ``STREAM_BUFFER_SIZE`` events are
+kept in a ring buffer so a reconnecting client resumes from its
+``Last-Event-ID``; one that has missed more than the buffer holds gets a
+``reset`` instead.
+
+The bus lives in one process. With several workers, a client only sees
+the changes made through the worker it is connected to.
+"""
+
+from collections import deque
+import queue
+import threading
+import time
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from core.models import db
+
+
+class Subscription:
+    """One client's view of the bus; iterate with ``get``.
+
+    ``notify``, if given, is called from the publishing thread whenever
+    something new is waiting, so event loops can wait without a thread.
+    """
+
+    def __init__(self, bus, user_id, maxsize, notify=None):
+        self.bus = bus
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize)
+        self.overflowed = False
+        self.notify = notify
+
+    def get(self, timeout=None):
+        """The next ``(id, type, data)`` event; None on timeout.
+
+        After an overflow, returns a ``reset`` event first. ``timeout=0``
+        never blocks.
+        """
+        if self.overflowed:
+            self.overflowed = False
+            return self.bus.reset_event("overflow")
+        try:
+            return self.queue.get(block=timeout != 0, timeout=timeout or None)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    def __init__(self, queue_size=256, buffer_size=1000):
+        self.queue_size = queue_size
+        self._buffer = deque(maxlen=buffer_size)  # (id, user_id, type, data)
+        self._subscribers = {}  # user_id -> set of Subscription
+        # Ids start from the boot time, so an id from before a restart is
+        # older than the buffer and the client is reset
+        self._last_id = int(time.time() * 1000)
+        self._lock = threading.Lock()
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+    def reset_event(self, reason):
+        return self._last_id, "reset", {"reason": reason}
+
+    def publish(self, user_id, type, data):
+        """Number the event, buffer it and hand it to the user's subscribers."""
+        with self._lock:
+            self._last_id += 1
+            item = (self._last_id, type, data)
+            self._buffer.append((self._last_id, user_id, type, data))
+            for subscription in self._subscribers.get(user_id, ()):
+                if subscription.overflowed:
+                    continue
+                try:
+                    subscription.queue.put_nowait(item)
+                except queue.Full:
+                    # The client reloads after the reset; queued events are moot
+                    subscription.overflowed = True
+                    with subscription.queue.mutex:
+                        subscription.queue.queue.clear()
+                if subscription.notify is not None:
+                    subscription.notify()
+            return self._last_id
+
+    def subscribe(self, user_id, last_event_id=None, notify=None):
+        """Subscribe to ``user_id``'s events, replaying those after ``last_event_id``."""
+        user_id = int(user_id)
+        subscription = Subscription(self, user_id, self.queue_size, notify)
+        with self._lock:
+            if last_event_id is not None and last_event_id != self._last_id:
+                oldest = self._buffer[0][0] if self._buffer else self._last_id + 1
+                missed = [(event_id, type, data) for event_id, owner, type, data in self._buffer
+                          if event_id > last_event_id and owner == user_id]
+                if not oldest - 1 <= last_event_id < self._last_id or len(missed) > self.queue_size:
+                    subscription.overflowed = True
+                else:
+                    for item in missed:
+                        subscription.queue.put_nowait(item)
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+
+def init_event_bus(app):
+    bus = EventBus(
+        queue_size=app.config.get("STREAM_QUEUE_SIZE", 256),
+        buffer_size=app.config.get("STREAM_BUFFER_SIZE", 1000),
+    )
+    app.extensions["events"] = bus
+    return bus
+
+
+def emit(user_id, type, **data):
+    """Queue an event for ``user_id`` to publish when the session commits."""
+    db.session.info.setdefault("pending_events", []).append((int(user_id), type, data))
+
+
+@event.listens_for(Session, "after_commit")
+def publish_pending_events(session):
+    pending = session.info.pop("pending_events", None)
+    if pending and has_app_context():
+        bus = current_app.extensions.get("events")
+        if bus is not None:
+            for user_id, type, data in pending:
+                bus.publish(user_id, type, data)
+
+
+@event.listens_for(Session, "after_rollback")
+def drop_pending_events(session):
+    session.info.pop("pending_events", None)
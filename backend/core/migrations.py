@@ -0,0 +1,166 @@
+"""
+Schema migrations for the SQLite database.
+
+The schema version is kept in SQLite's ``PRAGMA user_version``. On startup
+``migrate`` creates missing tables, then runs every migration newer than
+the stored version in order and records the new version. A brand-new
+database already has the current schema from ``create_all`` and is only
+stamped.
+
+SQLite commits DDL statements as they run, so a migration that fails
+halfway is not rolled back. Each migration is written to be safe to run
+again (missing columns and indexes are checked first), so restarting
+the app retries it.
+"""
+
+from sqlalchemy import inspect
+from core.models import db, rebuild_task_hierarchy, TASK_SEARCH_DDL
+
+MIGRATIONS = []
+
+
+def migration(version):
+    """Register ``fn(connection)`` as the migration to schema ``version``."""
+    def decorator(fn):
+        MIGRATIONS.append((version, fn))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return fn
+    return decorator
+
+
+def schema_version(connection):
+    return connection.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def _set_schema_version(connection, version):
+    connection.exec_driver_sql(f"PRAGMA user_version = {int(version)}")
+
+
+def add_columns(connection, table_name, columns):
+    """``ALTER TABLE ADD COLUMN`` for each ``name: ddl`` the table lacks.
+
+    Migrations spell out their columns so that later model changes do not
+    leak into them.
+    """
+    existing = {column["name"] for column in inspect(connection).get_columns(table_name)}
+    for name, ddl in columns.items():
+        if name not in existing:
+            connection.exec_driver_sql(f"ALTER TABLE {table_name} ADD COLUMN {name} {ddl}")
+
+
+def create_indexes(connection, indexes):
+    """``CREATE INDEX IF NOT EXISTS`` for each ``name: "table (columns)"``."""
+    for name, target in indexes.items():
+        connection.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+
+
+@migration(1)
+def add_hierarchy_and_revision_columns(connection):
+    """Depth, completion counters and revision columns on existing tables."""
+    add_columns(connection, "users", {"revision": "INTEGER DEFAULT 0 NOT NULL"})
+    add_columns(connection, "lists", {"revision": "INTEGER DEFAULT 0 NOT NULL"})
+    add_columns(connection, "tasks", {
+        "task_depth": "INTEGER DEFAULT 0 NOT NULL",
+        "children_total": "INTEGER DEFAULT 0 NOT NULL",
+        "children_completed": "INTEGER DEFAULT 0 NOT NULL",
+        "revision": "INTEGER DEFAULT 0 NOT NULL",
+    })
+
+
+@migration(2)
+def add_task_indexes(connection):
+    """Composite indexes for the list roots, child and delta-sync lookups."""
+    # The two creation-ordered indexes were replaced by rank ones in 6
+    create_indexes(connection, {
+        "ix_tasks_list_parent_created": "tasks (list_id, parent_id, created_at)",
+        "ix_tasks_parent_created": "tasks (parent_id, created_at)",
+        "ix_tasks_list_revision": "tasks (list_id, revision)",
+    })
+
+
+@migration(3)
+def backfill_task_hierarchy(connection):
+    """Closure table, depths and counters for tasks created before them."""
+    rebuild_task_hierarchy(connection)
+
+
+@migration(4)
+def add_task_search_index(connection):
+    """FTS5 index over task names and descriptions, filled from ``tasks``."""
+    for statement in TASK_SEARCH_DDL:
+        connection.exec_driver_sql(statement)
+    connection.exec_driver_sql("INSERT INTO tasks_fts (tasks_fts) VALUES ('rebuild')")
+
+
+@migration(5)
+def add_due_date_index(connection):
+    """Index for the agenda views and the reminder window."""
+    create_indexes(connection, {"ix_tasks_due_completed": "tasks (due_date, is_completed)"})
+
+
+@migration(6)
+def add_ranks(connection):
+    """Rank columns and indexes, backfilled in the previous display order."""
+    add_columns(connection, "lists", {"rank": "VARCHAR(64)"})
+    add_columns(connection, "tasks", {"rank": "VARCHAR(64)"})
+    connection.exec_driver_sql("DROP INDEX IF EXISTS ix_tasks_list_parent_created")
+    connection.exec_driver_sql("DROP INDEX IF EXISTS ix_tasks_parent_created")
+    create_indexes(connection, {
+        "ix_lists_user_rank": "lists (user_id, rank)",
+        "ix_tasks_list_parent_rank": "tasks (list_id, parent_id, rank)",
+        "ix_tasks_parent_rank": "tasks (parent_id, rank)",
+    })
+
+    # Fixed-width ranks: lists by order index, tasks by creation
+    connection.exec_driver_sql("""
+        UPDATE lists SET rank = printf('%06dV', ordered.position)
+        FROM (
+            SELECT id, row_number() OVER (
+                PARTITION BY user_id ORDER BY coalesce(order_index, 0), id
+            ) AS position FROM lists
+        ) AS ordered
+        WHERE lists.id = ordered.id AND lists.rank IS NULL
+    """)
+    connection.exec_driver_sql("""
+        UPDATE tasks SET rank = printf('%06dV', ordered.position)
+        FROM (
+            SELECT id, row_number() OVER (
+                PARTITION BY list_id, parent_id ORDER BY created_at, id
+            ) AS position FROM tasks
+        ) AS ordered
+        WHERE tasks.id = ordered.id AND tasks.rank IS NULL
+    """)
+
+
+@migration(7)
+def add_tombstone_retention(connection):
+    """Tombstone timestamps for pruning and the per-user pruning horizon."""
+    add_columns(connection, "tombstones", {"created_at": "DATETIME"})
+    add_columns(connection, "users", {"tombstone_horizon": "INTEGER DEFAULT 0 NOT NULL"})
+    # Existing tombstones get a full retention period from now
+    connection.exec_driver_sql(
+        "UPDATE tombstones SET created_at = strftime('%Y-%m-%d %H:%M:%f', 'now') "
+        "WHERE created_at IS NULL"
+    )
+
+
+def migrate(engine):
+    """Bring the database at ``engine`` up to the latest schema version.
+
+    Returns the list of versions that were applied.
+    """
+    head = MIGRATIONS[-1][0] if MIGRATIONS else 0
+    with engine.begin() as connection:
+        fresh = not inspect(connection).get_table_names()
+        db.metadata.create_all(connection)
+        if fresh:
+            _set_schema_version(connection, head)
+            return []
+
+        applied = []
+        for version, fn in MIGRATIONS:
+            if version > schema_version(connection):
+                fn(connection)
+                _set_schema_version(connection, version)
+                applied.append(version)
+        return applied
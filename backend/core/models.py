@@ -5,14 +5,29 @@ Database models for the Todo application using SQLAlchemy.
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from datetime import datetime
-from sqlalchemy import event
-from sqlalchemy.orm import relationship, backref
+from sqlalchemy import (
+    event, select, func, delete, update, literal, literal_column, inspect, case,
+    table, column, text, DDL, bindparam
+)
+from sqlalchemy.orm import relationship, backref, Session
+from sqlalchemy.sql.dml import UpdateBase
 from sqlalchemy import ForeignKey
+from sqlalchemy.engine import Engine
 from sqlalchemy.types import JSON
 from werkzeug.security import generate_password_hash, check_password_hash
+import threading
+from core.utils.ranks import rank_between, spaced_ranks
+from core.serializers import (
+    TASK_FIELDS, serialize_task_row, task_to_dict, highlight_snippet,
+    SNIPPET_OPEN, SNIPPET_CLOSE
+)
+import re
 
 db = SQLAlchemy()
 
+# Tasks may be nested at depths 0, 1 and 2
+MAX_TASK_DEPTH = 2
+
 class Users(db.Model, UserMixin):
     """User model representing application users."""
     __tablename__ = 'users'
@@ -21,6 +36,10 @@ class Users(db.Model, UserMixin):
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(256))
+    # Bumped once per transaction that changes any of the user's lists or tasks
+    revision = db.Column(db.Integer, default=0, nullable=False)
+    # Highest revision of a pruned tombstone; older ``since`` values must refetch
+    tombstone_horizon = db.Column(db.Integer, default=0, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     lists = relationship('Lists', backref='user', lazy=True, cascade="all, delete-orphan")
@@ -30,11 +49,7 @@ class Users(db.Model, UserMixin):
 
     
     def check_password(self, password):
-        print(f"Checking password for user: {self.username}")
-        print(f"Password hash in DB: {self.password_hash}")
-        result = check_password_hash(self.password_hash, password)
-        print(f"Password check result: {result}")
-        return result
+        return check_password_hash(self.password_hash, password)
     
     def get_id(self):
         return str(self.id)
@@ -55,9 +70,12 @@ class Lists(db.Model):
     name = db.Column(db.String(200), nullable=False)
     user_id = db.Column(db.Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
     order_index = db.Column(db.Integer, index=True)
+    # Lexicographic position among the user's lists; see core.utils.ranks
+    rank = db.Column(db.String(64))
     description = db.Column(db.Text)
     is_archived = db.Column(db.Boolean, default=False)
     collapsed_tasks = db.Column(JSON, default=list)
+    revision = db.Column(db.Integer, default=0, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, onupdate=datetime.utcnow)
 
@@ -66,8 +84,14 @@ class Lists(db.Model):
         backref="list",
         lazy="select",  # Changed from selectin to select
         cascade="all, delete-orphan",
+        # Deleting a list removes its tasks set-based; see delete_list_tasks
+        passive_deletes=True,
         primaryjoin="and_(Lists.id==Tasks.list_id, Tasks.parent_id==None)",
-        order_by="Tasks.created_at"
+        order_by="Tasks.rank, Tasks.id"
+    )
+
+    __table_args__ = (
+        db.Index('ix_lists_user_rank', 'user_id', 'rank'),
     )
 
     def to_dict(self, include_tasks=True):
@@ -76,14 +100,16 @@ class Lists(db.Model):
             "name": self.name,
             "description": self.description,
             "order_index": self.order_index,
+            "rank": self.rank,
             "is_archived": self.is_archived,
             "collapsed_tasks": self.collapsed_tasks or [],
+            "revision": self.revision,
             "created_at": self.created_at.isoformat(),
             "updated_at": self.updated_at.isoformat() if self.updated_at else None
         }
         if include_tasks:
-            # Changed how we access tasks
-            data["tasks"] = [task.to_dict() for task in self.tasks]
+            # Whole forest in one recursive query instead of lazy loads per level
+            data["tasks"] = load_task_forests([self.id]).get(self.id, [])
         return data
 
 class Tasks(db.Model):
@@ -98,50 +124,983 @@ class Tasks(db.Model):
     is_completed = db.Column(db.Boolean, default=False)
     due_date = db.Column(db.DateTime)
     priority = db.Column(db.Integer, default=0)
+    # Lexicographic position among siblings; see core.utils.ranks
+    rank = db.Column(db.String(64))
+    task_depth = db.Column(db.Integer, default=0, nullable=False)
+    # Direct children, kept up to date by delta in the completion listeners
+    children_total = db.Column(db.Integer, default=0, nullable=False)
+    children_completed = db.Column(db.Integer, default=0, nullable=False)
+    revision = db.Column(db.Integer, default=0, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, onupdate=datetime.utcnow)
 
     parent = db.relationship('Tasks', 
         remote_side=[id],  # Specify which side is "remote"
-        backref=db.backref('subtasks', lazy='dynamic'),
+        # Subtrees are deleted set-based by the before_delete listener
+        backref=db.backref('subtasks', lazy='dynamic', passive_deletes='all'),
         uselist=False,  # This makes it many-to-one instead of many-to-many
         foreign_keys=[parent_id]
     )
 
+    __table_args__ = (
+        # Siblings in display order: list roots, tree anchors and ranking
+        db.Index('ix_tasks_list_parent_rank', 'list_id', 'parent_id', 'rank'),
+        # Children of a task: tree recursion and parent foreign key checks
+        db.Index('ix_tasks_parent_rank', 'parent_id', 'rank'),
+        # Delta sync: tasks of a list changed after a revision
+        db.Index('ix_tasks_list_revision', 'list_id', 'revision'),
+        # Agenda views and the reminder scheduler's due-date window
+        db.Index('ix_tasks_due_completed', 'due_date', 'is_completed'),
+    )
+
     def to_dict(self):
-        return {
-            "id": self.id,
-            "name": self.name,
-            "description": self.description,
-            "list_id": self.list_id,
-            "parent_id": self.parent_id,
-            "is_completed": self.is_completed,
-            "due_date": self.due_date.isoformat() if self.due_date else None,
-            "priority": self.priority,
-            "created_at": self.created_at.isoformat(),
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None
-        }
+        return task_to_dict(self)
 
     @property
     def user_id(self):
         """Proxy property to get the user_id from the associated List."""
         return self.list.user_id
 
+    def get_ancestors(self):
+        """Return the ancestors of this task, root first."""
+        return Tasks.query.join(
+            TaskClosure, TaskClosure.ancestor_id == Tasks.id
+        ).filter(
+            TaskClosure.descendant_id == self.id,
+            TaskClosure.depth > 0
+        ).order_by(TaskClosure.depth.desc()).all()
+
+    def get_descendants(self):
+        """Return every task below this one, shallowest first."""
+        return Tasks.query.join(
+            TaskClosure, TaskClosure.descendant_id == Tasks.id
+        ).filter(
+            TaskClosure.ancestor_id == self.id,
+            TaskClosure.depth > 0
+        ).order_by(TaskClosure.depth, Tasks.id).all()
+
+    def is_ancestor_of(self, task_id):
+        """Check whether ``task_id`` is this task or lies in its subtree."""
+        return db.session.query(TaskClosure.query.filter_by(
+            ancestor_id=self.id, descendant_id=task_id
+        ).exists()).scalar()
+
+    def set_completed(self, completed):
+        """Set the completion status of this task and its whole subtree.
+
+        The subtree is updated with one set-based UPDATE over the closure
+        table, then the change is rolled up through the ancestors. Returns
+        the ids of every task whose status changed.
+        """
+        tasks = Tasks.__table__
+        closure = TaskClosure.__table__
+        subtree = _subtree_ids(self.id)
+        connection = db.session.connection()
+
+        changed_ids = connection.scalars(
+            select(tasks.c.id).where(
+                tasks.c.id.in_(subtree),
+                tasks.c.is_completed.isnot(completed)
+            ).order_by(tasks.c.id)
+        ).all()
+        if not changed_ids:
+            return []
+
+        connection.execute(update(tasks).where(tasks.c.id.in_(subtree)).values(
+            is_completed=completed,
+            children_completed=tasks.c.children_total if completed else 0,
+            revision=next_revision(connection, _list_owner(connection, self.list_id)),
+            updated_at=datetime.utcnow()
+        ))
+        if self.id in changed_ids:
+            changed_ids += _roll_up_completion(
+                connection, self.parent_id, 0, 1 if completed else -1
+            )
+
+        db.session.expire(self)
+        return changed_ids
+
+    def subtree_height(self):
+        """Number of levels below this task (0 for a leaf)."""
+        return db.session.query(func.max(TaskClosure.depth)).filter(
+            TaskClosure.ancestor_id == self.id
+        ).scalar() or 0
+
+
+class TaskClosure(db.Model):
+    """Closure table holding every (ancestor, descendant) pair of the task hierarchy.
+
+    Each task has a row pointing at itself with depth 0, so ancestor,
+    descendant, depth and cycle checks are single indexed lookups.
+    """
+    __tablename__ = 'task_closure'
+
+    ancestor_id = db.Column(db.Integer, ForeignKey("tasks.id", ondelete="CASCADE"), primary_key=True)
+    descendant_id = db.Column(db.Integer, ForeignKey("tasks.id", ondelete="CASCADE"), primary_key=True)
+    depth = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_task_closure_descendant_depth', 'descendant_id', 'depth'),
+    )
+
+
+class Tombstones(db.Model):
+    """Record of a deleted list or task, kept so clients can sync deletions.
+
+    A task moved to another list also gets one, keyed to the list it left.
+    Tombstones are pruned after ``TOMBSTONE_RETENTION_DAYS``; see
+    :func:`prune_tombstones`.
+    """
+    __tablename__ = 'tombstones'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    entity = db.Column(db.String(10), nullable=False)  # 'list' or 'task'
+    entity_id = db.Column(db.Integer, nullable=False)
+    list_id = db.Column(db.Integer)
+    revision = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_tombstones_user_revision', 'user_id', 'revision'),
+    )
+
+
+# Full-text index over task names and descriptions. FTS5 keeps only the
+# index (external content) and reads the text back from ``tasks``; the
+# triggers keep it in sync for ORM flushes and bulk statements alike.
+TASK_SEARCH_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5("
+    "name, description, content='tasks', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN "
+    "INSERT INTO tasks_fts (rowid, name, description) VALUES (new.id, new.name, new.description); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN "
+    "INSERT INTO tasks_fts (tasks_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF name, description ON tasks BEGIN "
+    "INSERT INTO tasks_fts (tasks_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); "
+    "INSERT INTO tasks_fts (rowid, name, description) VALUES (new.id, new.name, new.description); "
+    "END",
+)
+for _statement in TASK_SEARCH_DDL:
+    event.listen(Tasks.__table__, 'after_create', DDL(_statement).execute_if(dialect='sqlite'))
+event.listen(Tasks.__table__, 'before_drop', DDL("DROP TABLE IF EXISTS tasks_fts").execute_if(dialect='sqlite'))
+
+tasks_fts = table('tasks_fts', column('rowid'))
+
+
+def _sibling_key(tasks):
+    # (rank, id) key; " " and "/" sort below every rank digit, so the
+    # concatenated keys sort depth-first with siblings in rank order
+    return func.printf("%s %010d", func.coalesce(tasks.c.rank, ""), tasks.c.id)
+
+
+def task_tree_query(*conditions):
+    """Select the tasks matching ``conditions`` together with their subtrees.
+
+    Uses a single ``WITH RECURSIVE`` query rather than walking the
+    ``subtasks`` relationship level by level. Rows hold ``TASK_FIELDS``
+    followed by their level below the matched task, in depth-first
+    pre-order with siblings ordered by rank.
+    """
+    tasks = Tasks.__table__
+    columns = [tasks.c[name] for name in TASK_FIELDS]
+
+    tree = select(
+        *columns, literal(0).label("level"), _sibling_key(tasks).label("sort_path")
+    ).where(*conditions).cte("task_tree", recursive=True)
+    tree = tree.union_all(
+        select(
+            *columns, tree.c.level + 1,
+            (tree.c.sort_path + "/" + _sibling_key(tasks))
+        ).join(tree, tasks.c.parent_id == tree.c.id)
+    )
+    return select(
+        *[tree.c[name] for name in TASK_FIELDS], tree.c.level
+    ).order_by(tree.c.sort_path)
+
+
+def _build_task_tree(rows):
+    """Nest flat task rows by ``parent_id``.
+
+    Returns ``(nodes, roots)`` where ``nodes`` maps task id to its dict and
+    ``roots`` holds the nodes whose parent is not part of ``rows``.
+    """
+    nodes = {}
+    ordered = []
+    width = len(TASK_FIELDS)
+    for row in rows:
+        node = serialize_task_row(row[:width])
+        node["subtasks"] = []
+        nodes[node["id"]] = node
+        ordered.append(node)
+
+    roots = []
+    for node in ordered:
+        parent = nodes.get(node["parent_id"])
+        if parent is not None:
+            parent["subtasks"].append(node)
+        else:
+            roots.append(node)
+    return nodes, roots
+
+
+def load_task_forests(list_ids):
+    """Load the nested task forest of every list in ``list_ids``.
+
+    Returns a dict mapping each list id to its root tasks, each carrying a
+    ``subtasks`` list. All lists are fetched with one query.
+    """
+    list_ids = list(list_ids)
+    if not list_ids:
+        return {}
+
+    tasks = Tasks.__table__
+    rows = db.session.execute(task_tree_query(
+        tasks.c.list_id.in_(list_ids),
+        tasks.c.parent_id.is_(None)
+    )).all()
+    _, roots = _build_task_tree(rows)
+
+    forests = {list_id: [] for list_id in list_ids}
+    for root in roots:
+        forests.setdefault(root["list_id"], []).append(root)
+    return forests
+
+
+def load_list_summaries(user_id):
+    """Task counts for every list of a user, without loading any task rows.
+
+    Runs one grouped COUNT over the user's lists and returns a dict per
+    list holding its columns plus ``total_tasks``, ``completed_tasks``,
+    ``task_count`` (top-level tasks only) and ``completion_rate``.
+    """
+    total = func.count(Tasks.id)
+    completed = func.coalesce(func.sum(case((Tasks.is_completed.is_(True), 1), else_=0)), 0)
+    top_level = func.coalesce(func.sum(case((Tasks.parent_id.is_(None), 1), else_=0)), 0)
+
+    rows = db.session.execute(
+        select(Lists.__table__, total, completed, top_level)
+        .outerjoin(Tasks.__table__, Tasks.list_id == Lists.id)
+        .where(Lists.user_id == user_id)
+        .group_by(Lists.id)
+        .order_by(Lists.rank, Lists.id)
+    ).all()
+
+    summaries = []
+    for row in rows:
+        summary = dict(row._mapping)
+        total_tasks, completed_tasks, task_count = row[-3:]
+        summary.update(
+            total_tasks=total_tasks,
+            completed_tasks=completed_tasks,
+            task_count=task_count,
+            completion_rate=round(completed_tasks / total_tasks, 4) if total_tasks else 0.0
+        )
+        summaries.append(summary)
+    return summaries
+
+
+def load_task_subtree(task_id):
+    """Load one task with all of its nested subtasks in a single query.
+
+    Returns ``None`` if the task does not exist.
+    """
+    tasks = Tasks.__table__
+    rows = db.session.execute(task_tree_query(tasks.c.id == task_id)).all()
+    nodes, _ = _build_task_tree(rows)
+    return nodes.get(task_id)
+
+
+def search_tasks(user_id, query, list_id=None, limit=20, offset=0):
+    """Rank the user's tasks whose name or description match ``query``.
+
+    Every word of ``query`` must match the start of a word in the task;
+    matches in names weigh ten times more than in descriptions. Each
+    result carries ``list_name``, ``parent_name``, ``path`` (ancestor ids,
+    root first), a highlighted ``snippet`` and its ``score``; values are
+    left unconverted for ``TaskResponseSchema`` to dump.
+    """
+    terms = re.findall(r"\w+", query)
+    if not terms:
+        return []
+    match = " ".join(f'"{term}"*' for term in terms)
+
+    tasks = Tasks.__table__
+    lists = Lists.__table__
+    parents = tasks.alias("parents")
+    fts = literal_column("tasks_fts")
+    rank = func.bm25(fts, 10.0, 1.0)
+
+    statement = select(
+        *(tasks.c[name] for name in TASK_FIELDS),
+        lists.c.name,
+        parents.c.name,
+        func.snippet(fts, -1, SNIPPET_OPEN, SNIPPET_CLOSE, "\u2026", 12),
+        rank
+    ).select_from(
+        tasks_fts
+        .join(tasks, tasks.c.id == tasks_fts.c.rowid)
+        .join(lists, lists.c.id == tasks.c.list_id)
+        .outerjoin(parents, parents.c.id == tasks.c.parent_id)
+    ).where(
+        text("tasks_fts MATCH :match").bindparams(match=match),
+        lists.c.user_id == user_id
+    ).order_by(rank, tasks.c.id).limit(limit).offset(offset)
+    if list_id is not None:
+        statement = statement.where(tasks.c.list_id == list_id)
+
+    width = len(TASK_FIELDS)
+    results = []
+    for row in db.session.execute(statement):
+        data = dict(zip(TASK_FIELDS, row))
+        data.update(
+            list_name=row[width],
+            parent_name=row[width + 1],
+            snippet=highlight_snippet(row[width + 2]),
+            score=-row[width + 3],
+            path=[]
+        )
+        results.append(data)
+
+    # Ancestor paths for all results in one closure lookup
+    by_id = {data["id"]: data for data in results}
+    if by_id:
+        closure = TaskClosure.__table__
+        for descendant_id, ancestor_id in db.session.execute(
+            select(closure.c.descendant_id, closure.c.ancestor_id)
+            .where(closure.c.descendant_id.in_(by_id), closure.c.depth > 0)
+            .order_by(closure.c.descendant_id, closure.c.depth.desc())
+        ):
+            by_id[descendant_id]["path"].append(ancestor_id)
+    return results
+
+
+def load_agenda(user_id, before, after=None, limit=None):
+    """The user's open tasks due in ``[after, before)``, soonest first.
+
+    Ties are broken by descending priority. Each task carries its
+    ``list_name``; values are left unconverted for ``TaskResponseSchema``.
+    """
+    tasks = Tasks.__table__
+    lists = Lists.__table__
+    statement = select(
+        *(tasks.c[name] for name in TASK_FIELDS), lists.c.name
+    ).join(lists, lists.c.id == tasks.c.list_id).where(
+        lists.c.user_id == user_id,
+        tasks.c.due_date < before,
+        tasks.c.is_completed.isnot(True)
+    ).order_by(tasks.c.due_date, tasks.c.priority.desc(), tasks.c.id).limit(limit)
+    if after is not None:
+        statement = statement.where(tasks.c.due_date >= after)
+
+    return [
+        dict(zip(TASK_FIELDS, row), list_name=row[-1])
+        for row in db.session.execute(statement)
+    ]
+
+
+def current_revision(user_id):
+    """The user's change counter; any write to their lists or tasks bumps it."""
+    return db.session.scalar(select(Users.revision).where(Users.id == user_id)) or 0
+
+
+class StaleRevision(ValueError):
+    """``since`` predates the pruned tombstones; the client must refetch."""
+
+
+def load_changes(user_id, since, list_id=None):
+    """Lists, tasks and deletions recorded after revision ``since``.
+
+    Restricted to one list when ``list_id`` is given. Tasks are returned
+    flat; clients place them using ``parent_id``. A task that left the
+    list is reported as deleted from it. Raises ``StaleRevision`` when
+    tombstones after ``since`` may have been pruned.
+    """
+    horizon = db.session.scalar(select(Users.tombstone_horizon).where(Users.id == user_id)) or 0
+    if since < horizon:
+        raise StaleRevision(f"Revision {since} is older than the retained deletions")
+    changed_lists = Lists.query.filter(
+        Lists.user_id == user_id,
+        Lists.revision > since
+    )
+    changed_tasks = select(
+        *[Tasks.__table__.c[name] for name in TASK_FIELDS]
+    ).join(Lists).where(
+        Lists.user_id == user_id,
+        Tasks.revision > since
+    ).order_by(Tasks.task_depth, Tasks.id)
+    deleted = Tombstones.query.filter(
+        Tombstones.user_id == user_id,
+        Tombstones.revision > since
+    )
+    if list_id is not None:
+        changed_lists = changed_lists.filter(Lists.id == list_id)
+        changed_tasks = changed_tasks.where(Tasks.list_id == list_id)
+        deleted = deleted.filter(
+            ((Tombstones.entity == 'list') & (Tombstones.entity_id == list_id)) |
+            (Tombstones.list_id == list_id)
+        )
+
+    deleted = deleted.all()
+    tasks = [serialize_task_row(row) for row in db.session.execute(changed_tasks)]
+    # A task moved away and back again is still here
+    present = {task["id"] for task in tasks}
+    return {
+        "lists": [list_.to_dict(include_tasks=False) for list_ in changed_lists],
+        "tasks": tasks,
+        "deleted": {
+            "lists": [t.entity_id for t in deleted if t.entity == 'list'],
+            "tasks": list(dict.fromkeys(
+                t.entity_id for t in deleted if t.entity == 'task' and t.entity_id not in present
+            ))
+        }
+    }
+
+
+def prune_tombstones(connection, before):
+    """Delete tombstones created before ``before`` and raise the owners' horizons.
+
+    A client whose ``since`` is below its horizon may have missed a
+    deletion and gets ``StaleRevision`` instead of a delta. Returns the
+    number of tombstones deleted.
+    """
+    tombstones = Tombstones.__table__
+    users = Users.__table__
+    expired = tombstones.c.created_at < before
+    pruned = select(func.max(tombstones.c.revision)).where(
+        tombstones.c.user_id == users.c.id, expired
+    ).scalar_subquery()
+    connection.execute(update(users).where(
+        users.c.id.in_(select(tombstones.c.user_id).where(expired))
+    ).values(tombstone_horizon=func.max(users.c.tombstone_horizon, pruned)))
+    return connection.execute(delete(tombstones).where(expired)).rowcount
+
+
+def _tombstone_tasks(connection, user_id, list_id, revision, task_ids):
+    """Tombstone the tasks selected by ``task_ids`` as gone from ``list_id``."""
+    ids = task_ids.subquery()
+    connection.execute(Tombstones.__table__.insert().from_select(
+        ["user_id", "entity", "entity_id", "list_id", "revision", "created_at"],
+        select(
+            literal(user_id), literal("task"), list(ids.c)[0],
+            literal(list_id), literal(revision), literal(datetime.utcnow())
+        )
+    ))
+
+
+def _list_owner(connection, list_id):
+    owners = connection.info.setdefault('list_owners', {})
+    if list_id not in owners:
+        owners[list_id] = connection.scalar(
+            select(Lists.user_id).where(Lists.id == list_id)
+        )
+    return owners[list_id]
+
+
+def next_revision(connection, user_id):
+    """Bump the user's change counter once per transaction and return it.
+
+    Every row written in the same transaction shares the revision, so a
+    client that synced up to ``r`` sees the whole transaction at ``r + 1``.
+    """
+    revisions = connection.info.setdefault('revisions', {})
+    if user_id not in revisions:
+        users = Users.__table__
+        revisions[user_id] = connection.scalar(
+            update(users).where(users.c.id == user_id)
+            .values(revision=users.c.revision + 1)
+            .returning(users.c.revision)
+        ) or 0
+    return revisions[user_id]
+
+
+def _owner_revision(list_id_column):
+    """SQL expression for the current revision of the list's owner.
+
+    Used by set-based task updates issued after ``next_revision()`` in
+    the same transaction.
+    """
+    return select(Users.revision).join(
+        Lists, Lists.user_id == Users.id
+    ).where(Lists.id == list_id_column).scalar_subquery()
+
+
+@event.listens_for(Engine, 'commit')
+@event.listens_for(Engine, 'rollback')
+def reset_revision_cache(connection):
+    connection.info.pop('revisions', None)
+    connection.info.pop('list_owners', None)
+    connection.info.pop('last_ranks', None)
+
+
+def list_siblings(user_id):
+    """Conditions selecting the lists ranked together with a user's list."""
+    return (Lists.__table__.c.user_id == user_id,)
+
+
+def task_siblings(list_id, parent_id):
+    """Conditions selecting the tasks ranked together under one parent."""
+    tasks = Tasks.__table__
+    return (
+        tasks.c.list_id == list_id,
+        tasks.c.parent_id.is_(None) if parent_id is None else tasks.c.parent_id == parent_id
+    )
+
+
+def _append_rank(connection, model, group, conditions):
+    """Rank after the last of the group's siblings.
+
+    The last rank handed out per group is remembered for the transaction,
+    so several siblings inserted in one flush still get distinct ranks.
+    """
+    table = model.__table__
+    last_ranks = connection.info.setdefault('last_ranks', {})
+    last = last_ranks.get(group)
+    if last is None:
+        last = connection.scalar(select(func.max(table.c.rank)).where(*conditions))
+    rank = rank_between(last, None)
+    last_ranks[group] = rank
+    return rank
+
+
+def rebalance_ranks(connection, model, conditions, user_id):
+    """Rewrite one sibling group's ranks with short, evenly spaced keys.
+
+    Keeps the current order and bumps the owner's revision on every
+    rewritten row. Returns the number of rows written.
+    """
+    table = model.__table__
+    ids = connection.scalars(
+        select(table.c.id).where(*conditions).order_by(table.c.rank, table.c.id)
+    ).all()
+    if not ids:
+        return 0
+    revision = next_revision(connection, user_id)
+    connection.execute(
+        update(table).where(table.c.id == bindparam('_id'))
+        .values(rank=bindparam('_rank'), revision=revision),
+        [{'_id': row_id, '_rank': rank} for row_id, rank in zip(ids, spaced_ranks(len(ids)))]
+    )
+    connection.info.pop('last_ranks', None)
+    return len(ids)
+
+
+@event.listens_for(Lists, 'before_insert')
+def rank_new_list(mapper, connection, target):
+    if target.rank is None:
+        target.rank = _append_rank(
+            connection, Lists, ('list', target.user_id), list_siblings(target.user_id)
+        )
+
+
+@event.listens_for(Tasks, 'before_insert')
+def rank_new_task(mapper, connection, target):
+    if target.rank is None:
+        target.rank = _append_rank(
+            connection, Tasks, ('task', target.list_id, target.parent_id),
+            task_siblings(target.list_id, target.parent_id)
+        )
+
+
+@event.listens_for(Tasks, 'before_update')
+def rank_moved_task(mapper, connection, target):
+    """A task moved to another parent or list goes after its new siblings."""
+    attrs = inspect(target).attrs
+    moved = attrs.parent_id.history.has_changes() or attrs.list_id.history.has_changes()
+    if moved and not attrs.rank.history.has_changes():
+        target.rank = _append_rank(
+            connection, Tasks, ('task', target.list_id, target.parent_id),
+            task_siblings(target.list_id, target.parent_id)
+        )
+
+
+# Called without arguments after each session commit that inserted,
+# updated or deleted tasks, through the ORM or bulk statements alike
+task_commit_hooks = []
+
+_committing = threading.local()
+
+
+@event.listens_for(Engine, 'after_execute')
+def note_task_writes(connection, clauseelement, multiparams, params, execution_options, result):
+    if isinstance(clauseelement, UpdateBase) and clauseelement.table is Tasks.__table__:
+        connection.info['tasks_changed'] = True
+
+
+@event.listens_for(Engine, 'commit')
+def hand_over_task_writes(connection):
+    # Engine commit runs just before the DBAPI commit; the hooks wait for
+    # the session's after_commit, in the same thread, so readers see the rows
+    if connection.info.pop('tasks_changed', False):
+        _committing.tasks_changed = True
+
+
+@event.listens_for(Engine, 'rollback')
+def discard_task_writes(connection):
+    connection.info.pop('tasks_changed', None)
+
+
+@event.listens_for(Session, 'after_commit')
+def run_task_commit_hooks(session):
+    if getattr(_committing, 'tasks_changed', False):
+        _committing.tasks_changed = False
+        for hook in list(task_commit_hooks):
+            hook()
+
+
+@event.listens_for(Lists, 'before_insert')
+@event.listens_for(Lists, 'before_update')
+def stamp_list_revision(mapper, connection, target):
+    target.revision = next_revision(connection, target.user_id)
+
 
 @event.listens_for(Tasks, 'before_insert')
 @event.listens_for(Tasks, 'before_update')
+def stamp_task_revision(mapper, connection, target):
+    target.revision = next_revision(connection, _list_owner(connection, target.list_id))
+
+
+@event.listens_for(Lists, 'before_delete')
+def record_list_tombstone(mapper, connection, target):
+    connection.execute(Tombstones.__table__.insert(), {
+        "user_id": target.user_id,
+        "entity": "list",
+        "entity_id": target.id,
+        "list_id": target.id,
+        "revision": next_revision(connection, target.user_id),
+        "created_at": datetime.utcnow()
+    })
+
+
+@event.listens_for(Lists, 'before_delete')
+def delete_list_tasks(mapper, connection, target):
+    """Tombstone and delete every task of a deleted list in three statements."""
+    tasks = Tasks.__table__
+    closure = TaskClosure.__table__
+    list_task_ids = select(tasks.c.id).where(tasks.c.list_id == target.id)
+    _tombstone_tasks(connection, target.user_id, target.id,
+                     next_revision(connection, target.user_id), list_task_ids)
+    connection.execute(delete(closure).where(closure.c.descendant_id.in_(list_task_ids)))
+    connection.execute(delete(tasks).where(tasks.c.list_id == target.id))
+
+
+@event.listens_for(Tasks, 'before_delete')
+def record_task_tombstones(mapper, connection, target):
+    """Tombstone a deleted task and its whole subtree in one statement."""
+    closure = TaskClosure.__table__
+    user_id = _list_owner(connection, target.list_id)
+    revision = next_revision(connection, user_id)
+    _tombstone_tasks(connection, user_id, target.list_id, revision,
+                     select(closure.c.descendant_id).where(closure.c.ancestor_id == target.id))
+
+
+def _parent_depth(connection, parent_id):
+    if parent_id is None:
+        return -1
+    depth = connection.scalar(
+        select(Tasks.task_depth).where(Tasks.id == parent_id)
+    )
+    if depth is None:
+        raise ValueError(f"Parent task {parent_id} does not exist")
+    return depth
+
+
+def _subtree_ids(task_id):
+    closure = TaskClosure.__table__
+    return select(closure.c.descendant_id).where(closure.c.ancestor_id == task_id)
+
+
+def rebuild_task_hierarchy(connection, *conditions):
+    """Recompute ``task_depth``, the closure table and the completion
+    counters from ``parent_id``.
+
+    Used to backfill databases created before the hierarchy index existed.
+    With ``conditions``, only the tasks matching them are indexed; they
+    must form whole trees (every parent and child of a matching task
+    matches too), as freshly imported tasks do.
+    """
+    tasks = Tasks.__table__
+    closure = TaskClosure.__table__
+
+    paths = select(
+        tasks.c.id.label("ancestor_id"),
+        tasks.c.id.label("descendant_id"),
+        literal(0).label("depth")
+    ).where(*conditions).cte("paths", recursive=True)
+    paths = paths.union_all(
+        select(paths.c.ancestor_id, tasks.c.id, paths.c.depth + 1)
+        .join(paths, tasks.c.parent_id == paths.c.descendant_id)
+    )
+
+    if conditions:
+        connection.execute(delete(closure).where(
+            closure.c.descendant_id.in_(select(tasks.c.id).where(*conditions))
+        ))
+    else:
+        connection.execute(delete(closure))
+    connection.execute(closure.insert().from_select(
+        ["ancestor_id", "descendant_id", "depth"], select(paths)
+    ))
+    children = tasks.alias("children")
+    connection.execute(update(tasks).where(*conditions).values(
+        task_depth=select(func.max(closure.c.depth))
+        .where(closure.c.descendant_id == tasks.c.id)
+        .scalar_subquery(),
+        children_total=select(func.count())
+        .where(children.c.parent_id == tasks.c.id)
+        .scalar_subquery(),
+        children_completed=select(func.count())
+        .where(children.c.parent_id == tasks.c.id, children.c.is_completed.is_(True))
+        .scalar_subquery()
+    ))
+
+
+@event.listens_for(Tasks, 'before_insert')
 def validate_task_depth(mapper, connection, target):
-    if target.depth_level > 2:  # 0, 1, 2 are valid levels
+    """Store the depth of a new task, rejecting anything below level 2."""
+    target.task_depth = _parent_depth(connection, target.parent_id) + 1
+    if target.task_depth > MAX_TASK_DEPTH:
+        raise ValueError("Tasks cannot be nested deeper than 3 levels")
+
+
+@event.listens_for(Tasks, 'after_insert')
+def index_new_task(mapper, connection, target):
+    """Link a new task to itself and to every ancestor of its parent."""
+    closure = TaskClosure.__table__
+    ancestors = select(
+        closure.c.ancestor_id, literal(target.id), closure.c.depth + 1
+    ).where(closure.c.descendant_id == target.parent_id)
+    connection.execute(closure.insert(), {
+        "ancestor_id": target.id, "descendant_id": target.id, "depth": 0
+    })
+    if target.parent_id is not None:
+        connection.execute(closure.insert().from_select(
+            ["ancestor_id", "descendant_id", "depth"], ancestors
+        ))
+
+
+@event.listens_for(Tasks, 'before_update')
+def validate_task_move(mapper, connection, target):
+    """Reject moves that would create a cycle or exceed the depth limit."""
+    if not inspect(target).attrs.parent_id.history.has_changes():
+        return
+
+    closure = TaskClosure.__table__
+    if target.parent_id is not None and connection.scalar(
+        select(closure.c.depth).where(
+            closure.c.ancestor_id == target.id,
+            closure.c.descendant_id == target.parent_id
+        )
+    ) is not None:
+        raise ValueError("Cannot move task under itself")
+
+    new_depth = _parent_depth(connection, target.parent_id) + 1
+    height = connection.scalar(
+        select(func.max(closure.c.depth)).where(closure.c.ancestor_id == target.id)
+    ) or 0
+    if new_depth + height > MAX_TASK_DEPTH:
         raise ValueError("Tasks cannot be nested deeper than 3 levels")
+    target.task_depth = new_depth
+
+
+@event.listens_for(Tasks, 'after_update')
+def reindex_moved_task(mapper, connection, target):
+    """Relink a moved subtree under its new ancestors."""
+    attrs = inspect(target).attrs
+    parent_changed = attrs.parent_id.history.has_changes()
+    if not parent_changed and not attrs.list_id.history.has_changes():
+        return
+
+    tasks = Tasks.__table__
+    closure = TaskClosure.__table__
+    subtree = _subtree_ids(target.id)
+
+    old_list_ids = attrs.list_id.history.deleted
+    if old_list_ids and old_list_ids[0] not in (None, target.list_id):
+        # Clients syncing the old list only see the subtree through this
+        # Tasks move only between one user's lists, so the owner is cached
+        _tombstone_tasks(connection, _list_owner(connection, target.list_id),
+                         old_list_ids[0], target.revision, subtree)
+
+    if parent_changed:
+        # Drop links from the old ancestors into the subtree
+        connection.execute(delete(closure).where(
+            closure.c.descendant_id.in_(subtree),
+            closure.c.ancestor_id.notin_(subtree)
+        ))
+
+    if parent_changed and target.parent_id is not None:
+        above = closure.alias("above")
+        below = closure.alias("below")
+        connection.execute(closure.insert().from_select(
+            ["ancestor_id", "descendant_id", "depth"],
+            select(
+                above.c.ancestor_id,
+                below.c.descendant_id,
+                above.c.depth + below.c.depth + 1
+            ).select_from(
+                above.join(below, below.c.ancestor_id == target.id)
+            ).where(above.c.descendant_id == target.parent_id)
+        ))
+
+    # Descendants follow the moved task to its new depth and list
+    descendants = select(closure.c.descendant_id, closure.c.depth).where(
+        closure.c.ancestor_id == target.id,
+        closure.c.depth > 0
+    ).subquery()
+    connection.execute(update(tasks).where(
+        tasks.c.id == descendants.c.descendant_id
+    ).values(
+        task_depth=target.task_depth + descendants.c.depth,
+        list_id=target.list_id,
+        revision=target.revision
+    ))
+
+
+@event.listens_for(Tasks, 'before_delete')
+def delete_task_subtree(mapper, connection, target):
+    """Delete the whole subtree below a task in two set-based statements."""
+    tasks = Tasks.__table__
+    closure = TaskClosure.__table__
+    descendant_ids = connection.scalars(
+        select(closure.c.descendant_id).where(
+            closure.c.ancestor_id == target.id,
+            closure.c.depth > 0
+        )
+    ).all()
+
+    connection.execute(delete(closure).where(
+        closure.c.descendant_id.in_(descendant_ids + [target.id])
+    ))
+    if descendant_ids:
+        connection.execute(delete(tasks).where(tasks.c.id.in_(descendant_ids)))
+
+
+def _roll_up_completion(connection, parent_id, total_delta, completed_delta):
+    """Apply child-count deltas to ``parent_id`` and carry status flips upward.
+
+    A task with children is complete exactly when all of them are, so a
+    change only travels further up while it flips an ancestor's status.
+    Costs one read of the ancestor chain plus one UPDATE per level touched.
+    Returns the ids of the ancestors whose completion status flipped.
+    """
+    if parent_id is None or not (total_delta or completed_delta):
+        return []
+
+    tasks = Tasks.__table__
+    closure = TaskClosure.__table__
+    chain = connection.execute(
+        select(
+            tasks.c.id, tasks.c.is_completed,
+            tasks.c.children_total, tasks.c.children_completed
+        ).join(closure, closure.c.ancestor_id == tasks.c.id)
+        .where(closure.c.descendant_id == parent_id)
+        .order_by(closure.c.depth)
+    ).all()
+
+    flipped = []
+    for row in chain:
+        if not (total_delta or completed_delta):
+            break
+        total = row.children_total + total_delta
+        completed = row.children_completed + completed_delta
+        is_completed = completed == total if total else bool(row.is_completed)
+
+        connection.execute(update(tasks).where(tasks.c.id == row.id).values(
+            children_total=tasks.c.children_total + total_delta,
+            children_completed=tasks.c.children_completed + completed_delta,
+            is_completed=is_completed,
+            revision=_owner_revision(tasks.c.list_id)
+        ))
+        total_delta = 0
+        completed_delta = int(is_completed) - int(bool(row.is_completed))
+        if completed_delta:
+            flipped.append(row.id)
+    return flipped
+
+
+def complete_subtrees(task_ids, completed):
+    """Set the completion status of several whole subtrees with one UPDATE.
+
+    Ancestors above ``task_ids`` are not touched; follow up with
+    :func:`refresh_ancestor_completion`. Call :func:`next_revision` for the
+    owner first so the rows are stamped with the new revision.
+    """
+    tasks = Tasks.__table__
+    closure = TaskClosure.__table__
+    subtrees = select(closure.c.descendant_id).where(closure.c.ancestor_id.in_(task_ids))
+    db.session.execute(update(tasks).where(tasks.c.id.in_(subtrees)).values(
+        is_completed=completed,
+        children_completed=tasks.c.children_total if completed else 0,
+        revision=_owner_revision(tasks.c.list_id),
+        updated_at=datetime.utcnow()
+    ))
+
+
+def refresh_ancestor_completion(task_ids):
+    """Recount completion for every ancestor of ``task_ids``.
+
+    Runs one set-based UPDATE per level, deepest first, so the cost does
+    not depend on how many tasks changed.
+    """
+    tasks = Tasks.__table__
+    closure = TaskClosure.__table__
+    children = tasks.alias("children")
+    ancestors = select(closure.c.ancestor_id).where(
+        closure.c.descendant_id.in_(task_ids),
+        closure.c.depth > 0
+    )
+    completed_children = select(func.count()).where(
+        children.c.parent_id == tasks.c.id,
+        children.c.is_completed.is_(True)
+    ).scalar_subquery()
+
+    for depth in range(MAX_TASK_DEPTH - 1, -1, -1):
+        db.session.execute(update(tasks).where(
+            tasks.c.task_depth == depth,
+            tasks.c.id.in_(ancestors)
+        ).values(
+            children_completed=completed_children,
+            revision=_owner_revision(tasks.c.list_id),
+            is_completed=case(
+                (tasks.c.children_total > 0, completed_children == tasks.c.children_total),
+                else_=tasks.c.is_completed
+            )
+        ))
+
+
+def _previous_value(attr):
+    history = attr.history
+    return history.deleted[0] if history.deleted else attr.value
+
+
+@event.listens_for(Tasks, 'after_insert')
+def count_new_subtask(mapper, connection, target):
+    """Count a new task against its parent's completion counters."""
+    _roll_up_completion(connection, target.parent_id, 1, int(bool(target.is_completed)))
 
 
 @event.listens_for(Tasks, 'after_update')
 def update_parent_completion(mapper, connection, target):
-    """Update parent task completion status based on subtasks."""
-    if target.parent_id:
-        parent = db.session.get(Tasks, target.parent_id)
-        if parent:
-            all_completed = all(subtask.is_completed for subtask in parent.subtasks)
-            if parent.is_completed != all_completed:
-                parent.is_completed = all_completed
-                db.session.add(parent)
\ No newline at end of file
+    """Update ancestor completion counters by delta when a task changes."""
+    attrs = inspect(target).attrs
+    is_completed = int(bool(target.is_completed))
+
+    if attrs.parent_id.history.has_changes():
+        was_completed = int(bool(_previous_value(attrs.is_completed)))
+        _roll_up_completion(connection, _previous_value(attrs.parent_id), -1, -was_completed)
+        _roll_up_completion(connection, target.parent_id, 1, is_completed)
+    elif attrs.is_completed.history.has_changes():
+        was_completed = int(bool(_previous_value(attrs.is_completed)))
+        _roll_up_completion(connection, target.parent_id, 0, is_completed - was_completed)
+
+
+@event.listens_for(Tasks, 'after_delete')
+def count_deleted_subtask(mapper, connection, target):
+    """Remove a deleted task from its parent's completion counters."""
+    _roll_up_completion(connection, target.parent_id, -1, -int(bool(target.is_completed)))
@@ -0,0 +1,239 @@
+"""
+Drag-and-drop ordering of lists and tasks.
+
+Lists are ranked among the user's lists and tasks among their siblings
+(same list and parent). Moving an item gives it a rank between its new
+neighbours, so a move writes only the moved row. The client names one
+neighbour:
+
+    {"after_id": 12}     place after 12
+    {"before_id": 12}    place before 12
+    {"after_id": null}   place first
+    {"before_id": null}  place last
+
+and the other neighbour is found with one lookup on the rank index.
+
+Ranks grow by a digit every few inserts at the same spot, and by one
+every 31 or so appends. Once a commit leaves an inserted, moved or
+reordered item with a rank longer than ``RANK_REBALANCE_LENGTH``, its
+sibling group is queued for ``RankRebalancer``, which rewrites the whole
+group with short keys on a background thread. Equal ranks (from imports)
+are rebalanced on the spot before placing.
+"""
+
+import logging
+import queue
+import threading
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, select, tuple_, func
+from sqlalchemy.orm import Session, object_session
+
+from core.models import (
+    db, Lists, Tasks, list_siblings, task_siblings, rebalance_ranks
+)
+from core.events import emit
+from core.utils.ranks import rank_between
+from core.utils.sqlite import is_memory_database
+
+logger = logging.getLogger(__name__)
+
+
+class ReorderError(ValueError):
+    """A reorder request that names no valid position."""
+
+
+def sibling_group(item):
+    """``(model, key, conditions, user_id)`` for the group ranking ``item``."""
+    if isinstance(item, Lists):
+        return Lists, (item.user_id,), list_siblings(item.user_id), item.user_id
+    user_id = db.session.scalar(select(Lists.user_id).where(Lists.id == item.list_id))
+    return (Tasks, (item.list_id, item.parent_id),
+            task_siblings(item.list_id, item.parent_id), user_id)
+
+
+def _neighbour_ranks(connection, model, conditions, item_id, data):
+    table = model.__table__
+    key = tuple_(table.c.rank, table.c.id)
+    siblings = select(table.c.rank, table.c.id).where(
+        *conditions, table.c.id != item_id
+    )
+
+    def rank_of(anchor_id):
+        row = connection.execute(siblings.where(table.c.id == anchor_id)).first()
+        if row is None:
+            raise ReorderError(f"Item {anchor_id} is not a sibling")
+        return tuple(row)
+
+    if "after_id" in data:
+        low = rank_of(data["after_id"]) if data["after_id"] is not None else None
+        query = siblings.order_by(table.c.rank, table.c.id).limit(1)
+        if low is not None:
+            query = query.where(key > tuple_(*low))
+        high = connection.execute(query).first()
+    elif "before_id" in data:
+        high = rank_of(data["before_id"]) if data["before_id"] is not None else None
+        query = siblings.order_by(table.c.rank.desc(), table.c.id.desc()).limit(1)
+        if high is not None:
+            query = query.where(key < tuple_(*high))
+        low = connection.execute(query).first()
+    else:
+        raise ReorderError("Provide after_id or before_id")
+    return (low[0] if low else None), (high[0] if high else None)
+
+
+def reorder(item, data):
+    """Give ``item`` the rank for the position in ``data`` and return it.
+
+    Only ``item.rank`` is changed; the caller commits.
+    """
+    model, _, conditions, user_id = sibling_group(item)
+    connection = db.session.connection()
+    for attempt in range(2):
+        low, high = _neighbour_ranks(connection, model, conditions, item.id, data)
+        try:
+            rank = rank_between(low, high)
+        except ValueError:
+            # Tied neighbours: spread the group out and retry
+            if attempt:
+                raise
+            rebalance_ranks(connection, model, conditions, user_id)
+            db.session.expire(item, ["rank"])
+            continue
+        item.rank = rank
+        return rank
+
+
+class RankRebalancer:
+    """Rewrites sibling groups whose ranks have grown too long.
+
+    Groups are queued by ``schedule`` and deduplicated until processed. A
+    daemon thread is started on the first schedule when ``background`` is
+    set; otherwise ``run_pending`` processes the queue in the caller.
+    """
+
+    def __init__(self, app, max_length=12, background=True):
+        self.app = app
+        self.max_length = max_length
+        self.background = background
+        self.rebalanced = 0
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def needs_rebalance(self, rank):
+        return rank is not None and len(rank) > self.max_length
+
+    def schedule(self, model, key):
+        """Queue the sibling group ``key`` of ``model`` (Lists or Tasks)."""
+        with self._lock:
+            if (model, key) in self._pending:
+                return
+            self._pending.add((model, key))
+            if self.background and self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="rank-rebalancer", daemon=True
+                )
+                self._thread.start()
+        self._queue.put((model, key))
+
+    def rebalance(self, model, key):
+        """Rewrite one group if it still has a long rank; needs an app context."""
+        table = model.__table__
+        if model is Lists:
+            (user_id,) = key
+            conditions = list_siblings(user_id)
+        else:
+            list_id, parent_id = key
+            user_id = db.session.scalar(select(Lists.user_id).where(Lists.id == list_id))
+            conditions = task_siblings(list_id, parent_id)
+        longest = db.session.scalar(select(func.max(func.length(table.c.rank))).where(*conditions))
+        if user_id is None or not longest or longest <= self.max_length:
+            return 0
+        count = rebalance_ranks(db.session.connection(), model, conditions, user_id)
+        # Every rank in the group changed; clients refetch the group
+        emit(user_id, "ranks.rebalanced", entity=model.__tablename__, key=list(key))
+        db.session.commit()
+        self.rebalanced += 1
+        return count
+
+    def run_pending(self):
+        """Process every queued group; returns the number of groups handled."""
+        handled = 0
+        while True:
+            try:
+                model, key = self._queue.get_nowait()
+            except queue.Empty:
+                return handled
+            self._process(model, key)
+            handled += 1
+
+    def _process(self, model, key):
+        with self._lock:
+            self._pending.discard((model, key))
+        try:
+            self.rebalance(model, key)
+        except Exception:
+            db.session.rollback()
+            logger.exception("Rank rebalance failed for %s %s", model.__tablename__, key)
+
+    def _run(self):
+        while True:
+            model, key = self._queue.get()
+            with self.app.app_context():
+                self._process(model, key)
+                db.session.remove()
+
+
+def _note_long_rank(target, model, key):
+    if not has_app_context():
+        return
+    rebalancer = current_app.extensions.get("rank_rebalancer")
+    session = object_session(target)
+    if rebalancer is not None and session is not None and rebalancer.needs_rebalance(target.rank):
+        session.info.setdefault("long_rank_groups", set()).add((model, key))
+
+
+@event.listens_for(Lists, 'after_insert')
+@event.listens_for(Lists, 'after_update')
+def note_long_list_rank(mapper, connection, target):
+    if inspect(target).attrs.rank.history.has_changes():
+        _note_long_rank(target, Lists, (target.user_id,))
+
+
+@event.listens_for(Tasks, 'after_insert')
+@event.listens_for(Tasks, 'after_update')
+def note_long_task_rank(mapper, connection, target):
+    if inspect(target).attrs.rank.history.has_changes():
+        _note_long_rank(target, Tasks, (target.list_id, target.parent_id))
+
+
+@event.listens_for(Session, 'after_commit')
+def schedule_long_rank_groups(session):
+    # The rebalancer reads the group in its own session, so wait for the commit
+    groups = session.info.pop("long_rank_groups", ())
+    if groups and has_app_context():
+        rebalancer = current_app.extensions["rank_rebalancer"]
+        for model, key in groups:
+            rebalancer.schedule(model, key)
+
+
+@event.listens_for(Session, 'after_rollback')
+def drop_long_rank_groups(session):
+    session.info.pop("long_rank_groups", None)
+
+
+def init_rank_rebalancer(app):
+    """Create the rebalancer from config.
+
+    An in-memory database is private to its connection, so there the
+    queue is processed by ``run_pending`` instead of a thread.
+    """
+    background = (app.config.get("RANK_REBALANCE_BACKGROUND", True)
+                  and not is_memory_database(app.config["SQLALCHEMY_DATABASE_URI"]))
+    rebalancer = RankRebalancer(
+        app, max_length=app.config.get("RANK_REBALANCE_LENGTH", 12), background=background
+    )
+    app.extensions["rank_rebalancer"] = rebalancer
+    return rebalancer
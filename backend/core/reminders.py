@@ -0,0 +1,195 @@
+"""
+In-process reminder scheduler for task due dates.
+
+Only the open tasks due within the next ``REMINDER_WINDOW`` seconds are
+loaded, using the ``(due_date, is_completed)`` index, and kept in a heap.
+A single thread sleeps until the earliest due date or the end of the
+window, whichever comes first. Any commit that writes tasks marks the
+window stale, and it is reloaded on the next wake-up. Reminders go to a
+sink: ``LogSink`` writes them to the application log, and
+``WebhookSink`` POSTs them as JSON.
+
+Reminders are due at most once each. Tasks already overdue when the
+scheduler starts are not reminded. Run the scheduler in a single
+process only; each process would otherwise deliver its own copy.
+"""
+
+from datetime import datetime, timedelta
+import heapq
+import json
+import logging
+import threading
+import urllib.request
+
+from sqlalchemy import select, tuple_
+from core.models import db, Tasks, Lists, task_commit_hooks
+
+logger = logging.getLogger(__name__)
+
+
+class LogSink:
+    """Write reminders to the log."""
+
+    def deliver(self, reminder):
+        logger.info("Reminder for user %s: %s (due %s)",
+                    reminder["user_id"], reminder["name"], reminder["due_date"])
+
+
+class WebhookSink:
+    """POST each reminder as JSON to ``url``; failures are logged, not retried."""
+
+    def __init__(self, url, timeout=5):
+        self.url = url
+        self.timeout = timeout
+
+    def deliver(self, reminder):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(reminder).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+        except OSError as e:
+            logger.warning("Reminder webhook failed for task %s: %s", reminder["task_id"], e)
+
+
+class ReminderScheduler:
+    def __init__(self, app, sink, window=3600, clock=datetime.utcnow):
+        self.app = app
+        self.sink = sink
+        self.window = timedelta(seconds=window)
+        self.clock = clock
+        # Every reminder due at or before the watermark has been handled
+        self.watermark = clock()
+        self.window_end = None
+        self.delivered = 0
+        self._heap = []  # (due_date, task_id)
+        self._stale = True
+        self._running = False
+        self._thread = None
+        self._wakeup = threading.Condition()
+
+    def notify_changed(self):
+        """Mark the loaded window stale and wake the scheduler thread."""
+        with self._wakeup:
+            self._stale = True
+            self._wakeup.notify()
+
+    def reload(self, now):
+        """Load the open tasks due in ``(watermark, now + window]``."""
+        tasks = Tasks.__table__
+        self.window_end = now + self.window
+        rows = db.session.execute(
+            select(tasks.c.due_date, tasks.c.id).where(
+                tasks.c.due_date > self.watermark,
+                tasks.c.due_date <= self.window_end,
+                tasks.c.is_completed.isnot(True)
+            )
+        ).all()
+        self._heap = [tuple(row) for row in rows]
+        heapq.heapify(self._heap)
+        self._stale = False
+
+    def run_pending(self, now=None):
+        """Deliver every reminder due by ``now``; returns the reminders sent.
+
+        Needs an application context.
+        """
+        now = now or self.clock()
+        if self._stale or self.window_end is None or now >= self.window_end:
+            self.reload(now)
+
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap))
+        self.watermark = now
+        if not due:
+            return []
+
+        # Re-read the tasks: skip any completed or rescheduled since loading
+        tasks = Tasks.__table__
+        lists = Lists.__table__
+        rows = db.session.execute(
+            select(tasks.c.id, tasks.c.name, tasks.c.due_date, tasks.c.list_id, lists.c.user_id)
+            .join(lists, lists.c.id == tasks.c.list_id)
+            .where(
+                tuple_(tasks.c.id, tasks.c.due_date).in_([(task_id, due_date) for due_date, task_id in due]),
+                tasks.c.is_completed.isnot(True)
+            )
+            .order_by(tasks.c.due_date, tasks.c.id)
+        ).all()
+
+        reminders = []
+        for task_id, name, due_date, list_id, user_id in rows:
+            reminder = {
+                "task_id": task_id,
+                "name": name,
+                "due_date": due_date.isoformat(),
+                "list_id": list_id,
+                "user_id": user_id,
+            }
+            try:
+                self.sink.deliver(reminder)
+            except Exception:
+                logger.exception("Reminder sink failed for task %s", task_id)
+                continue
+            reminders.append(reminder)
+        self.delivered += len(reminders)
+        return reminders
+
+    def seconds_until_next(self, now):
+        """How long the thread may sleep before there is work to do."""
+        if self._stale:
+            return 0
+        deadline = self.window_end
+        if self._heap:
+            deadline = min(deadline, self._heap[0][0])
+        return max(0.0, (deadline - now).total_seconds())
+
+    def start(self):
+        task_commit_hooks.append(self.notify_changed)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="reminders", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self.notify_changed in task_commit_hooks:
+            task_commit_hooks.remove(self.notify_changed)
+        with self._wakeup:
+            self._running = False
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._wakeup:
+                if not self._running:
+                    return
+            try:
+                with self.app.app_context():
+                    self.run_pending()
+                    timeout = self.seconds_until_next(self.clock())
+                    db.session.remove()
+            except Exception:
+                logger.exception("Reminder scheduler iteration failed")
+                timeout = 60
+            with self._wakeup:
+                if self._running and not self._stale:
+                    self._wakeup.wait(timeout)
+
+
+def init_reminders(app):
+    """Create the scheduler from config and start it if ``REMINDERS_ENABLED``."""
+    if app.config.get("REMINDER_SINK") == "webhook":
+        sink = WebhookSink(app.config["REMINDER_WEBHOOK_URL"])
+    else:
+        sink = LogSink()
+    scheduler = ReminderScheduler(app, sink, window=app.config.get("REMINDER_WINDOW", 3600))
+    app.extensions["reminders"] = scheduler
+    if app.config.get("REMINDERS_ENABLED"):
+        scheduler.start()
+    return scheduler
@@ -0,0 +1,210 @@
+"""
+Read-through cache for rendered list trees.
+
+``GET /api/lists/<id>`` serializes the list with its whole task forest,
+the most expensive read there is. The response body is cached per list,
+stamped with the owner's id and revision: a lookup hits only when both
+match, and since every write to a user's lists or tasks bumps their
+revision, a stale body is never served. The ``Lists``/``Tasks`` mapper
+events evict a list's entry when it changes so memory goes to live
+bodies; writes through bulk statements are caught by the revision check.
+
+Bodies are kept in an in-process LRU bounded to ``RENDER_CACHE_BYTES``.
+With ``RENDER_CACHE_PATH`` set, a SQLite file shared by the worker
+processes of one host backs it, bounded to ``RENDER_CACHE_SHARED_BYTES``;
+a body rendered by one worker is then a hit in the others.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+from core.models import Lists, Tasks
+from core.utils.cache import SizedLRUCache
+
+logger = logging.getLogger(__name__)
+
+
+class SharedRenderStore:
+    """Rendered bodies in a SQLite file shared between processes.
+
+    Errors are logged and treated as misses; the store is only a cache.
+    """
+
+    def __init__(self, path, maxbytes):
+        self.path = path
+        self.maxbytes = maxbytes
+        self._local = threading.local()
+        self._execute(
+            "CREATE TABLE IF NOT EXISTS render_cache ("
+            "list_id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, revision INTEGER NOT NULL, "
+            "body BLOB NOT NULL, size INTEGER NOT NULL, stored_at REAL NOT NULL)"
+        )
+        self._execute("CREATE INDEX IF NOT EXISTS ix_render_cache_stored_at "
+                      "ON render_cache (stored_at)")
+
+    def _connection(self):
+        # Connections are per thread and must not cross a fork
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = OFF")
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def _execute(self, statement, parameters=()):
+        try:
+            return self._connection().execute(statement, parameters)
+        except sqlite3.Error:
+            logger.warning("Shared render cache unavailable", exc_info=True)
+            return None
+
+    def get(self, list_id, user_id, revision):
+        cursor = self._execute(
+            "SELECT body FROM render_cache WHERE list_id = ? AND user_id = ? AND revision = ?",
+            (list_id, user_id, revision),
+        )
+        row = cursor.fetchone() if cursor is not None else None
+        return row[0] if row else None
+
+    def set(self, list_id, user_id, revision, body):
+        if len(body) > self.maxbytes:
+            return
+        self._execute(
+            "INSERT OR REPLACE INTO render_cache VALUES (?, ?, ?, ?, ?, ?)",
+            (list_id, user_id, revision, body, len(body), time.time()),
+        )
+        cursor = self._execute("SELECT total(size), count(*) FROM render_cache")
+        total, count = cursor.fetchone() if cursor is not None else (0, 0)
+        if total > self.maxbytes:
+            # Drop the oldest tenth rather than one row per insert
+            self._execute(
+                "DELETE FROM render_cache WHERE list_id IN "
+                "(SELECT list_id FROM render_cache ORDER BY stored_at LIMIT ?)",
+                (max(1, count // 10),),
+            )
+
+    def invalidate(self, list_id):
+        self._execute("DELETE FROM render_cache WHERE list_id = ?", (list_id,))
+
+
+class RenderCache:
+    """Two-tier cache of rendered list bodies; see the module docstring."""
+
+    def __init__(self, maxbytes, shared=None):
+        self.local = SizedLRUCache(maxbytes)
+        self.shared = shared
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        self._lock = threading.Lock()
+
+    def get(self, user_id, list_id, revision):
+        """The cached body for the list at ``revision``, or None."""
+        user_id, list_id = int(user_id), int(list_id)
+        entry = self.local.get(list_id)
+        if entry is not None and entry[:2] == (user_id, revision):
+            self._count(hits=1)
+            return entry[2]
+        body = self.shared.get(list_id, user_id, revision) if self.shared is not None else None
+        if body is None:
+            self._count(misses=1)
+            return None
+        self.local.set(list_id, (user_id, revision, body), len(body))
+        self._count(hits=1, shared_hits=1)
+        return body
+
+    def _count(self, hits=0, misses=0, shared_hits=0):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+            self.shared_hits += shared_hits
+
+    def set(self, user_id, list_id, revision, body):
+        user_id, list_id = int(user_id), int(list_id)
+        self.local.set(list_id, (user_id, revision, body), len(body))
+        if self.shared is not None:
+            self.shared.set(list_id, user_id, revision, body)
+
+    def invalidate(self, list_id):
+        self.local.invalidate(list_id)
+        if self.shared is not None:
+            self.shared.invalidate(list_id)
+
+    def stats(self):
+        with self._lock:
+            counters = {"hits": self.hits, "misses": self.misses, "shared_hits": self.shared_hits}
+        local = self.local.stats()
+        return {**counters, "entries": local["size"], "bytes": local["bytes"],
+                "evictions": local["evictions"]}
+
+
+def init_render_cache(app):
+    """Create the cache from config; ``RENDER_CACHE_BYTES = 0`` disables it."""
+    maxbytes = app.config.get("RENDER_CACHE_BYTES", 64 * 1024 * 1024)
+    if not maxbytes:
+        return None
+    path = app.config.get("RENDER_CACHE_PATH")
+    shared = (SharedRenderStore(path, app.config.get("RENDER_CACHE_SHARED_BYTES", 256 * 1024 * 1024))
+              if path else None)
+    cache = RenderCache(maxbytes, shared)
+    app.extensions["render_cache"] = cache
+
+    metrics = app.extensions.get("metrics")
+    if metrics is not None:
+        metrics.add_stats("render_cache", "Rendered list cache", cache.stats)
+    return cache
+
+
+def render_cache():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get("render_cache")
+
+
+def _forget(target, list_ids):
+    list_ids = {list_id for list_id in list_ids if list_id is not None}
+    cache = render_cache()
+    if cache is not None:
+        for list_id in list_ids:
+            cache.invalidate(list_id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("changed_lists", set()).update(list_ids)
+
+
+@event.listens_for(Lists, 'after_insert')
+@event.listens_for(Lists, 'after_update')
+@event.listens_for(Lists, 'after_delete')
+def forget_changed_list(mapper, connection, target):
+    _forget(target, (target.id,))
+
+
+@event.listens_for(Tasks, 'after_insert')
+@event.listens_for(Tasks, 'after_update')
+@event.listens_for(Tasks, 'after_delete')
+def forget_changed_task_list(mapper, connection, target):
+    # A moved task changes the list it left as well
+    _forget(target, (target.list_id, *inspect(target).attrs.list_id.history.deleted))
+
+
+@event.listens_for(Session, 'after_commit')
+def forget_committed_lists(session):
+    # A concurrent request may have re-cached the old tree before the commit
+    changed = session.info.pop("changed_lists", ())
+    cache = render_cache()
+    if cache is not None:
+        for list_id in changed:
+            cache.invalidate(list_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def drop_changed_lists(session):
+    session.info.pop("changed_lists", None)
@@ -10,6 +10,8 @@ from marshmallow import (
 from datetime import datetime
 import re
 
+from core.utils.ranks import RANK_PATTERN
+
 class BaseSchema(Schema):
     """Base schema with common configuration and fields."""
     class Meta:
@@ -90,6 +92,7 @@ class ListSchema(BaseSchema):
     )
     description = fields.Str(validate=validate.Length(max=500))
     order_index = fields.Int(validate=validate.Range(min=0))
+    rank = fields.Str(dump_only=True)
     is_archived = fields.Bool()
     user_id = fields.Int(dump_only=True)
     total_tasks = fields.Int(dump_only=True)
@@ -103,6 +106,12 @@ class ListSchema(BaseSchema):
             raise ValidationError("List name cannot be empty")
         return value
 
+    class Meta(BaseSchema.Meta):
+        fields = BaseSchema.Meta.fields + (
+            "name", "description", "order_index", "rank", "is_archived", "user_id",
+            "total_tasks", "completed_tasks", "tasks"
+        )
+
 class TaskSchema(BaseSchema):
     """Schema for Task model with nested relationships and custom validation."""
     name = fields.Str(
@@ -122,6 +131,7 @@ class TaskSchema(BaseSchema):
     is_completed = fields.Bool()
     due_date = fields.DateTime(allow_none=True)
     priority = fields.Int(validate=validate.Range(min=0, max=3))
+    rank = fields.Str(validate=validate.Regexp(RANK_PATTERN, error="Invalid rank"))
     subtasks = fields.List(fields.Nested(lambda: TaskSchema()), dump_only=True)
     has_subtasks = fields.Bool(dump_only=True)
 
@@ -139,7 +149,7 @@ class TaskSchema(BaseSchema):
     class Meta(BaseSchema.Meta):
         fields = BaseSchema.Meta.fields + (
             "name", "description", "list_id", "task_depth",
-            "parent_id", "is_completed", "due_date", "priority",
+            "parent_id", "is_completed", "due_date", "priority", "rank",
             "subtasks", "has_subtasks"
         )
 
@@ -157,12 +167,22 @@ class TaskResponseSchema(TaskSchema):
     path = fields.List(fields.Int(), dump_only=True)  # For hierarchical path
     list_name = fields.Str(dump_only=True)
     parent_name = fields.Str(dump_only=True)
+    snippet = fields.Str(dump_only=True)
+    score = fields.Float(dump_only=True)
+
+    class Meta(TaskSchema.Meta):
+        fields = TaskSchema.Meta.fields + (
+            "path", "list_name", "parent_name", "snippet", "score"
+        )
 
 class ListResponseSchema(ListSchema):
     """Schema for list response with additional metadata."""
     task_count = fields.Int(dump_only=True)
     completion_rate = fields.Float(dump_only=True)
 
+    class Meta(ListSchema.Meta):
+        fields = ListSchema.Meta.fields + ("task_count", "completion_rate")
+
 class UserLoginSchema(Schema):
     """Schema for user login validation."""
     class Meta:
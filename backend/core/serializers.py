@@ -0,0 +1,107 @@
+"""
+Fast serialization helpers that work on result rows instead of ORM instances.
+
+Row serializers are compiled once per column layout, and the marshmallow
+schemas used on hot paths are instantiated once at import time instead of
+per request.
+"""
+
+import html
+import json
+from core.schemas import TaskSchema, TaskResponseSchema
+
+# Column order of task payloads; queries feeding the serializers select
+# exactly these columns, in this order.
+TASK_FIELDS = (
+    "id", "name", "description", "list_id", "parent_id", "is_completed",
+    "due_date", "priority", "rank", "revision", "task_depth", "children_total",
+    "children_completed", "created_at", "updated_at"
+)
+
+# Shared schema instances; building a schema costs more than using it
+task_schema = TaskSchema()
+task_results_schema = TaskResponseSchema(many=True)
+
+# Private-use characters marking matches in FTS5 snippets; they are swapped
+# for <mark> tags only after the task text has been HTML-escaped
+SNIPPET_OPEN, SNIPPET_CLOSE = "\ue000", "\ue001"
+
+_encode = json.JSONEncoder(separators=(",", ":")).encode
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def compile_row_serializer(fields, converters=None):
+    """Build a function turning a row tuple laid out as ``fields`` into a dict.
+
+    ``converters`` maps field names to callables applied to their values.
+    """
+    fields = tuple(fields)
+    converted = [(name, fn) for name, fn in (converters or {}).items() if name in fields]
+
+    if not converted:
+        return lambda row: dict(zip(fields, row))
+
+    def serialize(row):
+        data = dict(zip(fields, row))
+        for name, fn in converted:
+            data[name] = fn(data[name])
+        return data
+    return serialize
+
+
+serialize_task_row = compile_row_serializer(TASK_FIELDS, {
+    "due_date": _isoformat,
+    "created_at": _isoformat,
+    "updated_at": _isoformat,
+})
+
+
+def highlight_snippet(snippet):
+    """HTML-escape an FTS5 snippet and wrap its matches in ``<mark>``."""
+    if snippet is None:
+        return None
+    return (html.escape(snippet)
+            .replace(SNIPPET_OPEN, "<mark>")
+            .replace(SNIPPET_CLOSE, "</mark>"))
+
+
+def task_to_dict(task):
+    """Serialize an ORM task through the same compiled row serializer."""
+    return serialize_task_row([getattr(task, name) for name in TASK_FIELDS])
+
+
+def stream_task_tree(rows, chunk_size=500):
+    """Yield a JSON array of nested tasks, chunk by chunk.
+
+    ``rows`` must be ``TASK_FIELDS`` tuples followed by the row's level
+    (0 for roots), in depth-first pre-order. Each task is encoded as soon
+    as it is read and its ``subtasks`` array is closed when the walk leaves
+    it, so only the current branch is ever held in memory.
+    """
+    width = len(TASK_FIELDS)
+    buffer = ["["]
+    open_nodes = 0
+    need_comma = False
+
+    for row in rows:
+        level = row[width]
+        while open_nodes > level:
+            buffer.append("]}")
+            open_nodes -= 1
+            need_comma = True
+
+        node = _encode(serialize_task_row(row[:width]))
+        buffer.append(("," if need_comma else "") + node[:-1] + ',"subtasks":[')
+        open_nodes += 1
+        need_comma = False
+
+        if len(buffer) >= chunk_size:
+            yield "".join(buffer)
+            buffer = []
+
+    buffer.append("]}" * open_nodes)
+    buffer.append("]")
+    yield "".join(buffer)
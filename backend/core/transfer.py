@@ -0,0 +1,413 @@
+"""
+NDJSON export and import of a user's lists and task trees.
+
+The format is one JSON object per line. All ``list`` records come first,
+followed by ``task`` records in depth-first order, so every parent comes
+before its children:
+
+    {"type": "list", "id": 1, "name": "Home", ...}
+    {"type": "task", "id": 7, "list_id": 1, "parent_id": null, "name": "Garden", ...}
+
+Ids are the ones of the exporting database. On import the records are
+staged in temporary tables batch by batch and then copied with a few
+set-based statements, with new ids assigned and references remapped
+inside SQLite. The closure table, depths and counters are then rebuilt
+for the imported trees only. Python memory stays bounded by the batch
+size in both directions.
+"""
+
+from datetime import datetime, timedelta
+import json
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import (
+    MetaData, Table, Column, Integer, String, Text, Boolean, DateTime, JSON,
+    select, func, literal
+)
+from sqlalchemy.exc import IntegrityError
+
+from core.models import (
+    db, Users, Lists, Tasks, task_tree_query, next_revision,
+    rebuild_task_hierarchy, prune_tombstones, MAX_TASK_DEPTH
+)
+from core.utils.ranks import is_valid_rank, rank_between
+
+BATCH_SIZE = 1000
+
+LIST_EXPORT_FIELDS = (
+    "id", "name", "description", "order_index", "rank", "is_archived",
+    "collapsed_tasks", "created_at"
+)
+TASK_EXPORT_FIELDS = (
+    "id", "list_id", "parent_id", "name", "description", "is_completed",
+    "due_date", "priority", "rank", "created_at"
+)
+
+
+class TransferError(ValueError):
+    """An import file that cannot be loaded; nothing has been written."""
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot encode {type(value).__name__}")
+
+
+_encode = json.JSONEncoder(separators=(",", ":"), default=_json_default).encode
+
+
+def export_user_data(user_id):
+    """Yield the user's lists and tasks as NDJSON lines.
+
+    Both queries are read through a server-side cursor in chunks of
+    ``BATCH_SIZE`` rows.
+    """
+    lists = Lists.__table__
+    list_rows = db.session.execute(
+        select(*(lists.c[name] for name in LIST_EXPORT_FIELDS))
+        .where(lists.c.user_id == user_id)
+        .order_by(lists.c.rank, lists.c.id)
+        .execution_options(yield_per=BATCH_SIZE)
+    )
+    # Closing the results releases the cursors if the client goes away
+    with list_rows:
+        for row in list_rows:
+            yield _encode({"type": "list", **row._mapping}) + "\n"
+
+    user_lists = select(lists.c.id).where(lists.c.user_id == user_id)
+    task_rows = db.session.execute(
+        task_tree_query(Tasks.list_id.in_(user_lists), Tasks.parent_id.is_(None))
+        .execution_options(yield_per=BATCH_SIZE)
+    )
+    with task_rows:
+        for row in task_rows:
+            data = row._mapping
+            yield _encode({"type": "task", **{name: data[name] for name in TASK_EXPORT_FIELDS}}) + "\n"
+
+
+# Staging tables, created per import on the import's connection
+_staging = MetaData()
+
+staged_lists = Table(
+    "import_lists", _staging,
+    Column("seq", Integer, primary_key=True),
+    Column("old_id", Integer, nullable=False, unique=True),
+    Column("name", String(200), nullable=False),
+    Column("description", Text),
+    Column("order_index", Integer),
+    Column("rank", String(64)),
+    Column("is_archived", Boolean),
+    Column("collapsed_tasks", JSON),
+    Column("created_at", DateTime),
+    prefixes=["TEMPORARY"],
+)
+
+staged_tasks = Table(
+    "import_tasks", _staging,
+    Column("seq", Integer, primary_key=True),
+    Column("old_id", Integer, nullable=False, unique=True),
+    Column("old_list_id", Integer, nullable=False),
+    Column("old_parent_id", Integer, index=True),
+    Column("name", String(200), nullable=False),
+    Column("description", Text),
+    Column("is_completed", Boolean),
+    Column("due_date", DateTime),
+    Column("priority", Integer),
+    Column("rank", String(64)),
+    Column("created_at", DateTime),
+    prefixes=["TEMPORARY"],
+)
+
+
+def _parse_datetime(value, field, line_number):
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise TransferError(f"Line {line_number}: invalid {field}")
+
+
+def _optional_int(record, field, line_number, low=None, high=None):
+    value = record.get(field)
+    if value is None:
+        return None
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise TransferError(f"Line {line_number}: {field} must be an integer")
+    if (low is not None and value < low) or (high is not None and value > high):
+        raise TransferError(f"Line {line_number}: {field} is out of range")
+    return value
+
+
+def _optional_bool(record, field, line_number):
+    value = record.get(field)
+    if value is None:
+        return False
+    if not isinstance(value, bool):
+        raise TransferError(f"Line {line_number}: {field} must be true or false")
+    return value
+
+
+def _parse_record(line, line_number):
+    try:
+        record = json.loads(line)
+    except ValueError:
+        raise TransferError(f"Line {line_number}: invalid JSON")
+    if not isinstance(record, dict) or record.get("type") not in ("list", "task"):
+        raise TransferError(f"Line {line_number}: expected a list or task record")
+
+    name = record.get("name")
+    if not isinstance(name, str) or not name.strip() or len(name) > 200:
+        raise TransferError(f"Line {line_number}: name must be 1-200 characters")
+    if _optional_int(record, "id", line_number) is None:
+        raise TransferError(f"Line {line_number}: id must be an integer")
+    description = record.get("description")
+    max_description = 500 if record["type"] == "list" else 1000
+    if description is not None and (not isinstance(description, str)
+                                    or len(description) > max_description):
+        raise TransferError(
+            f"Line {line_number}: description must be text of at most {max_description} characters"
+        )
+    rank = record.get("rank")
+    if rank is not None and not is_valid_rank(rank):
+        raise TransferError(f"Line {line_number}: invalid rank")
+
+    values = {
+        "old_id": record["id"],
+        "name": name.strip(),
+        "description": description,
+        "rank": rank,
+        "created_at": _parse_datetime(record.get("created_at"), "created_at", line_number),
+    }
+    if record["type"] == "list":
+        collapsed = record.get("collapsed_tasks")
+        if collapsed is None:
+            collapsed = []
+        if not isinstance(collapsed, list) or not all(
+                isinstance(i, int) and not isinstance(i, bool) for i in collapsed):
+            raise TransferError(f"Line {line_number}: collapsed_tasks must be a list of task ids")
+        values.update(
+            order_index=_optional_int(record, "order_index", line_number, low=0),
+            is_archived=_optional_bool(record, "is_archived", line_number),
+            collapsed_tasks=collapsed,
+        )
+    else:
+        if _optional_int(record, "list_id", line_number) is None:
+            raise TransferError(f"Line {line_number}: list_id must be an integer")
+        values.update(
+            old_list_id=record["list_id"],
+            old_parent_id=_optional_int(record, "parent_id", line_number),
+            is_completed=_optional_bool(record, "is_completed", line_number),
+            due_date=_parse_datetime(record.get("due_date"), "due_date", line_number),
+            priority=_optional_int(record, "priority", line_number, low=0, high=3) or 0,
+        )
+    return record["type"], values
+
+
+def _stage(connection, lines):
+    batches = {"list": [], "task": []}
+    tables = {"list": staged_lists, "task": staged_tasks}
+
+    def flush(kind):
+        if batches[kind]:
+            connection.execute(tables[kind].insert(), batches[kind])
+            batches[kind].clear()
+
+    for line_number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            try:
+                line = line.decode("utf-8")
+            except UnicodeDecodeError:
+                raise TransferError(f"Line {line_number}: not valid UTF-8")
+        if not line.strip():
+            continue
+        kind, values = _parse_record(line, line_number)
+        batches[kind].append(values)
+        if len(batches[kind]) >= BATCH_SIZE:
+            flush(kind)
+    flush("list")
+    flush("task")
+
+
+def _validate_staged(connection):
+    orphans = connection.scalar(
+        select(func.count()).select_from(staged_tasks).where(
+            staged_tasks.c.old_list_id.not_in(select(staged_lists.c.old_id))
+        )
+    )
+    if orphans:
+        raise TransferError(f"{orphans} tasks reference a list missing from the import")
+
+    # Walk the staged trees from their roots; tasks that are not reached
+    # have a missing parent, a parent in another list, or form a cycle
+    levels = select(
+        staged_tasks.c.old_id, staged_tasks.c.old_list_id, literal(0).label("level")
+    ).where(staged_tasks.c.old_parent_id.is_(None)).cte("levels", recursive=True)
+    levels = levels.union_all(
+        select(staged_tasks.c.old_id, staged_tasks.c.old_list_id, levels.c.level + 1)
+        .join(levels, (staged_tasks.c.old_parent_id == levels.c.old_id)
+              & (staged_tasks.c.old_list_id == levels.c.old_list_id))
+        .where(levels.c.level <= MAX_TASK_DEPTH)
+    )
+    reached, deepest = connection.execute(
+        select(func.count(), func.max(levels.c.level))
+    ).one()
+    staged = connection.scalar(select(func.count()).select_from(staged_tasks))
+    if deepest is not None and deepest > MAX_TASK_DEPTH:
+        raise TransferError("Tasks cannot be nested deeper than 3 levels")
+    if reached != staged:
+        raise TransferError(
+            f"{staged - reached} tasks reference a parent that is missing "
+            "from the import or belongs to another list"
+        )
+    return connection.scalar(select(func.count()).select_from(staged_lists)), staged
+
+
+def import_user_data(user_id, lines):
+    """Import NDJSON ``lines`` (str or bytes) into the user's account.
+
+    Runs in the current session's transaction; the caller commits.
+    Returns ``(list_count, task_count)``. Raises ``TransferError`` for
+    malformed input.
+    """
+    connection = db.session.connection()
+    lists = Lists.__table__
+    tasks = Tasks.__table__
+
+    # A rolled-back import may leave the tables on this pooled connection
+    for staging_table in (staged_tasks, staged_lists):
+        staging_table.drop(connection, checkfirst=True)
+        staging_table.create(connection)
+    try:
+        try:
+            _stage(connection, lines)
+        except IntegrityError:
+            raise TransferError("Duplicate list or task id in the import")
+        list_count, task_count = _validate_staged(connection)
+        if not list_count:
+            return 0, 0
+
+        # New ids follow the current maximum in staging order, so every
+        # reference can be remapped with a join inside SQLite
+        list_base = connection.scalar(select(func.coalesce(func.max(lists.c.id), 0)))
+        task_base = connection.scalar(select(func.coalesce(func.max(tasks.c.id), 0)))
+        revision = next_revision(connection, user_id)
+        now = datetime.utcnow()
+
+        collapsed_ids = func.json_each(staged_lists.c.collapsed_tasks).table_valued("value")
+        collapsed = select(
+            func.json_group_array(staged_tasks.c.seq + task_base)
+        ).join_from(
+            collapsed_ids, staged_tasks, staged_tasks.c.old_id == collapsed_ids.c.value
+        ).scalar_subquery()
+        # Records without a rank (older exports) keep their file order
+        def staged_rank(staged):
+            return func.coalesce(staged.c.rank, func.printf("%09dV", staged.c.seq))
+
+        # Imported lists go after the user's last list, in their own order:
+        # every rank that starts with a rank above the last one sorts above it
+        last_rank = connection.scalar(
+            select(func.max(lists.c.rank)).where(lists.c.user_id == user_id)
+        )
+        list_rank = staged_rank(staged_lists)
+        if last_rank is not None:
+            list_rank = literal(rank_between(last_rank, None)) + list_rank
+
+        connection.execute(lists.insert().from_select(
+            ["id", "name", "user_id", "order_index", "rank", "description", "is_archived",
+             "collapsed_tasks", "revision", "created_at"],
+            select(
+                staged_lists.c.seq + list_base,
+                staged_lists.c.name,
+                literal(int(user_id)),
+                staged_lists.c.order_index,
+                list_rank,
+                staged_lists.c.description,
+                staged_lists.c.is_archived,
+                collapsed,
+                literal(revision),
+                func.coalesce(staged_lists.c.created_at, now),
+            ).order_by(staged_lists.c.seq)
+        ))
+
+        parent = staged_tasks.alias("staged_parent")
+        list_ = staged_lists.alias("staged_list")
+        connection.execute(tasks.insert().from_select(
+            ["id", "name", "description", "list_id", "parent_id", "is_completed",
+             "due_date", "priority", "rank", "revision", "created_at"],
+            select(
+                staged_tasks.c.seq + task_base,
+                staged_tasks.c.name,
+                staged_tasks.c.description,
+                list_.c.seq + list_base,
+                parent.c.seq + task_base,
+                staged_tasks.c.is_completed,
+                staged_tasks.c.due_date,
+                staged_tasks.c.priority,
+                staged_rank(staged_tasks),
+                literal(revision),
+                func.coalesce(staged_tasks.c.created_at, now),
+            ).select_from(
+                staged_tasks
+                .join(list_, list_.c.old_id == staged_tasks.c.old_list_id)
+                .outerjoin(parent, parent.c.old_id == staged_tasks.c.old_parent_id)
+            ).order_by(staged_tasks.c.seq)
+        ))
+        rebuild_task_hierarchy(connection, tasks.c.id > task_base)
+        return list_count, task_count
+    finally:
+        staged_tasks.drop(connection)
+        staged_lists.drop(connection)
+
+
+data_cli = AppGroup("data", help="Export and import user data as NDJSON, and prune sync records.")
+
+
+def _get_user(username):
+    user = Users.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f"No user named {username}")
+    return user
+
+
+@data_cli.command("export")
+@click.argument("username")
+@click.argument("output", type=click.File("w"), default="-")
+def export_command(username, output):
+    """Write USERNAME's lists and tasks to OUTPUT (default: stdout)."""
+    for line in export_user_data(_get_user(username).id):
+        output.write(line)
+
+
+@data_cli.command("import")
+@click.argument("username")
+@click.argument("source", type=click.File("rb"), default="-")
+def import_command(username, source):
+    """Load lists and tasks from SOURCE (default: stdin) into USERNAME's account."""
+    user = _get_user(username)
+    try:
+        list_count, task_count = import_user_data(user.id, source)
+    except TransferError as e:
+        db.session.rollback()
+        raise click.ClickException(str(e))
+    db.session.commit()
+    click.echo(f"Imported {list_count} lists and {task_count} tasks")
+
+
+@data_cli.command("prune-tombstones")
+@click.option("--days", type=int, default=None,
+              help="Retention in days (default: TOMBSTONE_RETENTION_DAYS).")
+def prune_tombstones_command(days):
+    """Delete deletion records older than the retention period.
+
+    Run it daily, e.g. from cron. Clients that last synced before the
+    pruned records must refetch everything.
+    """
+    if days is None:
+        days = current_app.config.get("TOMBSTONE_RETENTION_DAYS", 30)
+    pruned = prune_tombstones(db.session.connection(), datetime.utcnow() - timedelta(days=days))
+    db.session.commit()
+    click.echo(f"Pruned {pruned} tombstones older than {days} days")
@@ -1,9 +1,11 @@
 # decorators.py
 
 from functools import wraps
-from flask import jsonify, request, current_app
+from flask import jsonify, request, current_app, make_response
 from flask_jwt_extended import get_jwt_identity
-from core.models import Lists
+from werkzeug.exceptions import HTTPException
+from core.models import current_revision
+import zlib
 
 def handle_exceptions(endpoint=None):
     def decorator(f):
@@ -11,8 +13,11 @@ def handle_exceptions(endpoint=None):
         def wrapped(*args, **kwargs):
             try:
                 return f(*args, **kwargs)
+            except HTTPException:
+                # Let aborts such as first_or_404() keep their status code
+                raise
             except Exception as e:
-                current_app.logger.error(f"Error in {endpoint or f.__name__}: {str(e)}", exc_info=True)
+                current_app.logger.exception("Error in %s", endpoint or f.__name__)
                 return jsonify({
                     "error": e.__class__.__name__,
                     "message": str(e)
@@ -27,23 +32,25 @@ def handle_exceptions(endpoint=None):
         return decorator(f)
     return decorator
 
-def user_owns_resource(model):
-    def decorator(f):
-        @wraps(f)
-        def decorated_function(*args, **kwargs):
-            current_user_id = get_jwt_identity()
-            resource_id = kwargs.get('list_id') or kwargs.get('task_id')
-            if not resource_id:
-                return jsonify({"error": "Resource ID required"}), 400
-                
-            resource = model.query.get_or_404(resource_id)
-            
-            # For Tasks, check ownership via the associated List
-            user_id = resource.list.user_id if model.__name__ == 'Tasks' else resource.user_id
-            
-            if user_id != current_user_id:
-                return jsonify({"error": "Unauthorized"}), 403
-            
-            return f(*args, **kwargs)
-        return decorated_function
-    return decorator
+def etag_by_revision(f):
+    """Answer conditional GETs from the user's change counter.
+
+    The strong ETag combines the user's revision with the query string, so
+    a matching ``If-None-Match`` gets a 304 without running the view. Must
+    be applied below ``jwt_required``.
+    """
+    @wraps(f)
+    def wrapped(*args, **kwargs):
+        revision = current_revision(get_jwt_identity())
+        etag = f"{revision}-{zlib.crc32(request.full_path.encode()):08x}"
+
+        if request.if_none_match.contains(etag):
+            response = make_response("", 304)
+            response.set_etag(etag)
+            return response
+
+        response = make_response(f(*args, **kwargs))
+        if response.status_code == 200:
+            response.set_etag(etag)
+        return response
+    return wrapped
@@ -0,0 +1,96 @@
+"""
+Cached resolution of JWT identities to users.
+
+Authenticated endpoints only need a user's id, username and email, so the
+cache holds small immutable snapshots rather than ORM instances. Snapshots
+are dropped whenever the user row is updated or deleted, and expire after
+``IDENTITY_CACHE_TTL`` seconds regardless.
+"""
+
+from flask import current_app, has_app_context
+from flask_login import UserMixin
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+from core.models import db, Users
+from core.utils.cache import TTLCache
+
+
+class CachedUser(UserMixin):
+    """Read-only snapshot of a user row."""
+    __slots__ = ("id", "username", "email", "created_at")
+
+    def __init__(self, id, username, email, created_at):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.created_at = created_at
+
+    def get_id(self):
+        return str(self.id)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "username": self.username,
+            "email": self.email,
+            "created_at": self.created_at.isoformat() if self.created_at else None
+        }
+
+
+def init_identity_cache(app):
+    app.extensions["identity_cache"] = TTLCache(
+        maxsize=app.config.get("IDENTITY_CACHE_SIZE", 10000),
+        ttl=app.config.get("IDENTITY_CACHE_TTL", 60),
+    )
+    return app.extensions["identity_cache"]
+
+
+def _cache():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get("identity_cache")
+
+
+def get_user(user_id):
+    """Return a ``CachedUser`` for ``user_id``, or None if it does not exist."""
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+
+    cache = _cache()
+    user = cache.get(user_id) if cache is not None else None
+    if user is None:
+        row = db.session.execute(
+            select(Users.id, Users.username, Users.email, Users.created_at)
+            .where(Users.id == user_id)
+        ).first()
+        if row is None:
+            return None
+        user = CachedUser(*row)
+        if cache is not None:
+            cache.set(user_id, user)
+    return user
+
+
+def invalidate_user(user_id):
+    cache = _cache()
+    if cache is not None:
+        cache.invalidate(user_id)
+
+
+@event.listens_for(Users, 'after_update')
+@event.listens_for(Users, 'after_delete')
+def forget_changed_user(mapper, connection, target):
+    """Drop the snapshot now and again once the change is committed."""
+    invalidate_user(target.id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("changed_users", set()).add(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def forget_committed_users(session):
+    # A concurrent request may have re-cached the old row before the commit
+    for user_id in session.info.pop("changed_users", ()):
+        invalidate_user(user_id)
@@ -0,0 +1,184 @@
+"""
+Non-blocking, structured logging.
+
+``init_logging`` puts a ``QueueHandler`` on the root logger, so a request
+thread only copies the record onto a queue; a ``QueueListener`` thread
+formats it and does the file or terminal I/O. Each record is written as
+one JSON object per line, with the request id, method and path when it
+was logged during a request. The id comes from the ``X-Request-ID``
+header or is generated, and is echoed in the response.
+
+Before anything is written, messages and tracebacks are scrubbed of SQL
+parameter lists, password hashes, JWTs and ``password=``/``token=``
+style values. A traceback that repeats (same logger, exception type and
+raising line) within ``LOG_DEDUPE_WINDOW`` seconds is logged without its
+stack, with a count of the suppressed repeats added to the next full one.
+"""
+
+import atexit
+import copy
+import json
+import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import os
+import queue
+import re
+import threading
+import time
+import traceback
+import uuid
+
+from flask import g, has_request_context, request
+from flask.logging import default_handler
+
+SCRUBBED = "***"
+SCRUB_PATTERNS = (
+    # SQLAlchemy appends the bound values of a failed statement
+    (re.compile(r"\[parameters: .*?\]$", re.MULTILINE | re.DOTALL), "[parameters: ***]"),
+    (re.compile(r"\b(?:pbkdf2|scrypt):[\w:]+\$[^$\s'\"]+\$[0-9a-fA-F]+"), SCRUBBED),
+    (re.compile(r"\$argon2\w*\$[^\s'\"]+"), SCRUBBED),
+    (re.compile(r"\beyJ[\w-]+\.[\w-]+\.[\w-]+"), SCRUBBED),
+    (re.compile(r"(?i)([\"']?\b(?:password(?:_hash)?|passwd|secret|token|authorization|api_key)"
+                r"[\"']?\s*[:=]\s*)(?:\"[^\"]*\"|'[^']*'|[^\s,;&}]+)"), rf"\g<1>{SCRUBBED}"),
+)
+REQUEST_ID = re.compile(r"^[\w.-]{1,64}$")
+
+_pipeline = None  # (QueueHandler, QueueListener) installed by init_logging
+_pipeline_lock = threading.Lock()
+
+
+def scrub(text):
+    """``text`` with secrets and SQL parameters replaced."""
+    for pattern, replacement in SCRUB_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+class RequestQueueHandler(QueueHandler):
+    """Queue records with their request details, leaving formatting to the listener."""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        # Arguments may be mutated after this returns; render the message now
+        record.msg, record.args = record.getMessage(), None
+        if has_request_context():
+            record.request_id = g.get("request_id")
+            record.method = request.method
+            record.path = request.path
+        return record
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record; repeated tracebacks are shortened.
+
+    Only the listener thread formats, so the repeat table needs no lock.
+    """
+
+    converter = time.gmtime
+
+    def __init__(self, dedupe_window=60.0, clock=time.monotonic):
+        super().__init__()
+        self.dedupe_window = dedupe_window
+        self.clock = clock
+        self._seen = {}  # key -> [last full traceback at, repeats suppressed since]
+
+    def format(self, record):
+        # RotatingFileHandler formats once to check the size and again to write
+        if getattr(record, "json_line", None) is not None:
+            return record.json_line
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": scrub(record.getMessage()),
+            "at": f"{record.pathname}:{record.lineno}",
+        }
+        for name in ("request_id", "method", "path"):
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        if record.exc_info and record.exc_info[1] is not None:
+            entry.update(self._exception(record))
+        record.json_line = json.dumps(entry, default=str)
+        return record.json_line
+
+    def _exception(self, record):
+        exc_type, exc, tb = record.exc_info
+        frames = traceback.extract_tb(tb)
+        origin = f"{frames[-1].filename}:{frames[-1].lineno}" if frames else ""
+        fields = {"exc_type": exc_type.__name__, "exc_msg": scrub(str(exc))}
+
+        key = (record.name, exc_type, origin)
+        now = self.clock()
+        seen = self._seen.get(key)
+        if seen is not None and now - seen[0] < self.dedupe_window:
+            seen[1] += 1
+            fields["traceback_suppressed"] = True
+            return fields
+        if seen is not None and seen[1]:
+            fields["repeats_suppressed"] = seen[1]
+        self._seen[key] = [now, 0]
+        if len(self._seen) > 1000:
+            self._seen = {k: v for k, v in self._seen.items() if now - v[0] < self.dedupe_window}
+        fields["traceback"] = scrub("".join(traceback.format_exception(exc_type, exc, tb)))
+        return fields
+
+
+def _writer(app):
+    path = app.config.get("LOG_FILE")
+    if not path:
+        return logging.StreamHandler()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return RotatingFileHandler(
+        path,
+        maxBytes=app.config.get("LOG_MAX_BYTES", 10 * 1024 * 1024),
+        backupCount=app.config.get("LOG_BACKUP_COUNT", 10),
+        encoding="utf-8",
+    )
+
+
+def init_logging(app):
+    """Route every log record through a queue to a background JSON writer.
+
+    Logging is process-wide: a later call replaces the pipeline of an
+    earlier one, after draining it. Returns the ``QueueListener``.
+    """
+    global _pipeline
+    writer = _writer(app)
+    writer.setFormatter(JSONFormatter(app.config.get("LOG_DEDUPE_WINDOW", 60)))
+    records = queue.SimpleQueue()
+    handler = RequestQueueHandler(records)
+    listener = QueueListener(records, writer, respect_handler_level=True)
+
+    # Records reach the root handler; Flask's own stderr handler would repeat them
+    app.logger.removeHandler(default_handler)
+    root = logging.getLogger()
+    with _pipeline_lock:
+        if _pipeline is not None:
+            root.removeHandler(_pipeline[0])
+            _pipeline[1].stop()
+            _pipeline[1].handlers[0].close()
+        root.addHandler(handler)
+        root.setLevel(app.config.get("LOG_LEVEL", "INFO"))
+        listener.start()
+        _pipeline = (handler, listener)
+
+    @app.before_request
+    def assign_request_id():
+        incoming = request.headers.get("X-Request-ID", "")
+        g.request_id = incoming if REQUEST_ID.match(incoming) else uuid.uuid4().hex
+
+    @app.after_request
+    def echo_request_id(response):
+        if "request_id" in g:
+            response.headers["X-Request-ID"] = g.request_id
+        return response
+
+    return listener
+
+
+@atexit.register
+def _flush_logs():
+    # Write whatever is still queued before the process exits
+    if _pipeline is not None:
+        _pipeline[1].stop()
@@ -0,0 +1,220 @@
+"""
+Request metrics and slow-request profiling.
+
+When ``METRICS_ENABLED`` is set, every request records its latency,
+response size and the number and total time of the SQL statements it ran,
+labelled by endpoint. The totals are served in the Prometheus text format
+at ``/metrics`` to scrapers sending ``Authorization: Bearer
+<METRICS_TOKEN>``; without a token configured the endpoint is not
+registered, since the labels reveal the API's routes and traffic.
+Streamed responses are timed to the first byte and their size is not
+recorded.
+
+A fraction ``PROFILE_SAMPLE_RATE`` of requests runs under cProfile; the
+profile is written to ``PROFILE_DIR`` when the request took at least
+``PROFILE_SLOW_REQUEST`` seconds. Load a dump with ``pstats.Stats(path)``
+or ``snakeviz``.
+
+Counters live in the process, so each worker reports its own.
+"""
+
+from bisect import bisect_left
+import cProfile
+import hmac
+import os
+import random
+import threading
+import time
+
+from flask import Response, g, request, has_request_context
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """Bucket counts, sum and count for one label set."""
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+def _labels(names, values):
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+               for v in values)
+    return ",".join(f'{name}="{value}"' for name, value in zip(names, escaped))
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """Thread-safe registry of the request counters and histograms."""
+
+    def __init__(self, latency_buckets=LATENCY_BUCKETS):
+        self.latency_buckets = tuple(latency_buckets)
+        self._lock = threading.Lock()
+        self._requests = {}   # (endpoint, method, status) -> count
+        self._latency = {}    # (endpoint, method) -> Histogram
+        self._size = {}       # (endpoint,) -> Histogram
+        self._queries = {}    # (endpoint,) -> Histogram of statements per request
+        self._query_time = {}  # (endpoint,) -> seconds spent in SQL
+        self.profiles_written = 0
+        self._stats = []  # (prefix, help text, callable returning {name: value})
+
+    def observe(self, endpoint, method, status, duration, size, queries, query_time):
+        with self._lock:
+            key = (endpoint, method, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            self._histogram(self._latency, (endpoint, method), self.latency_buckets).observe(duration)
+            if size is not None:
+                self._histogram(self._size, (endpoint,), SIZE_BUCKETS).observe(size)
+            self._histogram(self._queries, (endpoint,), QUERY_BUCKETS).observe(queries)
+            self._query_time[(endpoint,)] = self._query_time.get((endpoint,), 0.0) + query_time
+
+    def count_profile(self):
+        with self._lock:
+            self.profiles_written += 1
+
+    def add_stats(self, prefix, help_text, stats):
+        """Export ``stats()``, a dict of numbers, as gauges named ``<prefix>_<key>``."""
+        self._stats.append((prefix, help_text, stats))
+
+    @staticmethod
+    def _histogram(store, key, buckets):
+        histogram = store.get(key)
+        if histogram is None:
+            histogram = store[key] = Histogram(buckets)
+        return histogram
+
+    def render(self):
+        """The current values in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            self._render_counter(lines, "http_requests_total", "Requests handled.",
+                                 ("endpoint", "method", "status"), self._requests)
+            self._render_histogram(lines, "http_request_duration_seconds",
+                                   "Request latency in seconds.", ("endpoint", "method"), self._latency)
+            self._render_histogram(lines, "http_response_size_bytes",
+                                   "Response body size in bytes.", ("endpoint",), self._size)
+            self._render_histogram(lines, "http_request_db_queries",
+                                   "SQL statements per request.", ("endpoint",), self._queries)
+            self._render_counter(lines, "db_query_duration_seconds_total",
+                                 "Time spent executing SQL.", ("endpoint",), self._query_time)
+        for prefix, help_text, stats in self._stats:
+            for key, value in stats().items():
+                name = f"{prefix}_{key}"
+                lines += [f"# HELP {name} {help_text}: {key}.", f"# TYPE {name} gauge",
+                          f"{name} {_number(value)}"]
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _render_counter(lines, name, help_text, label_names, values):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for key, value in sorted(values.items()):
+            lines.append(f"{name}{{{_labels(label_names, key)}}} {_number(value)}")
+
+    @staticmethod
+    def _render_histogram(lines, name, help_text, label_names, histograms):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for key, histogram in sorted(histograms.items()):
+            labels = _labels(label_names, key)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{labels}}} {_number(histogram.total)}")
+            lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_metrics_start", None)
+    if start is not None and has_request_context() and "metrics_start" in g:
+        g.metrics_queries += 1
+        g.metrics_query_time += time.perf_counter() - start
+
+
+def init_metrics(app, engine):
+    """Install the request hooks, SQL listeners and, with a token, ``/metrics``.
+
+    Returns the ``Metrics`` registry, or None when ``METRICS_ENABLED`` is off.
+    """
+    if not app.config.get("METRICS_ENABLED"):
+        return None
+
+    metrics = Metrics(app.config.get("METRICS_LATENCY_BUCKETS", LATENCY_BUCKETS))
+    app.extensions["metrics"] = metrics
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+    sample_rate = app.config.get("PROFILE_SAMPLE_RATE", 0.0)
+    slow_request = app.config.get("PROFILE_SLOW_REQUEST", 1.0)
+    profile_dir = app.config.get("PROFILE_DIR") or os.path.join(app.instance_path, "profiles")
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_start = time.perf_counter()
+        g.metrics_queries = 0
+        g.metrics_query_time = 0.0
+        if sample_rate and random.random() < sample_rate:
+            g.metrics_profiler = cProfile.Profile()
+            g.metrics_profiler.enable()
+
+    @app.after_request
+    def record_request_metrics(response):
+        if "metrics_start" not in g:
+            return response
+        duration = time.perf_counter() - g.metrics_start
+        endpoint = request.endpoint or "unmatched"
+        profiler = g.pop("metrics_profiler", None)
+        if profiler is not None:
+            profiler.disable()
+            if duration >= slow_request:
+                os.makedirs(profile_dir, exist_ok=True)
+                name = f"{time.strftime('%Y%m%dT%H%M%S')}-{endpoint}-{int(duration * 1000)}ms-{os.getpid()}.prof"
+                profiler.dump_stats(os.path.join(profile_dir, name))
+                metrics.count_profile()
+        metrics.observe(
+            endpoint, request.method, response.status_code, duration,
+            None if response.is_streamed else response.content_length,
+            g.metrics_queries, g.metrics_query_time,
+        )
+        return response
+
+    @app.teardown_request
+    def stop_request_profiler(exc):
+        # after_request is skipped when the view raised
+        profiler = g.pop("metrics_profiler", None)
+        if profiler is not None:
+            profiler.disable()
+
+    token = app.config.get("METRICS_TOKEN")
+    if not token:
+        return metrics
+    expected = f"Bearer {token}".encode()
+
+    def metrics_view():
+        if not hmac.compare_digest(request.headers.get("Authorization", "").encode(), expected):
+            return Response("Unauthorized\n", 401, {"WWW-Authenticate": "Bearer"},
+                            mimetype="text/plain")
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+    app.add_url_rule("/metrics", "metrics", metrics_view)
+    return metrics
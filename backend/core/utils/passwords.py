@@ -0,0 +1,130 @@
+"""
+Password hashing service running pbkdf2 off the request thread.
+
+Hashing and verification run on a bounded worker pool. When every worker
+is busy and the waiting queue is full, callers get ``HasherBusy`` straight
+away instead of piling up behind each other, so a login storm cannot tie
+up every request thread of a worker process.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+import threading
+import time
+
+DEFAULT_METHOD = "pbkdf2:sha256:600000"
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing pool and its queue are saturated."""
+
+
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _verify(pwhash, password, method):
+    """Check ``password``; return ``(ok, new_hash)``, rehashing outdated parameters."""
+    if not pwhash or not check_password_hash(pwhash, password):
+        return False, None
+    if pwhash.split("$", 1)[0] != method:
+        return True, generate_password_hash(password, method=method)
+    return True, None
+
+
+def _percentile(samples, fraction):
+    return samples[round(fraction * (len(samples) - 1))]
+
+
+class PasswordHasher:
+    """Bounded pool for password hashing with back-pressure and latency stats."""
+
+    def __init__(self, method=DEFAULT_METHOD, max_workers=2, max_queue=16,
+                 executor="thread", timeout=30, sample_size=1000):
+        pool = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+        self.method = method
+        self.timeout = timeout
+        self._executor = pool(max_workers=max_workers)
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._capacity = max_workers + max_queue
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=sample_size)
+        self._completed = 0
+        self._rejected = 0
+        self._rehashed = 0
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise HasherBusy("Password hashing is saturated, retry shortly")
+
+        start = time.perf_counter()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # The slot is held until the job ends, even if the caller times out
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        finally:
+            with self._lock:
+                self._completed += 1
+                self._latencies.append(time.perf_counter() - start)
+
+    def hash(self, password):
+        """Hash ``password`` with the configured method."""
+        return self._run(_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        """Verify ``password`` against ``pwhash``.
+
+        Returns ``(ok, new_hash)``; ``new_hash`` is set when the stored hash
+        used outdated parameters and should replace it.
+        """
+        ok, new_hash = self._run(_verify, pwhash, password, self.method)
+        if new_hash:
+            with self._lock:
+                self._rehashed += 1
+        return ok, new_hash
+
+    def stats(self):
+        """Counters and latency percentiles (milliseconds) of recent calls."""
+        with self._lock:
+            samples = sorted(self._latencies)
+            stats = {
+                "method": self.method,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "rehashed": self._rehashed,
+                "capacity": self._capacity,
+            }
+        if samples:
+            stats.update(
+                p50_ms=round(_percentile(samples, 0.50) * 1000, 2),
+                p95_ms=round(_percentile(samples, 0.95) * 1000, 2),
+                max_ms=round(samples[-1] * 1000, 2),
+            )
+        return stats
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+def init_password_hasher(app):
+    """Create the application's hasher from ``PASSWORD_HASH_*`` settings."""
+    app.extensions["password_hasher"] = PasswordHasher(
+        method=app.config.get("PASSWORD_HASH_METHOD", DEFAULT_METHOD),
+        max_workers=app.config.get("PASSWORD_HASH_WORKERS", 2),
+        max_queue=app.config.get("PASSWORD_HASH_QUEUE", 16),
+        executor=app.config.get("PASSWORD_HASH_EXECUTOR", "thread"),
+    )
+    return app.extensions["password_hasher"]
+
+
+def get_password_hasher():
+    return current_app.extensions["password_hasher"]
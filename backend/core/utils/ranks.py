@@ -0,0 +1,87 @@
+"""
+Lexicographic ordering keys.
+
+A rank is a string of base-62 digits read as a fraction in ``[0, 1)``;
+plain string comparison orders ranks like the numbers they stand for.
+There is always another rank between any two, so moving an item only
+rewrites that item's rank. Ranks never end in ``"0"``, which keeps
+exactly one spelling per value and leaves room below every rank.
+
+Repeated inserts at the same spot make ranks longer by about one digit
+per six inserts; ``spaced_ranks`` produces short, evenly spaced
+replacements for a whole sibling group when that happens.
+"""
+
+import re
+
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+BASE = len(DIGITS)
+_INDEX = {digit: i for i, digit in enumerate(DIGITS)}
+
+RANK_PATTERN = re.compile(r"^[0-9A-Za-z]*[1-9A-Za-z]$")
+
+
+def is_valid_rank(rank):
+    return isinstance(rank, str) and bool(RANK_PATTERN.match(rank))
+
+
+def _midpoint(low, high):
+    # ``low`` is "" or a rank, ``high`` is None (meaning 1) or a rank > low
+    if high is not None:
+        n = 0
+        while n < len(high) and (low[n] if n < len(low) else "0") == high[n]:
+            n += 1
+        if n:
+            return high[:n] + _midpoint(low[n:], high[n:])
+
+    digit_low = _INDEX[low[0]] if low else 0
+    digit_high = _INDEX[high[0]] if high is not None else BASE
+    if digit_high - digit_low > 1:
+        return DIGITS[(digit_low + digit_high + 1) // 2]
+    if high is not None and len(high) > 1:
+        return high[0]
+    return DIGITS[digit_low] + _midpoint(low[1:], None)
+
+
+def rank_between(before=None, after=None):
+    """A rank sorting after ``before`` and before ``after``.
+
+    Either side may be None for an open end. Appending and prepending
+    step the first digit that has room, so ranks at the ends of a group
+    stay short.
+    """
+    if before is not None and after is not None and before >= after:
+        raise ValueError(f"Rank {before!r} does not sort before {after!r}")
+
+    if after is None and before:
+        for i, digit in enumerate(before):
+            if digit != DIGITS[-1]:
+                return before[:i] + DIGITS[_INDEX[digit] + 1]
+    if before is None and after:
+        for i, digit in enumerate(after):
+            if _INDEX[digit] > 1:
+                return after[:i] + DIGITS[_INDEX[digit] - 1]
+    return _midpoint(before or "", after)
+
+
+def _encode(value, width):
+    digits = []
+    for _ in range(width):
+        value, remainder = divmod(value, BASE)
+        digits.append(DIGITS[remainder])
+    return "".join(reversed(digits))
+
+
+def spaced_ranks(count):
+    """``count`` ascending ranks of equal, minimal length spread over [0, 1)."""
+    width = 1
+    while BASE ** width < 2 * (count + 1):
+        width += 1
+    step = BASE ** width // (count + 1)
+    ranks = []
+    for i in range(1, count + 1):
+        value = step * i
+        if value % BASE == 0:
+            value += 1  # no trailing "0"; step >= 2 keeps the order
+        ranks.append(_encode(value, width))
+    return ranks
@@ -1,35 +1,208 @@
+"""
+Sliding-window rate limiting with bounded memory and pluggable storage.
+
+Each key keeps two counters, for the current and the previous fixed window.
+The request rate is estimated by weighting the previous window by how much
+of it still overlaps the sliding window, so a check is O(1) whatever the
+limit. The in-memory backend evicts idle keys (LRU + TTL); the SQLite
+backend lets several worker processes on one host share their limits.
+"""
+
+from collections import OrderedDict
 from functools import wraps
-from flask import request, jsonify
-from datetime import datetime, timedelta
-from collections import defaultdict
+from flask import request, jsonify, current_app, make_response
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+import math
+import os
+import sqlite3
+import threading
+import time
+
+
+def _slide(state, now, window):
+    """Roll ``(window_start, current, previous)`` forward to ``now``.
+
+    Returns the rolled state and the estimated number of requests in the
+    sliding window ending at ``now``.
+    """
+    start = now - (now % window)
+    if state is None:
+        return (start, 0, 0), 0.0
+
+    old_start, current, previous = state
+    if old_start == start:
+        pass
+    elif old_start == start - window:
+        current, previous = 0, current
+    else:
+        current, previous = 0, 0
+
+    overlap = (window - (now - start)) / window
+    return (start, current, previous), previous * overlap + current
+
+
+def _decide(state, now, limit, window):
+    """Apply one request to ``state``; return ``(state, allowed, remaining, retry_after)``."""
+    (start, current, previous), estimate = _slide(state, now, window)
+    if estimate + 1 > limit:
+        # Wait until enough of the previous window has slid out
+        if previous:
+            needed = (estimate + 1 - limit) / previous * window
+            retry_after = min(window, max(1, math.ceil(needed)))
+        else:
+            retry_after = max(1, math.ceil(start + window - now))
+        return (start, current, previous), False, 0, retry_after
+    state = (start, current + 1, previous)
+    return state, True, max(0, int(limit - estimate - 1)), 0
+
+
+class MemoryBackend:
+    """Per-process store holding at most ``max_keys`` keys.
+
+    Keys idle for longer than ``ttl`` seconds are dropped as new requests
+    arrive; when full, the least recently used key is evicted.
+    """
+
+    def __init__(self, max_keys=10000, ttl=3600, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (last_seen, state)
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, window):
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            state, allowed, remaining, retry_after = _decide(
+                entry[1] if entry else None, now, limit, window
+            )
+            self._entries[key] = (now, state)
+
+            # Oldest entries sit at the front; stop at the first fresh one
+            while self._entries:
+                oldest_key, (last_seen, _) = next(iter(self._entries.items()))
+                if len(self._entries) <= self.max_keys and now - last_seen <= self.ttl:
+                    break
+                del self._entries[oldest_key]
+        return allowed, remaining, retry_after
+
+    def __len__(self):
+        return len(self._entries)
+
 
-# Simple in-memory rate limiting store
-rate_limit_store = defaultdict(list)
+class SQLiteBackend:
+    """Store shared by every process using the same SQLite file.
 
-def rate_limit(limit=60, window=60):  # default: 60 requests per 60 seconds
+    Uses wall-clock time, since the counters outlive any single process.
+    Idle rows are purged at most once per ``ttl`` seconds per process.
+    """
+
+    def __init__(self, path, ttl=3600, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self.clock = clock
+        self._local = threading.local()
+        self._last_purge = 0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limits ("
+                " key TEXT PRIMARY KEY, window_start REAL NOT NULL,"
+                " current INTEGER NOT NULL, previous INTEGER NOT NULL,"
+                " last_seen REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        # Connections are per thread and must not cross a fork
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def hit(self, key, limit, window):
+        now = self.clock()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT window_start, current, previous FROM rate_limits WHERE key = ?",
+                (key,)
+            ).fetchone()
+            state, allowed, remaining, retry_after = _decide(row, now, limit, window)
+            conn.execute(
+                "INSERT INTO rate_limits (key, window_start, current, previous, last_seen)"
+                " VALUES (?, ?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET"
+                " window_start = excluded.window_start, current = excluded.current,"
+                " previous = excluded.previous, last_seen = excluded.last_seen",
+                (key, *state, now)
+            )
+            if now - self._last_purge > self.ttl:
+                conn.execute("DELETE FROM rate_limits WHERE last_seen < ?", (now - self.ttl,))
+                self._last_purge = now
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, remaining, retry_after
+
+
+def key_by_ip():
+    return f"ip:{request.remote_addr}"
+
+
+def key_by_identity():
+    """Key by JWT identity when the request carries a valid token, else by IP."""
+    verify_jwt_in_request(optional=True)
+    identity = get_jwt_identity()
+    return f"user:{identity}" if identity is not None else key_by_ip()
+
+
+# Used when the application did not configure a limiter
+_default_backend = MemoryBackend()
+
+
+def init_rate_limiter(app):
+    """Create the backend selected by ``RATELIMIT_STORAGE``.
+
+    ``memory`` (the default) keeps per-process counters; ``sqlite:///path``
+    shares them through a SQLite file.
+    """
+    storage = app.config.get("RATELIMIT_STORAGE", "memory")
+    if storage.startswith("sqlite:///"):
+        backend = SQLiteBackend(storage[len("sqlite:///"):])
+    else:
+        backend = MemoryBackend(max_keys=app.config.get("RATELIMIT_MAX_KEYS", 10000))
+    app.extensions["rate_limiter"] = backend
+    return backend
+
+
+def rate_limit(limit=60, window=60, key_func=key_by_ip, scope=None):  # default: 60 requests per 60 seconds
     def decorator(f):
+        prefix = scope or f.__name__
+
         @wraps(f)
         def wrapped(*args, **kwargs):
-            # Get client IP
-            client_ip = request.remote_addr
-            now = datetime.now()
-            
-            # Clean old requests
-            rate_limit_store[client_ip] = [
-                timestamp for timestamp in rate_limit_store[client_ip]
-                if timestamp > now - timedelta(seconds=window)
-            ]
-            
-            # Check if limit is exceeded
-            if len(rate_limit_store[client_ip]) >= limit:
-                return jsonify({
+            if not current_app.config.get("RATELIMIT_ENABLED", True):
+                return f(*args, **kwargs)
+
+            backend = current_app.extensions.get("rate_limiter", _default_backend)
+            allowed, remaining, retry_after = backend.hit(
+                f"{prefix}:{key_func()}", limit, window
+            )
+
+            if not allowed:
+                response = jsonify({
                     "error": "Rate limit exceeded",
                     "message": f"Maximum {limit} requests per {window} seconds"
-                }), 429
-            
-            # Add current request timestamp
-            rate_limit_store[client_ip].append(now)
-            
-            return f(*args, **kwargs)
+                })
+                response.status_code = 429
+                response.headers["Retry-After"] = str(retry_after)
+            else:
+                response = make_response(f(*args, **kwargs))
+            response.headers["X-RateLimit-Limit"] = str(limit)
+            response.headers["X-RateLimit-Remaining"] = str(remaining)
+            return response
         return wrapped
     return decorator
@@ -0,0 +1,59 @@
+"""
+SQLite engine profile.
+
+Every new DBAPI connection gets the pragmas from ``SQLITE_PRAGMAS``: WAL so
+readers never block the writer, ``synchronous=NORMAL`` (durable at WAL
+checkpoints), a larger page cache and mmap window, a busy timeout so a
+writer waits for the lock instead of failing with "database is locked",
+and foreign key enforcement. File databases also get a sized connection
+pool; in-memory databases keep SQLAlchemy's single-connection pool.
+"""
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+def is_memory_database(uri):
+    url = make_url(uri)
+    return (url.get_backend_name() == "sqlite"
+            and (url.database in (None, "", ":memory:") or url.query.get("mode") == "memory"))
+
+
+def sqlite_engine_options(app):
+    """Merge the pool settings into ``SQLALCHEMY_ENGINE_OPTIONS``.
+
+    Must run before ``db.init_app`` since the engine is created there.
+    """
+    uri = app.config["SQLALCHEMY_DATABASE_URI"]
+    if not uri.startswith("sqlite") or is_memory_database(uri):
+        return app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {})
+
+    pragmas = app.config.get("SQLITE_PRAGMAS", {})
+    options = dict(app.config.get("SQLITE_POOL", {}))
+    if "busy_timeout" in pragmas:
+        # pysqlite's own busy handler, in seconds
+        options["connect_args"] = {"timeout": int(pragmas["busy_timeout"]) / 1000}
+    options.update(app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+    return options
+
+
+def apply_pragmas(engine, pragmas):
+    """Run ``PRAGMA name = value`` for each pragma on every new connection."""
+    statements = [f"PRAGMA {name} = {value}" for name, value in pragmas.items()]
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+    return set_sqlite_pragmas
+
+
+def init_sqlite(app, engine):
+    if engine.dialect.name == "sqlite":
+        apply_pragmas(engine, app.config.get("SQLITE_PRAGMAS", {}))
@@ -12,13 +12,26 @@ from core.models import db
 from core.blueprints.bp_auth import bp_auth
 from core.blueprints.bp_lists import bp_list
 from core.blueprints.bp_tasks import bp_task
+from core.blueprints.bp_stream import bp_stream
 from flask_jwt_extended import JWTManager
 from flask_login import LoginManager
 from config import Config
+from core.utils.passwords import init_password_hasher
+from core.utils.rate_limiter import init_rate_limiter
+from core.utils.identity import init_identity_cache, get_user
+from core.utils.sqlite import sqlite_engine_options, init_sqlite
+from core.utils.metrics import init_metrics
+from core.utils.logs import init_logging
+from core.migrations import migrate
+from core.transfer import data_cli
+from core.reminders import init_reminders
+from core.ordering import init_rank_rebalancer
+from core.events import init_event_bus
+from core.render_cache import init_render_cache
 from datetime import timedelta
 import os
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
     app.url_map.strict_slashes = False
     
@@ -51,17 +64,39 @@ def create_app():
     # Update SQLite database path to use absolute path
     app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(instance_path, "database.db")}'
     
+    # Override with any passed config
+    if config:
+        app.config.update(config)
+    
     # Initialize extensions
+    init_logging(app)
+    sqlite_engine_options(app)
     db.init_app(app)
+    init_password_hasher(app)
+    init_rate_limiter(app)
+    init_identity_cache(app)
+    init_rank_rebalancer(app)
+    init_event_bus(app)
+    
+    login_manager = LoginManager()
+    login_manager.init_app(app)
+    login_manager.user_loader(get_user)
     
     # Register all blueprints
     app.register_blueprint(bp_auth, url_prefix='/api/auth')
     app.register_blueprint(bp_list, url_prefix='/api/lists')  # Add if you're using these
     app.register_blueprint(bp_task, url_prefix='/api/tasks')  # Add if you're using these
+    app.register_blueprint(bp_stream, url_prefix='/api/stream')
+    app.cli.add_command(data_cli)
     
-    # Create database tables
+    # Create missing tables and apply pending schema migrations
     with app.app_context():
-        db.create_all()
+        init_sqlite(app, db.engine)
+        migrate(db.engine)
+        init_metrics(app, db.engine)
+    
+    init_render_cache(app)
+    init_reminders(app)
     
     return app
 
@@ -1,7 +1,11 @@
 # tests/conftest.py
+import re
+from collections import Counter
 import pytest
-from backend.core.models import db, Users, Lists, Tasks
-from backend.run import create_app
+from sqlalchemy import event
+from core.models import db, Users, Lists, Tasks
+from run import create_app
+from flask_jwt_extended import create_access_token
 from datetime import datetime
 
 @pytest.fixture
@@ -42,7 +46,13 @@ def auth_headers(client, test_user):
     return {'Authorization': f'Bearer {token}'}
 
 @pytest.fixture
-def test_user():
+def jwt_headers(app, test_user):
+    """Get JWT headers for the test user without going through login."""
+    token = create_access_token(identity=test_user.id)
+    return {'Authorization': f'Bearer {token}'}
+
+@pytest.fixture
+def test_user(app):
     """Create test user."""
     user = Users(
         username='testuser',
@@ -77,6 +87,16 @@ def test_task(test_list):
     db.session.commit()
     return task
 
+@pytest.fixture
+def make_task(app):
+    """Factory creating a task and returning its id."""
+    def _make_task(list_id, name, parent_id=None, **values):
+        task = Tasks(name=name, list_id=list_id, parent_id=parent_id, **values)
+        db.session.add(task)
+        db.session.commit()
+        return task.id
+    return _make_task
+
 @pytest.fixture
 def test_client_with_db(app, db):
     with app.test_client() as client:
@@ -84,4 +104,57 @@ def test_client_with_db(app, db):
             db.create_all()
             yield client
             db.session.remove()
-            db.drop_all()
\ No newline at end of file
+            db.drop_all()
+
+class QueryCounter:
+    """Record the SQL statements run on the engine inside a ``with`` block.
+
+    Statements are grouped by shape (whitespace and ``IN`` list lengths
+    normalized), so the same query issued once per row shows up as one
+    shape with a high count.
+    """
+    _PARAMS = re.compile(r"\(\?(?:, \?)*\)")
+    _SPACE = re.compile(r"\s+")
+    _IGNORED = re.compile(r"^\s*(PRAGMA|SAVEPOINT|RELEASE|ROLLBACK|BEGIN|COMMIT)", re.I)
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+        self.parameters = []  # bound values of each statement, for re-running it
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if not self._IGNORED.match(statement):
+            self.statements.append(statement)
+            self.parameters.append(parameters[0] if executemany else parameters)
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._record)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def shapes(self):
+        return Counter(
+            self._PARAMS.sub("(?...)", self._SPACE.sub(" ", statement).strip())
+            for statement in self.statements
+        )
+
+    def repeated(self, more_than=1):
+        """Shapes issued more than ``more_than`` times, most frequent first."""
+        return [(shape, n) for shape, n in self.shapes().most_common() if n > more_than]
+
+    def report(self):
+        lines = [f"{self.count} statements"]
+        lines += [f"  {n}x {shape[:200]}" for shape, n in self.repeated()]
+        return "\n".join(lines)
+
+
+@pytest.fixture
+def count_queries(app):
+    """``with count_queries() as queries:`` records the statements run in the block."""
+    return lambda: QueryCounter(db.engine)
@@ -0,0 +1,110 @@
+"""
+Tests for the ASGI application: the WSGI bridge and the native event stream.
+"""
+import asyncio
+import json
+from flask_jwt_extended import create_access_token, create_refresh_token, decode_token
+from core.asgi import create_asgi_app
+
+
+def http_scope(method, path, query=b'', headers=()):
+    return {
+        'type': 'http', 'http_version': '1.1', 'method': method, 'scheme': 'http',
+        'path': path, 'root_path': '', 'query_string': query,
+        'headers': [(name.lower(), value) for name, value in headers],
+        'server': ('testserver', 80), 'client': ('127.0.0.1', 1234),
+    }
+
+
+async def call(asgi, scope, body=b''):
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi(scope, receive, send)
+    return sent[0]['status'], dict(sent[0]['headers']), b''.join(m.get('body', b'') for m in sent[1:])
+
+
+def test_bridge_runs_flask_views(app, test_user, test_list):
+    asgi = create_asgi_app(app)
+    token = create_access_token(identity=test_user.id).encode()
+
+    status, headers, body = asyncio.run(call(asgi, http_scope('GET', '/api/lists', headers=[
+        (b'authorization', b'Bearer ' + token)])))
+    assert status == 200
+    assert headers[b'content-type'] == b'application/json'
+    assert [list_['name'] for list_ in json.loads(body)['lists']] == ['Test List']
+
+    status, _, body = asyncio.run(call(asgi, http_scope('POST', '/api/tasks/', headers=[
+        (b'authorization', b'Bearer ' + token), (b'content-type', b'application/json')]),
+        json.dumps({'name': 'Bridged', 'list_id': test_list.id}).encode()))
+    assert status == 201 and json.loads(body)['task']['name'] == 'Bridged'
+
+
+def test_native_stream_delivers_events(app, test_user, test_list):
+    app.config['STREAM_HEARTBEAT'] = 0.05
+    asgi = create_asgi_app(app)
+    token = create_access_token(identity=test_user.id).encode()
+
+    async def scenario():
+        chunks = []
+        disconnect = asyncio.Event()
+        got_event = asyncio.Event()
+
+        async def receive():
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            chunks.append(message)
+            if b'event: task.created' in message.get('body', b''):
+                got_event.set()
+
+        scope = http_scope('GET', '/api/stream', query=b'jwt=' + token,
+                           headers=[(b'origin', b'http://localhost:3000')])
+        stream = asyncio.ensure_future(asgi(scope, receive, send))
+        await asyncio.sleep(0.1)
+        # Writes go through the bridge's thread pool and publish from there
+        status, _, _ = await call(asgi, http_scope('POST', '/api/tasks/', headers=[
+            (b'authorization', b'Bearer ' + token), (b'content-type', b'application/json')]),
+            json.dumps({'name': 'Live', 'list_id': test_list.id}).encode())
+        assert status == 201
+        await asyncio.wait_for(got_event.wait(), 5)
+        disconnect.set()
+        await asyncio.wait_for(stream, 5)
+        return chunks
+
+    chunks = asyncio.run(scenario())
+    start = chunks[0]
+    assert start['status'] == 200
+    assert dict(start['headers'])[b'access-control-allow-origin'] == b'http://localhost:3000'
+    body = b''.join(message.get('body', b'') for message in chunks[1:]).decode()
+    assert body.startswith('retry: 3000\n')
+    assert ': keepalive' in body
+    event = next(block for block in body.split('\n\n') if 'event: task.created' in block)
+    assert json.loads(event.split('data: ', 1)[1])['task']['name'] == 'Live'
+    assert app.extensions['events'].subscriber_count() == 0
+
+    status, _, _ = asyncio.run(call(asgi, http_scope('GET', '/api/stream')))
+    assert status == 401
+
+
+def test_native_stream_accepts_the_same_tokens_as_wsgi(app, client, test_user):
+    """Refresh and blocklisted tokens are refused by both stream transports."""
+    asgi = create_asgi_app(app)
+    revoked = create_access_token(identity=test_user.id)
+    app.extensions['flask-jwt-extended'].token_in_blocklist_loader(
+        lambda header, payload: payload['jti'] == decode_token(revoked)['jti'])
+
+    for token in (create_refresh_token(identity=test_user.id), revoked):
+        scope = http_scope('GET', '/api/stream', query=f'jwt={token}'.encode())
+        status, _, _ = asyncio.run(call(asgi, scope))
+        assert status == 401
+        assert client.get(f'/api/stream?jwt={token}').status_code in (401, 422)
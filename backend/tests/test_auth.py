@@ -1,11 +1,15 @@
 """
 Tests for authentication functionality.
 """
+import time
+from concurrent import futures
 import pytest
-from backend.core.models import Users
+from core.models import Users, db
+from core.utils.passwords import PasswordHasher, HasherBusy
 from werkzeug.security import generate_password_hash
 from flask_cors import CORS
 
+
 @pytest.fixture
 def auth_user(client, app):
     """Create test user and handle authentication."""
@@ -15,10 +19,11 @@ def auth_user(client, app):
             email='test@example.com',
             password_hash=generate_password_hash('TestPass123!')
         )
-        app.db.session.add(user)
-        app.db.session.commit()
+        db.session.add(user)
+        db.session.commit()
         return user
 
+
 def test_register_success(client):
     """Test successful user registration."""
     response = client.post('/api/auth/register', json={
@@ -29,6 +34,7 @@ def test_register_success(client):
     assert response.status_code == 201
     assert b'User registered successfully' in response.data
 
+
 def test_login_success(client, auth_user):
     """Test successful login."""
     response = client.post('/api/auth/login', json={
@@ -38,10 +44,88 @@ def test_login_success(client, auth_user):
     assert response.status_code == 200
     assert b'Logged in successfully' in response.data
 
+
 def test_login_invalid_credentials(client):
     """Test login with invalid credentials."""
     response = client.post('/api/auth/login', json={
         'login': 'nonexistent',
         'password': 'WrongPass123!'
     })
-    assert response.status_code == 401
\ No newline at end of file
+    assert response.status_code == 401
+
+
+def test_login_rehashes_outdated_parameters(client, app):
+    """A successful login upgrades a hash made with older parameters."""
+    user = Users(
+        username='legacy',
+        email='legacy@example.com',
+        password_hash=generate_password_hash('TestPass123!', method='pbkdf2:sha256:1000')
+    )
+    db.session.add(user)
+    db.session.commit()
+
+    response = client.post('/api/auth/login', json={
+        'login': 'legacy',
+        'password': 'TestPass123!'
+    })
+    assert response.status_code == 200
+
+    db.session.expire_all()
+    assert user.password_hash.startswith(app.config['PASSWORD_HASH_METHOD'] + '$')
+    assert app.extensions['password_hasher'].stats()['rehashed'] == 1
+
+
+def test_login_rejected_when_hashing_saturated(client, app, auth_user):
+    """Logins beyond the hashing pool's capacity get 429 immediately."""
+    hasher = app.extensions['password_hasher']
+    held = [hasher._slots.acquire(blocking=False) for _ in range(hasher._capacity)]
+    try:
+        response = client.post('/api/auth/login', json={
+            'login': 'testuser',
+            'password': 'TestPass123!'
+        })
+    finally:
+        for _ in held:
+            hasher._slots.release()
+
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '1'
+    assert hasher.stats()['rejected'] == 1
+
+
+def test_verify_uses_identity_cache(client, app, test_user, jwt_headers):
+    """Token checks resolve the user once, and see profile changes at once."""
+    cache = app.extensions['identity_cache']
+
+    assert client.get('/api/auth/verify', headers=jwt_headers).status_code == 200
+    response = client.get('/api/auth/verify', headers=jwt_headers)
+    assert response.json['user']['username'] == 'testuser'
+    assert cache.stats()['hits'] == 1
+
+    test_user.username = 'renamed'
+    db.session.commit()
+    response = client.get('/api/auth/verify', headers=jwt_headers)
+    assert response.json['user']['username'] == 'renamed'
+
+    db.session.delete(test_user)
+    db.session.commit()
+    assert client.get('/api/auth/verify', headers=jwt_headers).status_code == 401
+
+
+def test_logout(client, jwt_headers):
+    """Logout resolves the token's user through the login manager."""
+    response = client.post('/api/auth/logout', headers=jwt_headers)
+    assert response.status_code == 200
+    assert response.json['success'] is True
+
+
+def test_hasher_slot_held_until_timed_out_job_ends():
+    """A caller timing out does not free the slot of a job still running."""
+    hasher = PasswordHasher(max_workers=1, max_queue=0, timeout=0.05)
+    with pytest.raises(futures.TimeoutError):
+        hasher._run(time.sleep, 0.3)
+    with pytest.raises(HasherBusy):
+        hasher._run(time.sleep, 0)
+    time.sleep(0.4)
+    assert hasher._run(time.sleep, 0) is None
+    hasher.shutdown()
@@ -0,0 +1,372 @@
+"""
+Tests for list endpoints.
+"""
+import pytest
+from core.models import db, Lists, Tasks
+
+
+def test_get_list_returns_nested_tree(client, jwt_headers, test_list, make_task):
+    """The list endpoint nests every level of the task hierarchy."""
+    root = make_task(test_list.id, 'Root')
+    child = make_task(test_list.id, 'Child', root)
+    make_task(test_list.id, 'Grandchild', child)
+    make_task(test_list.id, 'Second root')
+
+    response = client.get(f'/api/lists/{test_list.id}', headers=jwt_headers)
+    assert response.status_code == 200
+
+    tasks = response.json['list']['tasks']
+    assert [t['name'] for t in tasks] == ['Root', 'Second root']
+    assert tasks[0]['subtasks'][0]['name'] == 'Child'
+    assert tasks[0]['subtasks'][0]['subtasks'][0]['name'] == 'Grandchild'
+    assert tasks[1]['subtasks'] == []
+
+
+def test_get_lists_include_tasks(client, jwt_headers, test_list, make_task):
+    """Task trees are only embedded when requested."""
+    root = make_task(test_list.id, 'Root')
+    make_task(test_list.id, 'Child', root)
+
+    response = client.get('/api/lists', headers=jwt_headers)
+    assert 'tasks' not in response.json['lists'][0]
+
+    response = client.get('/api/lists?include_tasks=true', headers=jwt_headers)
+    tasks = response.json['lists'][0]['tasks']
+    assert tasks[0]['subtasks'][0]['name'] == 'Child'
+
+
+def test_list_summary_counts(client, jwt_headers, test_user, test_list, make_task):
+    """Summaries carry task counts without any task bodies."""
+    root = make_task(test_list.id, 'Root')
+    make_task(test_list.id, 'Child', root, is_completed=True)
+    make_task(test_list.id, 'Other', is_completed=True)
+    make_task(test_list.id, 'Open')
+
+    empty = Lists(name='Empty', user_id=test_user.id, order_index=1)
+    db.session.add(empty)
+    db.session.commit()
+
+    response = client.get('/api/lists/summary', headers=jwt_headers)
+    assert response.status_code == 200
+
+    summary, empty_summary = response.json['lists']
+    assert summary['name'] == 'Test List'
+    assert summary['total_tasks'] == 4
+    assert summary['completed_tasks'] == 3
+    assert summary['task_count'] == 3
+    assert summary['completion_rate'] == 0.75
+    assert 'tasks' not in summary
+    assert empty_summary['total_tasks'] == 0
+    assert empty_summary['completion_rate'] == 0.0
+
+
+def test_get_lists_keyset_pagination(client, jwt_headers, test_user):
+    """Pages follow (rank, id) and the cursor resumes after the last row."""
+    for index, name in enumerate(['C', 'A', 'B', 'D', 'E']):
+        db.session.add(Lists(name=name, user_id=test_user.id, rank=str(index % 3 + 1)))
+    db.session.commit()
+
+    names = []
+    cursor = None
+    while True:
+        url = '/api/lists?limit=2' + (f'&cursor={cursor}' if cursor else '')
+        response = client.get(url, headers=jwt_headers)
+        assert response.status_code == 200
+        assert len(response.json['lists']) <= 2
+        names += [list_['name'] for list_ in response.json['lists']]
+        cursor = response.json['next_cursor']
+        if not cursor:
+            break
+
+    assert names == ['C', 'D', 'A', 'E', 'B']
+
+    response = client.get('/api/lists?cursor=not-a-cursor', headers=jwt_headers)
+    assert response.status_code == 400
+
+
+def test_get_lists_filter_and_projection(client, jwt_headers, test_user):
+    """Archived lists can be filtered out and responses trimmed to some fields."""
+    db.session.add(Lists(name='Active', user_id=test_user.id))
+    db.session.add(Lists(name='Archived', user_id=test_user.id, is_archived=True))
+    db.session.commit()
+
+    response = client.get('/api/lists?is_archived=false&fields=id,name', headers=jwt_headers)
+    assert response.status_code == 200
+    assert [set(list_) for list_ in response.json['lists']] == [{'id', 'name'}]
+    assert response.json['lists'][0]['name'] == 'Active'
+
+    response = client.get('/api/lists?fields=password', headers=jwt_headers)
+    assert response.status_code == 400
+
+
+def test_get_lists_etag_and_not_modified(client, jwt_headers, test_list, make_task):
+    """Unchanged collections answer 304; any write changes the ETag."""
+    response = client.get('/api/lists', headers=jwt_headers)
+    etag = response.headers['ETag']
+    assert not etag.startswith('W/')
+
+    response = client.get('/api/lists', headers={**jwt_headers, 'If-None-Match': etag})
+    assert response.status_code == 304
+
+    make_task(test_list.id, 'New task')
+    response = client.get('/api/lists', headers={**jwt_headers, 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_get_lists_since_returns_delta(client, jwt_headers, test_list, make_task):
+    """``since`` returns only rows written or deleted after that revision."""
+    root = make_task(test_list.id, 'Root')
+    child = make_task(test_list.id, 'Child', root)
+    untouched = make_task(test_list.id, 'Untouched')
+    revision = client.get('/api/lists', headers=jwt_headers).json['revision']
+
+    client.post(f'/api/tasks/{child}/toggle', headers=jwt_headers)
+    new_task = make_task(test_list.id, 'New')
+    client.delete(f'/api/tasks/{untouched}', headers=jwt_headers)
+
+    response = client.get(f'/api/lists?since={revision}', headers=jwt_headers)
+    assert response.status_code == 200
+    assert response.json['revision'] > revision
+    assert sorted(t['id'] for t in response.json['tasks']) == [root, child, new_task]
+    assert response.json['deleted'] == {'lists': [], 'tasks': [untouched]}
+    assert response.json['lists'] == []
+
+    response = client.get(f'/api/lists/{test_list.id}?since={response.json["revision"]}',
+                          headers=jwt_headers)
+    assert response.json['tasks'] == []
+
+
+def test_since_reports_tasks_moved_between_lists(client, jwt_headers, test_user, test_list, make_task):
+    """A task moved away is deleted from the source list and new in the destination."""
+    other = Lists(name='Other', user_id=test_user.id)
+    db.session.add(other)
+    db.session.commit()
+    root = make_task(test_list.id, 'Root')
+    child = make_task(test_list.id, 'Child', root)
+    revision = client.get('/api/lists', headers=jwt_headers).json['revision']
+
+    response = client.post(f'/api/tasks/{root}/move', headers=jwt_headers,
+                           json={'new_list_id': other.id})
+    assert response.status_code == 200
+
+    source = client.get(f'/api/lists/{test_list.id}?since={revision}', headers=jwt_headers).json
+    assert source['tasks'] == []
+    assert sorted(source['deleted']['tasks']) == [root, child]
+    destination = client.get(f'/api/lists/{other.id}?since={revision}', headers=jwt_headers).json
+    assert sorted(t['id'] for t in destination['tasks']) == [root, child]
+    assert destination['deleted']['tasks'] == []
+    # Moved back: present again, so no longer reported as deleted
+    client.post(f'/api/tasks/{root}/move', headers=jwt_headers, json={'new_list_id': test_list.id})
+    source = client.get(f'/api/lists/{test_list.id}?since={revision}', headers=jwt_headers).json
+    assert sorted(t['id'] for t in source['tasks']) == [root, child]
+    assert source['deleted']['tasks'] == []
+
+
+def test_pruned_tombstones_force_refetch(app, client, runner, jwt_headers, test_list, make_task):
+    """After pruning, a ``since`` before the pruned deletions gets a 410."""
+    task = make_task(test_list.id, 'Doomed')
+    old_revision = client.get('/api/lists', headers=jwt_headers).json['revision']
+    client.delete(f'/api/tasks/{task}', headers=jwt_headers)
+    current = client.get('/api/lists', headers=jwt_headers).json['revision']
+
+    result = runner.invoke(args=['data', 'prune-tombstones', '--days', '-1'])
+    assert 'Pruned 1 tombstones' in result.output
+    response = client.get(f'/api/lists?since={old_revision}', headers=jwt_headers)
+    assert response.status_code == 410 and response.json['refetch'] is True
+    assert client.get(f'/api/lists/{test_list.id}?since={old_revision}',
+                      headers=jwt_headers).status_code == 410
+    assert client.get(f'/api/lists?since={current}', headers=jwt_headers).status_code == 200
+
+
+def test_stream_list_tasks_matches_tree(client, jwt_headers, test_list, make_task):
+    """The streamed forest is the same JSON as the in-memory tree."""
+    first = make_task(test_list.id, 'First')
+    child = make_task(test_list.id, 'Child', first)
+    make_task(test_list.id, 'Grandchild', child)
+    make_task(test_list.id, 'Second child', first)
+    make_task(test_list.id, 'Second')
+
+    response = client.get(f'/api/lists/{test_list.id}/tasks', headers=jwt_headers)
+    assert response.status_code == 200
+    assert response.is_streamed
+    tree = client.get(f'/api/lists/{test_list.id}', headers=jwt_headers).json['list']['tasks']
+    assert response.json == tree
+    assert [t['name'] for t in response.json[0]['subtasks']] == ['Child', 'Second child']
+
+    other_list = Lists(name='Empty', user_id=test_list.user_id)
+    db.session.add(other_list)
+    db.session.commit()
+    response = client.get(f'/api/lists/{other_list.id}/tasks', headers=jwt_headers)
+    assert response.json == []
+
+
+def test_export_import_round_trip(client, app, jwt_headers, test_user, test_list, make_task):
+    """An export imported into another account recreates the same trees."""
+    import json
+    from flask_jwt_extended import create_access_token
+    from core.models import Users, Tasks, TaskClosure
+
+    root = make_task(test_list.id, 'Root', is_completed=True)
+    child = make_task(test_list.id, 'Child', root, is_completed=True)
+    make_task(test_list.id, 'Grandchild', child, description='deep')
+    test_list.collapsed_tasks = [child]
+    db.session.commit()
+
+    response = client.get('/api/lists/export', headers=jwt_headers)
+    assert response.mimetype == 'application/x-ndjson'
+    records = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [r['type'] for r in records] == ['list', 'task', 'task', 'task']
+    assert [r['name'] for r in records[1:]] == ['Root', 'Child', 'Grandchild']
+
+    other = Users(username='other', email='other@example.com')
+    db.session.add(other)
+    db.session.commit()
+    other_headers = {'Authorization': f'Bearer {create_access_token(identity=other.id)}'}
+
+    response = client.post('/api/lists/import', headers=other_headers, data=response.data)
+    assert response.status_code == 201
+    assert (response.json['lists'], response.json['tasks']) == (1, 3)
+
+    imported = Lists.query.filter_by(user_id=other.id).one()
+    new_root = Tasks.query.filter_by(list_id=imported.id, parent_id=None).one()
+    new_child = new_root.subtasks.one()
+    assert imported.collapsed_tasks == [new_child.id]
+    old_root = db.session.get(Tasks, root)
+    assert (new_root.is_completed, new_root.children_completed) == (old_root.is_completed, old_root.children_completed)
+    assert new_root.children_total == 1
+    assert new_child.subtasks.one().task_depth == 2
+    assert TaskClosure.query.filter_by(ancestor_id=new_root.id).count() == 3
+    assert imported.revision == other.revision > 0
+
+    exported = client.get('/api/lists/export', headers=other_headers).data.decode()
+    assert [json.loads(line)['name'] for line in exported.splitlines()] == [r['name'] for r in records]
+
+
+def test_import_rejects_broken_trees(client, jwt_headers, test_user):
+    """Invalid records fail the whole import without writing anything."""
+    body = '\n'.join([
+        '{"type": "list", "id": 1, "name": "Imported"}',
+        '{"type": "task", "id": 1, "list_id": 1, "parent_id": null, "name": "Root"}',
+        '{"type": "task", "id": 2, "list_id": 1, "parent_id": 99, "name": "Orphan"}',
+    ])
+    response = client.post('/api/lists/import', headers=jwt_headers, data=body)
+    assert response.status_code == 400
+    assert 'missing from the import' in response.json['message']
+
+    response = client.post('/api/lists/import', headers=jwt_headers, data='{"type": "task"')
+    assert response.status_code == 400
+    assert Lists.query.filter_by(user_id=test_user.id).count() == 0
+
+
+@pytest.mark.parametrize('record, message', [
+    ('"priority": 7', 'priority is out of range'),
+    ('"priority": "high"', 'priority must be an integer'),
+    ('"description": ["x"]', 'description must be text'),
+    ('"parent_id": "1"', 'parent_id must be an integer'),
+    ('"is_completed": "false"', 'is_completed must be true or false'),
+])
+def test_import_rejects_bad_task_fields(client, jwt_headers, test_user, record, message):
+    """Task fields are type- and range-checked like the API checks them."""
+    body = ('{"type": "list", "id": 1, "name": "Imported"}\n'
+            f'{{"type": "task", "id": 1, "list_id": 1, "name": "Task", {record}}}')
+    response = client.post('/api/lists/import', headers=jwt_headers, data=body)
+    assert response.status_code == 400
+    assert message in response.json['message']
+
+    body = '{"type": "list", "id": 1, "name": "Imported", "order_index": -1}'
+    response = client.post('/api/lists/import', headers=jwt_headers, data=body)
+    assert 'order_index is out of range' in response.json['message']
+    for field, message in (('"is_archived": "no"', 'is_archived must be true or false'),
+                           ('"collapsed_tasks": 5', 'collapsed_tasks must be a list')):
+        body = f'{{"type": "list", "id": 1, "name": "Imported", {field}}}'
+        response = client.post('/api/lists/import', headers=jwt_headers, data=body)
+        assert response.status_code == 400
+        assert message in response.json['message']
+    response = client.post('/api/lists/import', headers=jwt_headers,
+                           data=b'{"type": "list", "id": 1, "name": "Caf\xe9"}')
+    assert response.status_code == 400
+    assert 'Line 1: not valid UTF-8' in response.json['message']
+    assert Lists.query.filter_by(user_id=test_user.id).count() == 0
+
+
+def test_import_ranks_lists_after_existing(client, jwt_headers, test_list):
+    """Imported lists keep their order and follow the user's own lists."""
+    body = ('{"type": "list", "id": 1, "name": "First", "rank": "V"}\n'
+            '{"type": "list", "id": 2, "name": "Second", "rank": "k"}')
+    test_list.rank = 'k'
+    db.session.commit()
+    assert client.post('/api/lists/import', headers=jwt_headers, data=body).status_code == 201
+    response = client.get('/api/lists?fields=id,name,rank', headers=jwt_headers)
+    lists = response.json['lists']
+    assert [list_['name'] for list_ in lists] == [test_list.name, 'First', 'Second']
+    assert len({list_['rank'] for list_ in lists}) == 3
+
+
+def test_data_cli_round_trip(app, runner, test_user, test_list, make_task, tmp_path):
+    """The CLI exports to a file and imports it back into an account."""
+    make_task(test_list.id, 'Root')
+    path = tmp_path / 'export.ndjson'
+
+    result = runner.invoke(args=['data', 'export', 'testuser', str(path)])
+    assert result.exit_code == 0, result.output
+    result = runner.invoke(args=['data', 'import', 'testuser', str(path)])
+    assert result.exit_code == 0, result.output
+    assert 'Imported 1 lists and 1 tasks' in result.output
+    assert Lists.query.filter_by(user_id=test_user.id).count() == 2
+
+
+def test_reorder_lists(client, jwt_headers, test_user, test_list):
+    """Lists are reordered by rank and new lists go last."""
+    ids = [test_list.id] + [
+        client.post('/api/lists', headers=jwt_headers, json={'name': name}).json['list']['id']
+        for name in ('Second', 'Third')
+    ]
+    response = client.post(f'/api/lists/{ids[2]}/reorder', headers=jwt_headers,
+                           json={'before_id': ids[0]})
+    assert response.status_code == 200
+    order = [list_['id'] for list_ in client.get('/api/lists', headers=jwt_headers).json['lists']]
+    assert order == [ids[2], ids[0], ids[1]]
+    assert client.post('/api/lists/9999/reorder', headers=jwt_headers,
+                       json={'after_id': None}).status_code == 404
+
+
+def test_get_list_render_cache(app, client, jwt_headers, test_list, make_task):
+    """Rendered trees are reused until a write to the list."""
+    cache = app.extensions['render_cache']
+    task_id = make_task(test_list.id, 'Root')
+    first = client.get(f'/api/lists/{test_list.id}', headers=jwt_headers)
+    second = client.get(f'/api/lists/{test_list.id}', headers=jwt_headers)
+    assert second.get_data() == first.get_data()
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert len(cache.local) == 1
+
+    # ORM writes evict the entry; bulk writes are caught by the revision
+    db.session.get(Tasks, task_id).name = 'Renamed'
+    db.session.commit()
+    assert len(cache.local) == 0
+    client.get(f'/api/lists/{test_list.id}', headers=jwt_headers)
+    client.post(f'/api/tasks/{task_id}/toggle', headers=jwt_headers)
+    response = client.get(f'/api/lists/{test_list.id}', headers=jwt_headers)
+    assert response.json['list']['tasks'][0]['name'] == 'Renamed'
+    assert response.json['list']['tasks'][0]['is_completed'] is True
+    assert cache.stats()['misses'] == 3
+
+
+def test_shared_render_store(app, tmp_path):
+    """A body cached by one worker is a hit for another sharing the file."""
+    from core.render_cache import RenderCache, SharedRenderStore
+    path = str(tmp_path / 'render.db')
+    first = RenderCache(1024, SharedRenderStore(path, 1024))
+    second = RenderCache(1024, SharedRenderStore(path, 1024))
+    first.set(1, 7, 3, b'{"list": 7}')
+    assert second.get(1, 7, 3) == b'{"list": 7}'
+    assert second.get(1, 7, 4) is None
+    assert second.stats()['shared_hits'] == 1
+    first.invalidate(7)
+    assert second.shared.get(7, 1, 3) is None
+    # Bounded by size: the oldest entries go first
+    for list_id in range(20):
+        first.set(1, list_id, 1, b'x' * 100)
+    assert first.shared.get(0, 1, 1) is None
+    assert first.shared.get(19, 1, 1) == b'x' * 100
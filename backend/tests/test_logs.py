@@ -0,0 +1,57 @@
+"""
+Tests for the queued JSON logging pipeline.
+"""
+import json
+import time
+from core.utils.decorators import handle_exceptions
+from core.utils.logs import scrub
+from run import create_app
+
+
+def test_scrub_removes_secrets():
+    text = (
+        "IntegrityError: UNIQUE constraint failed: users.email\n"
+        "[SQL: INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)]\n"
+        "[parameters: ('yash', 'y@example.com', 'pbkdf2:sha256:600000$SR3Q$24f5')]\n"
+        "login with password=hunter2 and {'token': 'abc'} "
+        "Bearer eyJhbGciOiJIUzI1NiJ9.eyJzdWIiOjF9.c2lnbmF0dXJl "
+        "stored pbkdf2:sha256:600000$rqT6fTX$7e7e6b4f"
+    )
+    scrubbed = scrub(text)
+    for secret in ('y@example.com', 'SR3Q', 'hunter2', 'abc', 'eyJ', 'rqT6fTX'):
+        assert secret not in scrubbed
+    assert '[parameters: ***]' in scrubbed
+    assert 'UNIQUE constraint failed: users.email' in scrubbed
+
+
+def test_logs_are_json_with_request_ids_and_deduped(tmp_path):
+    log_file = tmp_path / 'app.log'
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+        'LOG_FILE': str(log_file),
+    })
+
+    @app.route('/boom')
+    @handle_exceptions
+    def boom():
+        raise RuntimeError("failed with password=hunter2")
+
+    client = app.test_client()
+    first = client.get('/boom', headers={'X-Request-ID': 'req-1'})
+    second = client.get('/boom')
+    assert first.status_code == second.status_code == 500
+    assert first.headers['X-Request-ID'] == 'req-1'
+    assert len(second.headers['X-Request-ID']) == 32
+
+    deadline = time.monotonic() + 5
+    while log_file.read_text().count('\n') < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    entries = [json.loads(line) for line in log_file.read_text().splitlines()]
+    assert [entry['request_id'] for entry in entries] == ['req-1', second.headers['X-Request-ID']]
+    assert entries[0]['level'] == 'ERROR' and entries[0]['path'] == '/boom'
+    assert entries[0]['exc_type'] == 'RuntimeError'
+    assert 'hunter2' not in log_file.read_text()
+    # The same traceback again within the window is logged without its stack
+    assert 'Traceback' in entries[0]['traceback']
+    assert entries[1]['traceback_suppressed'] is True and 'traceback' not in entries[1]
@@ -0,0 +1,59 @@
+"""
+Tests for the request metrics and slow-request profiling.
+"""
+import pstats
+from core.models import db
+from run import create_app
+
+
+def test_metrics_disabled_by_default(client):
+    assert client.get('/metrics').status_code == 404
+
+
+def test_metrics_endpoint_needs_a_token():
+    """Without METRICS_TOKEN requests are still measured but /metrics is not served."""
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:', 'METRICS_ENABLED': True,
+                      'METRICS_TOKEN': None})
+    with app.app_context():
+        client = app.test_client()
+        client.get('/api/auth/ping')
+        assert client.get('/metrics').status_code == 404
+        assert 'auth.ping' in app.extensions['metrics'].render()
+        db.session.remove()
+
+
+def test_metrics_record_latency_queries_and_size(tmp_path):
+    """Requests are counted per endpoint with their SQL statements, and sampled slow ones profiled."""
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+        'METRICS_ENABLED': True,
+        'METRICS_TOKEN': 'scrape-secret',
+        'PROFILE_SAMPLE_RATE': 1.0,
+        'PROFILE_SLOW_REQUEST': 0,
+        'PROFILE_DIR': str(tmp_path),
+    })
+    with app.app_context():
+        client = app.test_client()
+        client.post('/api/auth/register', json={
+            'username': 'metrics', 'email': 'metrics@example.com', 'password': 'TestPass123!'
+        })
+        client.get('/api/auth/ping')
+        client.get('/api/nowhere')
+
+        body = client.get('/metrics', headers={'Authorization': 'Bearer scrape-secret'}).get_data(as_text=True)
+        assert 'http_requests_total{endpoint="auth.ping",method="GET",status="200"} 1' in body
+        assert 'http_requests_total{endpoint="unmatched",method="GET",status="404"} 1' in body
+        assert 'http_request_duration_seconds_count{endpoint="auth.ping",method="GET"} 1' in body
+        assert 'http_request_db_queries_bucket{endpoint="auth.ping",le="0"} 1' in body
+        assert 'http_response_size_bytes_count{endpoint="auth.ping"} 1' in body
+        assert 'render_cache_misses 0' in body
+        register_queries = [line for line in body.splitlines()
+                            if line.startswith('http_request_db_queries_sum{endpoint="auth.register')]
+        assert register_queries and float(register_queries[0].split()[-1]) > 0
+
+        profiles = list(tmp_path.glob('*.prof'))
+        assert app.extensions['metrics'].profiles_written == len(profiles) == 4
+        assert pstats.Stats(str(profiles[0])).total_calls > 0
+        assert client.get('/metrics').status_code == 401
+        assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+        db.session.remove()
@@ -0,0 +1,70 @@
+"""
+Tests for the schema migrations.
+"""
+import sqlite3
+from sqlalchemy import inspect
+from core.migrations import MIGRATIONS, schema_version
+from core.models import db, Tasks, TaskClosure, search_tasks
+from run import create_app
+
+# Schema of the first release, before depths, counters and revisions
+LEGACY_SCHEMA = """
+CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE,
+    email VARCHAR(120) NOT NULL UNIQUE, password_hash VARCHAR(256), created_at DATETIME);
+CREATE TABLE lists (id INTEGER PRIMARY KEY, name VARCHAR(200) NOT NULL,
+    user_id INTEGER REFERENCES users (id) ON DELETE CASCADE, order_index INTEGER,
+    description TEXT, is_archived BOOLEAN, collapsed_tasks JSON,
+    created_at DATETIME, updated_at DATETIME);
+CREATE TABLE tasks (id INTEGER PRIMARY KEY, name VARCHAR(200) NOT NULL, description TEXT,
+    list_id INTEGER REFERENCES lists (id) ON DELETE CASCADE, parent_id INTEGER REFERENCES tasks (id),
+    is_completed BOOLEAN, due_date DATETIME, priority INTEGER,
+    created_at DATETIME, updated_at DATETIME);
+INSERT INTO users (id, username, email) VALUES (1, 'old', 'old@example.com');
+INSERT INTO lists (id, name, user_id) VALUES (1, 'Old list', 1);
+INSERT INTO tasks (id, name, list_id, parent_id, is_completed) VALUES
+    (1, 'Root', 1, NULL, 0), (2, 'Child', 1, 1, 1), (3, 'Grandchild', 1, 2, 0);
+"""
+
+
+def test_legacy_database_is_upgraded(tmp_path):
+    """Columns, indexes and the hierarchy backfill are applied in order."""
+    path = tmp_path / 'legacy.db'
+    with sqlite3.connect(path) as connection:
+        connection.executescript(LEGACY_SCHEMA)
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{path}"})
+    with app.app_context():
+        with db.engine.connect() as connection:
+            assert schema_version(connection) == MIGRATIONS[-1][0]
+            inspector = inspect(connection)
+            assert {'task_depth', 'children_total', 'revision'} <= {
+                column['name'] for column in inspector.get_columns('tasks')}
+            assert {'ix_tasks_parent_rank', 'ix_tasks_list_parent_rank'} <= {
+                index['name'] for index in inspector.get_indexes('tasks')}
+            assert 'ix_tasks_parent_created' not in {
+                index['name'] for index in inspector.get_indexes('tasks')}
+            assert 'tombstone_horizon' in {column['name'] for column in inspector.get_columns('users')}
+            # The indexes spelled out in the migrations match the current models
+            for table in ('lists', 'tasks'):
+                upgraded = {index['name']: index['column_names'] for index in inspector.get_indexes(table)}
+                for index in db.metadata.tables[table].indexes:
+                    if index.name in upgraded:
+                        assert upgraded[index.name] == [column.name for column in index.columns]
+            assert {'ix_lists_user_rank'} <= {index['name'] for index in inspector.get_indexes('lists')}
+
+        grandchild = db.session.get(Tasks, 3)
+        assert grandchild.task_depth == 2
+        assert grandchild.rank == '000001V'
+        assert [task.id for task in grandchild.get_ancestors()] == [1, 2]
+        root = db.session.get(Tasks, 1)
+        assert (root.children_total, root.children_completed) == (1, 1)
+        assert TaskClosure.query.count() == 6
+        assert [task['path'] for task in search_tasks(1, 'grand')] == [[1, 2]]
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_fresh_database_is_stamped(app):
+    """New databases get the current schema and skip the migrations."""
+    with db.engine.connect() as connection:
+        assert schema_version(connection) == MIGRATIONS[-1][0]
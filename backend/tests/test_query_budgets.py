@@ -0,0 +1,103 @@
+"""
+Query budgets: every endpoint runs a fixed number of SQL statements.
+
+Each endpoint is called for a user with one small tree and for a user
+with several lists of wide trees. Both calls must stay within the
+endpoint's budget and run the same number of statements, so a query
+issued per list or per task (an N+1) fails the test whatever its size.
+"""
+import pytest
+from flask_jwt_extended import create_access_token
+from core.models import db, Users, Lists, Tasks
+
+
+def build_world(name, lists, roots, children):
+    """A user with ``lists`` lists of ``roots`` trees, each root with ``children`` children and grandchildren."""
+    user = Users(username=name, email=f'{name}@example.com')
+    db.session.add(user)
+    db.session.flush()
+    list_ids = []
+    for l in range(lists):
+        list_ = Lists(name=f'{name} list {l}', user_id=user.id)
+        db.session.add(list_)
+        db.session.flush()
+        list_ids.append(list_.id)
+        for r in range(roots):
+            root = Tasks(name=f'task {r}', list_id=list_.id)
+            for c in range(children):
+                child = Tasks(name=f'task {r}.{c}', list_id=list_.id, parent=root)
+                Tasks(name=f'task {r}.{c}.0', list_id=list_.id, parent=child)
+            db.session.add(root)
+    db.session.commit()
+
+    roots = Tasks.query.filter(Tasks.list_id == list_ids[0], Tasks.parent_id.is_(None)) \
+        .order_by(Tasks.id).all()
+    root = roots[0]
+    child = root.subtasks[0]
+    return {
+        'headers': {'Authorization': f'Bearer {create_access_token(identity=user.id)}'},
+        'list': list_ids[0], 'other_list': list_ids[-1], 'roots': [t.id for t in roots],
+        'root': root.id, 'child': child.id, 'leaf': child.subtasks[0].id, 'other': roots[-1].id,
+    }
+
+
+# (method, url, body, budget); urls and bodies are filled in from the world
+ENDPOINTS = [
+    ('get', '/api/lists', None, 3),
+    ('get', '/api/lists?include_tasks=true', None, 4),
+    ('get', '/api/lists?since=0', None, 6),
+    ('get', '/api/lists/summary', None, 1),
+    ('get', '/api/lists/{list}', None, 4),
+    ('get', '/api/lists/{list}?since=0', None, 6),
+    ('get', '/api/lists/{list}/tasks', None, 3),
+    ('get', '/api/tasks/{root}', None, 3),
+    ('get', '/api/tasks/search?q=task', None, 3),
+    ('get', '/api/tasks/agenda', None, 3),
+    ('get', '/api/lists/export', None, 2),
+    ('post', '/api/tasks/', lambda w: {'name': 'New', 'list_id': w['list'], 'parent_id': w['root']}, 12),
+    ('post', '/api/tasks/{child}/toggle', None, 8),
+    ('post', '/api/tasks/batch', lambda w: {'tasks': [{'id': i, 'priority': 2} for i in w['roots']]}, 3),
+    ('post', '/api/tasks/{other}/reorder', lambda w: {'after_id': None}, 7),
+    ('post', '/api/tasks/{other}/move', lambda w: {'new_list_id': w['other_list']}, 9),
+    ('delete', '/api/tasks/{root}', None, 9),
+    ('delete', '/api/lists/{list}', None, 7),
+]
+
+
+@pytest.fixture
+def worlds(app):
+    return build_world('small', 2, 2, 1), build_world('large', 3, 6, 3)
+
+
+def test_query_counts_do_not_grow_with_data(client, worlds, count_queries):
+    small, large = worlds
+    failures = []
+    for method, url, body, budget in ENDPOINTS:
+        counts = []
+        for world in (small, large):
+            with count_queries() as queries:
+                response = getattr(client, method)(
+                    url.format(**world), headers=world['headers'],
+                    json=body(world) if body else None
+                )
+                response.get_data()  # drains streamed responses
+            assert response.status_code < 400, (url, response.get_data())
+            counts.append(queries)
+        small_count, large_count = (queries.count for queries in counts)
+        if small_count != large_count or large_count > budget:
+            failures.append(f"{method.upper()} {url}: {small_count} -> {large_count} "
+                            f"(budget {budget})\n{counts[1].report()}")
+    assert not failures, "\n\n".join(failures)
+
+
+def test_query_counter_reports_repeated_shapes(app, test_list, count_queries):
+    for name in ('A', 'B', 'C'):
+        db.session.add(Tasks(name=name, list_id=test_list.id))
+    db.session.commit()
+    db.session.expire_all()
+    with count_queries() as queries:
+        for task in Tasks.query.all():
+            task.subtasks.all()
+    assert queries.count == 4
+    ((shape, n),) = queries.repeated()
+    assert n == 3 and shape.startswith('SELECT tasks.id')
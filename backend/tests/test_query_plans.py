@@ -0,0 +1,78 @@
+"""
+Query plan checks: every statement the blueprints run must use an index.
+
+The endpoints are exercised once each while the SQL they emit is recorded,
+then each recorded statement is run through EXPLAIN QUERY PLAN. A ``SCAN``
+of a real table (without an index) fails the test. SQLite's planner assumes
+large tables when no statistics exist, so plans on the small test data
+match what a big database would use.
+"""
+import re
+from core.models import db
+
+SKIP = re.compile(r"^\s*INSERT INTO \w+ \([^)]*\) VALUES", re.I)
+# The import's staging tables are temporary and gone by the time plans are checked
+STAGING = re.compile(r"\bimport_(lists|tasks)\b")
+SCAN = re.compile(r"^SCAN (\w+)(?: AS (\w+))?(?! USING)")
+
+
+def full_scans(statement, parameters):
+    cursor = db.session.connection().connection.driver_connection.cursor()
+    plan = cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    tables = set(db.metadata.tables)
+    return [detail for *_, detail in plan
+            if (match := SCAN.match(detail)) and match.group(1) in tables]
+
+
+def test_blueprint_queries_use_indexes(client, jwt_headers, test_user, test_list, make_task, count_queries):
+    root = make_task(test_list.id, 'Root')
+    child = make_task(test_list.id, 'Child', parent_id=root)
+    make_task(test_list.id, 'Grandchild', parent_id=child)
+    other = make_task(test_list.id, 'Other')
+    with count_queries() as queries:
+        exercise_endpoints(client, jwt_headers, test_list, root, child, other)
+
+    problems = {}
+    for statement, parameters in zip(queries.statements, queries.parameters):
+        if SKIP.match(statement) or STAGING.search(statement):
+            continue
+        scans = full_scans(statement, parameters)
+        if scans:
+            problems[statement] = scans
+    assert not problems, "\n\n".join(f"{s}\n  -> {p}" for s, p in problems.items())
+
+
+def exercise_endpoints(client, jwt_headers, test_list, root, child, other):
+    other_list = client.post('/api/lists', headers=jwt_headers, json={'name': 'Other'}).json['list']['id']
+    requests = [
+        ('get', '/api/lists', None),
+        ('get', '/api/lists?limit=1&is_archived=false&include_tasks=true', None),
+        ('get', '/api/lists?fields=id,name&since=0', None),
+        ('get', '/api/lists/summary', None),
+        ('get', f'/api/lists/{test_list.id}', None),
+        ('get', f'/api/lists/{test_list.id}?since=0', None),
+        ('get', f'/api/lists/{test_list.id}/tasks', None),
+        ('post', '/api/tasks/', {'name': 'New', 'list_id': test_list.id, 'parent_id': root}),
+        ('get', f'/api/tasks/{root}', None),
+        ('get', f'/api/tasks/search?q=chi&list_id={test_list.id}', None),
+        ('get', '/api/tasks/agenda', None),
+        ('get', '/api/tasks/agenda?view=today', None),
+        ('post', f'/api/tasks/{child}/toggle', None),
+        ('post', '/api/tasks/batch', {'tasks': [{'id': root, 'is_completed': False, 'priority': 2}]}),
+        ('post', f'/api/tasks/{other}/reorder', {'after_id': None}),
+        ('post', f'/api/tasks/{root}/reorder', {'before_id': other}),
+        ('post', f'/api/lists/{test_list.id}/reorder', {'before_id': None}),
+        ('post', f'/api/tasks/{other}/move', {'new_parent_id': root}),
+        ('post', f'/api/tasks/{other}/move', {'new_list_id': other_list}),
+        ('delete', f'/api/tasks/{child}', None),
+        ('get', '/api/auth/verify', None),
+        ('get', '/api/lists/export', None),
+        ('post', '/api/lists/import', '{"type": "list", "id": 1, "name": "Imported"}\n'
+                                     '{"type": "task", "id": 1, "list_id": 1, "name": "Task"}'),
+        ('delete', f'/api/lists/{test_list.id}', None),
+    ]
+    for method, url, body in requests:
+        payload = {'data': body} if isinstance(body, str) else {'json': body}
+        response = getattr(client, method)(url, headers=jwt_headers, **payload)
+        data = response.get_data()  # drains streamed responses
+        assert response.status_code < 400, (url, data)
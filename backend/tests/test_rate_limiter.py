@@ -0,0 +1,93 @@
+"""
+Tests for the sliding-window rate limiter.
+"""
+from flask_jwt_extended import create_access_token
+from core.models import db, Users
+from core.utils.rate_limiter import MemoryBackend, SQLiteBackend, rate_limit, key_by_identity
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_sliding_window_weights_previous_window():
+    """Requests from the previous window count by their remaining overlap."""
+    clock = FakeClock(now=960.0)  # start of a 60s window
+    backend = MemoryBackend(clock=clock)
+
+    assert all(backend.hit('k', 10, 60)[0] for _ in range(10))
+    allowed, remaining, retry_after = backend.hit('k', 10, 60)
+    assert not allowed and remaining == 0 and retry_after >= 1
+
+    # Half of the previous window still overlaps: 10 * 0.5 = 5 counted
+    clock.now += 60 + 30
+    results = [backend.hit('k', 10, 60)[0] for _ in range(6)]
+    assert results == [True] * 5 + [False]
+
+
+def test_memory_backend_evicts_idle_and_excess_keys():
+    """Idle keys expire and the store never exceeds its key bound."""
+    clock = FakeClock()
+    backend = MemoryBackend(max_keys=3, ttl=100, clock=clock)
+
+    for key in 'abcde':
+        backend.hit(key, 5, 60)
+    assert len(backend) == 3
+
+    clock.now += 500
+    backend.hit('z', 5, 60)
+    assert len(backend) == 1
+
+
+def test_sqlite_backend_shares_counters(tmp_path):
+    """Two backends on the same file see each other's requests."""
+    clock = FakeClock()
+    path = str(tmp_path / 'limits.db')
+    first = SQLiteBackend(path, clock=clock)
+    second = SQLiteBackend(path, clock=clock)
+
+    assert first.hit('k', 2, 60)[0]
+    assert second.hit('k', 2, 60)[0]
+    assert not first.hit('k', 2, 60)[0]
+
+
+def test_sqlite_backend_reconnects_after_fork(tmp_path, monkeypatch):
+    """A connection opened before a fork is not reused by the child."""
+    backend = SQLiteBackend(str(tmp_path / 'limits.db'))
+    parent = backend._connect()
+    monkeypatch.setattr('core.utils.rate_limiter.os.getpid', lambda: -1)
+    assert backend._connect() is not parent
+
+
+def test_identity_key_separates_users_on_one_ip(app, test_user):
+    """Signed-in users behind one address have their own buckets."""
+    @app.route('/limited')
+    @rate_limit(limit=1, window=60, key_func=key_by_identity)
+    def limited():
+        return 'ok'
+
+    other = Users(username='other', email='other@example.com')
+    db.session.add(other)
+    db.session.commit()
+    client = app.test_client()
+
+    def get(user):
+        headers = {'Authorization': f'Bearer {create_access_token(identity=user.id)}'}
+        return client.get('/limited', headers=headers).status_code
+
+    assert [get(test_user), get(test_user), get(other)] == [200, 429, 200]
+    assert [client.get('/limited').status_code for _ in range(2)] == [200, 429]
+
+
+def test_login_rate_limited(client, app):
+    """The login endpoint answers 429 once the per-IP limit is spent."""
+    statuses = [
+        client.post('/api/auth/login', json={'login': 'x', 'password': 'y'}).status_code
+        for _ in range(21)
+    ]
+    assert statuses[:20] == [401] * 20
+    assert statuses[20] == 429
@@ -0,0 +1,70 @@
+"""
+Tests for the reminder scheduler.
+"""
+from datetime import datetime, timedelta
+from core.models import db, Tasks
+from core.reminders import ReminderScheduler
+
+
+class RecordingSink:
+    def __init__(self):
+        self.reminders = []
+
+    def deliver(self, reminder):
+        self.reminders.append(reminder)
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_scheduler_fires_due_tasks_once(app, test_list, make_task):
+    """Reminders fire when due, skip completed tasks and never repeat."""
+    start = datetime(2030, 1, 1, 9, 0)
+    clock = FakeClock(start)
+    sink = RecordingSink()
+    scheduler = ReminderScheduler(app, sink, window=3600, clock=clock)
+
+    first = make_task(test_list.id, 'Call', due_date=start + timedelta(minutes=10))
+    done = make_task(test_list.id, 'Done', due_date=start + timedelta(minutes=20))
+    later = make_task(test_list.id, 'Later', due_date=start + timedelta(hours=3))
+
+    assert scheduler.run_pending(start) == []
+    assert scheduler.seconds_until_next(start) == 600
+    db.session.get(Tasks, done).is_completed = True
+    db.session.commit()
+
+    sent = scheduler.run_pending(start + timedelta(minutes=30))
+    assert [r['task_id'] for r in sent] == [first]
+    assert sent[0]['user_id'] == test_list.user_id
+    assert scheduler.run_pending(start + timedelta(minutes=31)) == []
+
+    # The next window is loaded once the current one has passed
+    sent = scheduler.run_pending(start + timedelta(hours=3))
+    assert [r['task_id'] for r in sent] == [later]
+    assert [r['task_id'] for r in sink.reminders] == [first, later]
+
+
+def test_task_commits_mark_the_window_stale(app, test_list, make_task):
+    """Rescheduling a task after the window was loaded is picked up."""
+    start = datetime(2030, 1, 1, 9, 0)
+    scheduler = ReminderScheduler(app, RecordingSink(), window=3600, clock=FakeClock(start))
+    task_id = make_task(test_list.id, 'Moved', due_date=start + timedelta(hours=5))
+    scheduler.run_pending(start)
+    assert scheduler.seconds_until_next(start) == 3600
+
+    from core.models import task_commit_hooks
+    task_commit_hooks.append(scheduler.notify_changed)
+    try:
+        db.session.get(Tasks, task_id).due_date = start + timedelta(minutes=5)
+        db.session.commit()
+    finally:
+        task_commit_hooks.remove(scheduler.notify_changed)
+
+    assert scheduler.seconds_until_next(start) == 0
+    sent = scheduler.run_pending(start + timedelta(minutes=5))
+    assert [r['task_id'] for r in sent] == [task_id]
@@ -0,0 +1,30 @@
+"""
+Tests for the SQLite engine profile.
+"""
+from sqlalchemy import text
+from sqlalchemy.pool import QueuePool
+from core.models import db
+from run import create_app
+
+
+def test_file_database_profile(tmp_path):
+    """File databases get WAL, the pragmas and a sized pool."""
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}"})
+    with app.app_context():
+        pragma = lambda name: db.session.execute(text(f"PRAGMA {name}")).scalar()
+        assert pragma('journal_mode') == 'wal'
+        assert pragma('synchronous') == 1  # NORMAL
+        assert pragma('foreign_keys') == 1
+        assert pragma('busy_timeout') == 5000
+        assert pragma('cache_size') == -64000
+
+        assert isinstance(db.engine.pool, QueuePool)
+        assert db.engine.pool.size() == app.config['SQLITE_POOL']['pool_size']
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_memory_database_skips_pool(app):
+    """In-memory databases keep their single shared connection."""
+    assert 'pool_size' not in app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    assert db.session.execute(text("PRAGMA foreign_keys")).scalar() == 1
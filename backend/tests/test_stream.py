@@ -0,0 +1,75 @@
+"""
+Tests for the change feed and the /api/stream endpoint.
+"""
+import json
+from flask_jwt_extended import create_access_token
+from core.events import EventBus, emit
+from core.models import db
+
+
+def test_bus_delivers_per_user_and_resumes():
+    bus = EventBus(queue_size=2, buffer_size=3)
+    mine, theirs = bus.subscribe(1), bus.subscribe(2)
+    first = bus.publish(1, 'task.created', {'id': 10})
+    assert mine.get(timeout=0) == (first, 'task.created', {'id': 10})
+    assert theirs.get(timeout=0) is None
+
+    # A reconnect replays what the client missed
+    second = bus.publish(1, 'task.deleted', {'id': 10})
+    resumed = bus.subscribe(1, last_event_id=first)
+    assert resumed.get(timeout=0) == (second, 'task.deleted', {'id': 10})
+
+    # A subscriber that falls behind is reset instead of blocking the publisher
+    assert mine.get(timeout=0)[1] == 'task.deleted'
+    for i in range(3):
+        bus.publish(1, 'task.updated', {'ids': [i]})
+        assert mine.get(timeout=0)[2] == {'ids': [i]}
+    assert resumed.get(timeout=0)[1:] == ('reset', {'reason': 'overflow'})
+    assert resumed.get(timeout=0) is None
+
+    # Ids older than the buffer, or from before a restart, reset too
+    assert bus.subscribe(1, last_event_id=first).get(timeout=0)[1] == 'reset'
+    assert bus.subscribe(1, last_event_id=bus.last_id + 5).get(timeout=0)[1] == 'reset'
+
+    for subscription in (mine, theirs, resumed):
+        subscription.close()
+    assert bus.subscriber_count() == 2
+
+
+def test_events_publish_on_commit_only(app, test_user):
+    subscription = app.extensions['events'].subscribe(test_user.id)
+    emit(test_user.id, 'list.deleted', id=1)
+    db.session.rollback()
+    assert subscription.get(timeout=0) is None
+
+    emit(test_user.id, 'list.deleted', id=2)
+    db.session.commit()
+    assert subscription.get(timeout=0)[1:] == ('list.deleted', {'id': 2})
+    subscription.close()
+
+
+def test_stream_endpoint(app, client, jwt_headers, test_user, test_list, make_task):
+    """The stream authenticates by query string and carries write events."""
+    app.config['STREAM_HEARTBEAT'] = 0.05
+    task = make_task(test_list.id, 'Task')
+    assert client.get('/api/stream').status_code == 401
+
+    token = create_access_token(identity=test_user.id)
+    response = client.get(f'/api/stream?jwt={token}', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    chunks = iter(response.response)
+    assert next(chunks).startswith(b'retry: 3000\nid: ')
+    assert next(chunks) == b': keepalive\n\n'
+
+    client.post(f'/api/tasks/{task}/toggle', headers=jwt_headers)
+    client.post('/api/tasks/', headers=jwt_headers, json={'name': 'New', 'list_id': test_list.id})
+    events = []
+    for chunk in (next(chunks), next(chunks)):
+        lines = dict(line.split(': ', 1) for line in chunk.decode().strip().split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    assert events[0] == ('task.toggled', {
+        'id': task, 'list_id': test_list.id, 'is_completed': True, 'changed_ids': [task]})
+    assert events[1][0] == 'task.created' and events[1][1]['task']['name'] == 'New'
+
+    response.close()
+    assert app.extensions['events'].subscriber_count() == 0
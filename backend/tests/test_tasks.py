@@ -0,0 +1,420 @@
+"""
+Tests for task endpoints.
+"""
+import pytest
+from core.models import (
+    db, Users, Lists, Tasks, TaskClosure, rebuild_task_hierarchy
+)
+
+
+def test_get_task_subtree(client, jwt_headers, test_list, make_task):
+    """A task is returned with its own subtree only."""
+    root = make_task(test_list.id, 'Root')
+    child = make_task(test_list.id, 'Child', root)
+    make_task(test_list.id, 'Grandchild', child)
+
+    response = client.get(f'/api/tasks/{child}', headers=jwt_headers)
+    assert response.status_code == 200
+    assert response.json['task']['name'] == 'Child'
+    assert response.json['task']['subtasks'][0]['name'] == 'Grandchild'
+
+    response = client.get('/api/tasks/9999', headers=jwt_headers)
+    assert response.status_code == 404
+
+
+def closure_pairs():
+    """All (ancestor, descendant, depth) rows of the hierarchy index."""
+    return sorted(
+        (row.ancestor_id, row.descendant_id, row.depth)
+        for row in TaskClosure.query.all()
+    )
+
+
+def test_hierarchy_index_maintained_on_insert(test_list, make_task):
+    """New tasks get a stored depth and closure rows for every ancestor."""
+    root = make_task(test_list.id, 'Root')
+    child = make_task(test_list.id, 'Child', root)
+    grandchild = make_task(test_list.id, 'Grandchild', child)
+
+    assert db.session.get(Tasks, grandchild).task_depth == 2
+    assert [t.id for t in db.session.get(Tasks, grandchild).get_ancestors()] == [root, child]
+    assert closure_pairs() == sorted([
+        (root, root, 0), (child, child, 0), (grandchild, grandchild, 0),
+        (root, child, 1), (child, grandchild, 1), (root, grandchild, 2),
+    ])
+
+    with pytest.raises(ValueError):
+        make_task(test_list.id, 'Too deep', grandchild)
+    db.session.rollback()
+
+
+def test_move_task_reindexes_subtree(client, jwt_headers, test_list, make_task):
+    """Moving a task carries its subtree to the new depth."""
+    first = make_task(test_list.id, 'First')
+    second = make_task(test_list.id, 'Second')
+    child = make_task(test_list.id, 'Child', second)
+
+    response = client.post(f'/api/tasks/{second}/move', headers=jwt_headers,
+                           json={'new_parent_id': first})
+    assert response.status_code == 200
+
+    db.session.expire_all()
+    assert db.session.get(Tasks, second).task_depth == 1
+    assert db.session.get(Tasks, child).task_depth == 2
+    assert db.session.get(Tasks, first).is_ancestor_of(child)
+
+    snapshot = closure_pairs()
+    rebuild_task_hierarchy(db.session.connection())
+    assert closure_pairs() == snapshot
+
+
+def test_move_task_rejects_cycles_and_depth(client, jwt_headers, test_list, make_task):
+    """A task cannot move under its own subtree or below level 2."""
+    root = make_task(test_list.id, 'Root')
+    child = make_task(test_list.id, 'Child', root)
+    other = make_task(test_list.id, 'Other')
+    make_task(test_list.id, 'Other child', other)
+
+    response = client.post(f'/api/tasks/{root}/move', headers=jwt_headers,
+                           json={'new_parent_id': child})
+    assert response.status_code == 400
+
+    response = client.post(f'/api/tasks/{other}/move', headers=jwt_headers,
+                           json={'new_parent_id': child})
+    assert response.status_code == 400
+
+
+def test_delete_task_removes_subtree(client, jwt_headers, test_list, make_task):
+    """Deleting a task deletes its descendants and their index rows."""
+    root = make_task(test_list.id, 'Root')
+    child = make_task(test_list.id, 'Child', root)
+    make_task(test_list.id, 'Grandchild', child)
+    keep = make_task(test_list.id, 'Keep')
+
+    response = client.delete(f'/api/tasks/{root}', headers=jwt_headers)
+    assert response.status_code == 200
+    assert [t.id for t in Tasks.query.all()] == [keep]
+    assert closure_pairs() == [(keep, keep, 0)]
+
+
+def test_move_task_to_other_list_carries_subtree(client, jwt_headers, test_user, test_list, make_task):
+    """Moving a task to another list moves its descendants too."""
+    other_list = Lists(name='Other', user_id=test_user.id)
+    db.session.add(other_list)
+    db.session.commit()
+    root = make_task(test_list.id, 'Root')
+    child = make_task(test_list.id, 'Child', root)
+
+    response = client.post(f'/api/tasks/{root}/move', headers=jwt_headers,
+                           json={'new_list_id': other_list.id})
+    assert response.status_code == 200
+
+    db.session.expire_all()
+    assert db.session.get(Tasks, child).list_id == other_list.id
+
+
+def set_completed(task_id, value):
+    task = db.session.get(Tasks, task_id)
+    task.is_completed = value
+    db.session.commit()
+    db.session.expire_all()
+
+
+def test_completion_rolls_up_all_levels(test_list, make_task):
+    """Completing the last leaf completes every ancestor; reopening undoes it."""
+    root = make_task(test_list.id, 'Root')
+    child = make_task(test_list.id, 'Child', root)
+    leaf_a = make_task(test_list.id, 'Leaf A', child)
+    leaf_b = make_task(test_list.id, 'Leaf B', child)
+
+    set_completed(leaf_a, True)
+    assert db.session.get(Tasks, child).children_completed == 1
+    assert not db.session.get(Tasks, child).is_completed
+
+    set_completed(leaf_b, True)
+    assert db.session.get(Tasks, child).is_completed
+    assert db.session.get(Tasks, root).is_completed
+    assert db.session.get(Tasks, root).children_completed == 1
+
+    set_completed(leaf_a, False)
+    assert not db.session.get(Tasks, child).is_completed
+    assert not db.session.get(Tasks, root).is_completed
+    assert db.session.get(Tasks, root).children_completed == 0
+
+
+def test_completion_counters_follow_insert_move_delete(client, jwt_headers, test_list, make_task):
+    """Counters stay equal to a full recount across structural changes."""
+    root = make_task(test_list.id, 'Root')
+    other = make_task(test_list.id, 'Other')
+    done = make_task(test_list.id, 'Done', root, is_completed=True)
+    assert db.session.get(Tasks, root).is_completed
+
+    make_task(test_list.id, 'Open', root)
+    db.session.expire_all()
+    assert not db.session.get(Tasks, root).is_completed
+
+    client.post(f'/api/tasks/{done}/move', headers=jwt_headers, json={'new_parent_id': other})
+    db.session.expire_all()
+    assert db.session.get(Tasks, other).is_completed
+    assert db.session.get(Tasks, root).children_total == 1
+
+    client.delete(f'/api/tasks/{done}', headers=jwt_headers)
+    db.session.expire_all()
+
+    counters = [(t.id, t.children_total, t.children_completed) for t in Tasks.query.all()]
+    rebuild_task_hierarchy(db.session.connection())
+    db.session.expire_all()
+    assert counters == [(t.id, t.children_total, t.children_completed) for t in Tasks.query.all()]
+    assert db.session.get(Tasks, other).children_total == 0
+
+
+def test_toggle_cascades_to_whole_subtree(client, jwt_headers, test_list, make_task):
+    """Toggling a task completes and reopens every level below it."""
+    root = make_task(test_list.id, 'Root')
+    child = make_task(test_list.id, 'Child', root)
+    leaf = make_task(test_list.id, 'Leaf', child)
+    done_leaf = make_task(test_list.id, 'Done leaf', child, is_completed=True)
+
+    response = client.post(f'/api/tasks/{root}/toggle', headers=jwt_headers)
+    assert response.status_code == 200
+    assert response.json['is_completed'] is True
+    assert sorted(response.json['changed_ids']) == [root, child, leaf]
+
+    db.session.expire_all()
+    assert all(t.is_completed for t in Tasks.query.all())
+    assert db.session.get(Tasks, child).children_completed == 2
+
+    response = client.post(f'/api/tasks/{root}/toggle', headers=jwt_headers)
+    assert sorted(response.json['changed_ids']) == [root, child, leaf, done_leaf]
+    db.session.expire_all()
+    assert not any(t.is_completed for t in Tasks.query.all())
+    assert db.session.get(Tasks, child).children_completed == 0
+
+
+def test_toggle_leaf_reports_flipped_ancestors(client, jwt_headers, test_list, make_task):
+    """Completing the last open leaf also reports the completed ancestors."""
+    root = make_task(test_list.id, 'Root')
+    child = make_task(test_list.id, 'Child', root)
+    leaf = make_task(test_list.id, 'Leaf', child)
+
+    response = client.post(f'/api/tasks/{leaf}/toggle', headers=jwt_headers)
+    assert response.json['changed_ids'] == [leaf, child, root]
+
+
+def test_batch_update_reports_per_item_results(client, jwt_headers, test_list, make_task):
+    """Valid items are written; invalid or foreign items are reported."""
+    first = make_task(test_list.id, 'First')
+    second = make_task(test_list.id, 'Second')
+
+    response = client.post('/api/tasks/batch', headers=jwt_headers, json={'tasks': [
+        {'id': first, 'name': 'Renamed', 'priority': 2},
+        {'id': second, 'priority': 9},
+        {'id': second, 'parent_id': first},
+        {'id': 9999, 'name': 'Missing'},
+        {'id': [first], 'name': 'Unhashable'},
+    ]})
+    assert response.status_code == 200
+    assert response.json['updated_count'] == 1
+    assert [r['status'] for r in response.json['results']] == [
+        'updated', 'error', 'error', 'not_found', 'error'
+    ]
+    assert 'priority' in response.json['results'][1]['errors']
+    assert 'parent_id' in response.json['results'][2]['errors']
+    assert 'id' in response.json['results'][4]['errors']
+
+    db.session.expire_all()
+    assert db.session.get(Tasks, first).name == 'Renamed'
+    assert db.session.get(Tasks, first).priority == 2
+    assert db.session.get(Tasks, second).priority == 0
+
+
+def test_batch_update_rejects_malformed_bodies(client, jwt_headers):
+    """A body that is not an object with a ``tasks`` list is a 400, not a 500."""
+    for body in ([1], 'tasks', {'tasks': {'id': 1}}):
+        response = client.post('/api/tasks/batch', headers=jwt_headers, json=body)
+        assert response.status_code == 400, body
+
+
+def test_batch_update_completion_cascades(client, jwt_headers, test_list, make_task):
+    """Batch completion changes cascade down and roll up like toggles."""
+    root = make_task(test_list.id, 'Root')
+    child = make_task(test_list.id, 'Child', root)
+    leaf = make_task(test_list.id, 'Leaf', child)
+    other_leaf = make_task(test_list.id, 'Other leaf', root)
+
+    response = client.post('/api/tasks/batch', headers=jwt_headers, json={'tasks': [
+        {'id': child, 'is_completed': True},
+        {'id': other_leaf, 'is_completed': True, 'priority': 1},
+    ]})
+    assert response.json['updated_count'] == 2
+
+    db.session.expire_all()
+    assert db.session.get(Tasks, leaf).is_completed
+    assert db.session.get(Tasks, root).is_completed
+    assert db.session.get(Tasks, root).children_completed == 2
+    assert db.session.get(Tasks, other_leaf).priority == 1
+
+
+def test_search_tasks(client, jwt_headers, test_list, make_task):
+    """Search ranks name matches first, highlights them and gives the path."""
+    root = make_task(test_list.id, 'Plan garden', description='buy seeds')
+    child = make_task(test_list.id, 'Order seeds <b>', root, description='compare suppliers')
+
+    other_user = Users(username='other', email='other@example.com')
+    db.session.add(other_user)
+    db.session.flush()
+    other_list = Lists(name='Other', user_id=other_user.id)
+    db.session.add(other_list)
+    db.session.flush()
+    make_task(other_list.id, 'Other seeds')
+
+    response = client.get('/api/tasks/search?q=seed', headers=jwt_headers)
+    assert response.status_code == 200
+    results = response.json['results']
+    assert [r['id'] for r in results] == [child, root]
+    assert results[0]['snippet'] == 'Order <mark>seeds</mark> &lt;b&gt;'
+    assert results[0]['path'] == [root]
+    assert results[0]['parent_name'] == 'Plan garden'
+    assert results[0]['list_name'] == test_list.name
+
+    # Renames are picked up by the index
+    client.post('/api/tasks/batch', headers=jwt_headers,
+                json={'tasks': [{'id': root, 'name': 'Plan orchard'}]})
+    response = client.get('/api/tasks/search?q=orch', headers=jwt_headers)
+    assert [r['id'] for r in response.json['results']] == [root]
+
+    client.delete(f'/api/tasks/{root}', headers=jwt_headers)
+    assert client.get('/api/tasks/search?q=seeds', headers=jwt_headers).json['results'] == []
+    assert client.get('/api/tasks/search', headers=jwt_headers).status_code == 400
+
+
+def test_agenda_groups_open_tasks_by_due_date(client, jwt_headers, test_list, make_task):
+    """Agenda buckets open tasks into overdue, today and upcoming."""
+    from datetime import datetime, timedelta
+    now = datetime.utcnow()
+    overdue = make_task(test_list.id, 'Overdue', due_date=now - timedelta(days=2))
+    make_task(test_list.id, 'Done', due_date=now - timedelta(days=1), is_completed=True)
+    upcoming = make_task(test_list.id, 'Upcoming', due_date=now + timedelta(days=3))
+    make_task(test_list.id, 'Far away', due_date=now + timedelta(days=30))
+    make_task(test_list.id, 'No date')
+
+    response = client.get('/api/tasks/agenda', headers=jwt_headers)
+    assert response.status_code == 200
+    assert [t['id'] for t in response.json['overdue']] == [overdue]
+    assert [t['id'] for t in response.json['upcoming']] == [upcoming]
+    assert response.json['upcoming'][0]['list_name'] == test_list.name
+
+    response = client.get('/api/tasks/agenda?view=upcoming&days=60', headers=jwt_headers)
+    assert set(response.json) == {'now', 'upcoming', 'truncated'}
+    assert len(response.json['upcoming']) == 2
+    assert response.json['truncated'] == {'upcoming': False}
+    assert client.get('/api/tasks/agenda?view=later', headers=jwt_headers).status_code == 400
+    assert client.get('/api/tasks/agenda?utc_offset=-840', headers=jwt_headers).status_code == 200
+    response = client.get('/api/tasks/agenda?utc_offset=99999999999', headers=jwt_headers)
+    assert response.status_code == 400
+    assert 'utc_offset' in response.json['error']
+
+
+def test_agenda_limits_each_group(client, jwt_headers, test_list, make_task, monkeypatch):
+    """A long overdue backlog does not hide today's or upcoming tasks."""
+    from datetime import datetime, timedelta
+    from core.blueprints import bp_tasks
+    monkeypatch.setattr(bp_tasks, 'MAX_AGENDA_RESULTS', 2)
+    now = datetime.utcnow()
+    for days in (5, 4, 3):
+        make_task(test_list.id, f'Overdue {days}', due_date=now - timedelta(days=days))
+    upcoming = make_task(test_list.id, 'Upcoming', due_date=now + timedelta(days=3))
+
+    response = client.get('/api/tasks/agenda', headers=jwt_headers)
+    assert [t['name'] for t in response.json['overdue']] == ['Overdue 5', 'Overdue 4']
+    assert [t['id'] for t in response.json['upcoming']] == [upcoming]
+    assert response.json['truncated'] == {'overdue': True, 'today': False, 'upcoming': False}
+
+
+def test_appends_schedule_rebalance(app, test_list, make_task):
+    """Appended ranks grow slowly too; a commit leaving a long one queues its group."""
+    rebalancer = app.extensions['rank_rebalancer']
+    rebalancer.max_length = 2
+    for i in range(70):
+        make_task(test_list.id, f'Task {i}')
+    order = sibling_order(test_list.id)
+    assert max(len(task.rank) for task in Tasks.query) == 3
+
+    assert rebalancer.run_pending() == 1
+    assert sibling_order(test_list.id) == order
+    assert max(len(task.rank) for task in Tasks.query) == 2
+    rebalancer.max_length = 12
+    make_task(test_list.id, 'Short')
+    assert rebalancer.run_pending() == 0
+
+
+def test_batch_update_cannot_set_rank(client, jwt_headers, test_list, make_task):
+    """Ranks are only written through /reorder and /move."""
+    task = make_task(test_list.id, 'Task')
+    response = client.post('/api/tasks/batch', headers=jwt_headers,
+                           json={'tasks': [{'id': task, 'rank': 'k'}]})
+    assert response.json['results'][0]['status'] == 'error'
+    assert db.session.get(Tasks, task).rank != 'k'
+
+
+def sibling_order(list_id, parent_id=None):
+    db.session.expire_all()
+    return [task.id for task in Tasks.query.filter_by(list_id=list_id, parent_id=parent_id)
+            .order_by(Tasks.rank, Tasks.id)]
+
+
+def test_reorder_task_writes_one_row(client, app, jwt_headers, test_list, make_task):
+    """A reorder updates only the moved task, between the named neighbours."""
+    from sqlalchemy import event
+    a, b, c = (make_task(test_list.id, name) for name in ('A', 'B', 'C'))
+    child = make_task(test_list.id, 'Child', a)
+    assert sibling_order(test_list.id) == [a, b, c]
+
+    updates = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('UPDATE tasks'):
+            updates.append(parameters)
+    event.listen(db.engine, 'before_cursor_execute', record)
+    response = client.post(f'/api/tasks/{c}/reorder', headers=jwt_headers, json={'after_id': a})
+    event.remove(db.engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+    assert len(updates) == 1
+    assert sibling_order(test_list.id) == [a, c, b]
+
+    client.post(f'/api/tasks/{a}/reorder', headers=jwt_headers, json={'before_id': None})
+    assert sibling_order(test_list.id) == [c, b, a]
+    client.post(f'/api/tasks/{a}/reorder', headers=jwt_headers, json={'after_id': None})
+    assert sibling_order(test_list.id) == [a, c, b]
+
+    # Neighbours must share the parent
+    response = client.post(f'/api/tasks/{c}/reorder', headers=jwt_headers, json={'after_id': child})
+    assert response.status_code == 400
+    assert client.post(f'/api/tasks/{c}/reorder', headers=jwt_headers, json={}).status_code == 400
+
+    # Moved tasks go last under their new parent
+    client.post(f'/api/tasks/{b}/move', headers=jwt_headers, json={'new_parent_id': a})
+    assert sibling_order(test_list.id, a) == [child, b]
+
+
+def test_long_and_tied_ranks_are_rebalanced(client, app, jwt_headers, test_list, make_task):
+    """Groups with long ranks are rewritten in order; ties are fixed on the spot."""
+    rebalancer = app.extensions['rank_rebalancer']
+    rebalancer.max_length = 3
+    first = make_task(test_list.id, 'First')
+    make_task(test_list.id, 'Last')
+    for i in range(30):
+        task = make_task(test_list.id, f'Task {i}')
+        client.post(f'/api/tasks/{task}/reorder', headers=jwt_headers, json={'after_id': first})
+    order = sibling_order(test_list.id)
+    assert max(len(task.rank) for task in Tasks.query) > 3
+
+    assert rebalancer.run_pending() == 1
+    assert sibling_order(test_list.id) == order
+    assert max(len(task.rank) for task in Tasks.query) <= 2
+
+    a, b = order[:2]
+    db.session.get(Tasks, b).rank = db.session.get(Tasks, a).rank
+    db.session.commit()
+    response = client.post(f'/api/tasks/{order[-1]}/reorder', headers=jwt_headers, json={'after_id': a})
+    assert response.status_code == 200
+    assert sibling_order(test_list.id)[:3] == [a, order[-1], b]